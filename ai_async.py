@@ -0,0 +1,258 @@
+import openai
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+import logging
+from ai_cache import prompt_key
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: throttling, timeouts, dropped connections and 5xx
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+def parse_rate_limits(spec):
+    """Parse "gpt-4=500:30000,gpt-4o=5000:800000" into {model: (requests/min, tokens/min)}"""
+    limits = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        model, values = item.split('=', 1)
+        rpm, _, tpm = values.partition(':')
+        limits[model.strip()] = (float(rpm), float(tpm) if tpm else None)
+    return limits
+
+def estimate_tokens(messages, max_tokens):
+    """Rough upper bound on the tokens a request will consume (4 characters per token)"""
+    chars = 0
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            # Images are billed separately from their base64 size; count text parts only
+            chars += sum(len(part.get('text', '')) for part in content if part.get('type') == 'text')
+    return chars // 4 + (max_tokens or 0)
+
+class TokenBucket:
+    """Token bucket refilled continuously at rate_per_minute, holding at most one minute's worth"""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class AsyncAIClient:
+    """Asyncio OpenAI client with bounded concurrency, per-model rate limits,
+    jittered retries and single-flight coalescing of identical requests.
+
+    Calls run on one background event loop so request threads share the same
+    semaphore, buckets and in-flight table; use run() from synchronous code.
+    """
+
+    def __init__(self, api_key, base_url=None, max_concurrency=8, rate_limits=None,
+                 max_retries=4, backoff_base=0.5, backoff_max=20.0, timeout=60.0):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.rate_limits = rate_limits or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.coalesced = 0
+        self._client = None
+        self._semaphore = None
+        self._buckets = {}
+        self._inflight = {}
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # The loop thread and the client's connections stay behind in the parent;
+        # the child starts its own on first use
+        self._client = None
+        self._semaphore = None
+        self._buckets = {}
+        self._inflight = {}
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        """Start the background event loop thread on first use"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='openai-async', daemon=True)
+                thread.start()
+                self._loop = loop
+        return self._loop
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the background loop and block for its result"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return future.result(timeout)
+
+    def iterate(self, agen, timeout=None):
+        """Drive an async generator on the background loop, yielding its items in the calling thread
+
+        Closing the returned generator early (a client disconnecting mid-stream)
+        cancels the async one, so whatever it holds is released.
+        """
+        items = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in agen:
+                    items.put((item, None))
+                items.put((done, None))
+            except Exception as e:
+                items.put((done, e))
+            finally:
+                await agen.aclose()
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        try:
+            while True:
+                item, error = items.get(timeout=timeout)
+                if item is done:
+                    if error is not None:
+                        raise error
+                    return
+                yield item
+        finally:
+            future.cancel()
+
+    def _get_client(self):
+        if self._client is None:
+            # Retries are handled here, with jitter and rate-limit awareness
+            self._client = openai.AsyncOpenAI(
+                api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=0
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    def _get_buckets(self, model):
+        if model not in self._buckets:
+            rpm, tpm = self.rate_limits.get(model, (None, None))
+            self._buckets[model] = (
+                TokenBucket(rpm) if rpm else None,
+                TokenBucket(tpm) if tpm else None,
+            )
+        return self._buckets[model]
+
+    async def chat_completion(self, **kwargs):
+        """chat.completions.create, sharing one upstream call between identical concurrent requests"""
+        key = prompt_key(kwargs.get('model'), kwargs)
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(self._create_with_retries(**kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one caller giving up doesn't cancel the call for the others
+        return await asyncio.shield(task)
+
+    async def _reserve(self, kwargs):
+        """Wait for the model's request and token buckets to cover one call"""
+        request_bucket, token_bucket = self._get_buckets(kwargs.get('model'))
+        if request_bucket:
+            await request_bucket.acquire(1)
+        if token_bucket:
+            await token_bucket.acquire(estimate_tokens(kwargs.get('messages', []), kwargs.get('max_tokens')))
+
+    async def _create_with_retries(self, **kwargs):
+        client = self._get_client()
+        attempt = 0
+        while True:
+            await self._reserve(kwargs)
+            try:
+                async with self._semaphore:
+                    return await client.chat.completions.create(**kwargs)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"OpenAI call failed ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    async def stream_chat_completion(self, **kwargs):
+        """Yield the chunks of a streamed chat completion
+
+        The concurrency slot is held until the stream ends, and the rate-limit
+        reservation covers the whole call. Failures before the first chunk are
+        retried like chat_completion; once output has been yielded they are raised.
+        """
+        client = self._get_client()
+        attempt = 0
+        while True:
+            await self._reserve(kwargs)
+            received = False
+            try:
+                async with self._semaphore:
+                    stream = await client.chat.completions.create(stream=True, **kwargs)
+                    try:
+                        async for chunk in stream:
+                            received = True
+                            yield chunk
+                    finally:
+                        await stream.response.aclose()
+                    return
+            except RETRYABLE_ERRORS as e:
+                if received or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff_delay(attempt, e)
+                attempt += 1
+                logger.warning(f"OpenAI stream failed ({e.__class__.__name__}), retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def _backoff_delay(self, attempt, error):
+        """Full-jitter exponential backoff, never shorter than a server-sent Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('retry-after') if response is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    def stats(self):
+        """Current concurrency and coalescing counters"""
+        in_use = 0
+        if self._semaphore is not None:
+            in_use = self.max_concurrency - self._semaphore._value
+        return {
+            'max_concurrency': self.max_concurrency,
+            'in_flight': in_use,
+            'pending_unique_requests': len(self._inflight),
+            'coalesced_requests': self.coalesced,
+        }
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _digest(*parts):
+    """Stable sha256 over JSON-encoded key parts"""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def ingredients_key(model, ingredients):
+    """Cache key for a recipe generated from an ingredient list, independent of order and case"""
+    canonical = sorted({i.strip().lower() for i in ingredients if i and i.strip()})
+    return _digest('ingredients', model, canonical)
+
+def prompt_key(model, messages):
+    """Cache key for a chat completion over the given messages"""
+    return _digest('prompt', model, messages)
+
+def image_key(model, image_hash):
+    """Cache key for a vision analysis, by the sha256 hex digest of the image"""
+    return _digest('image', model, image_hash)
+
+class CacheStats:
+    """Hit/miss counters shared by every cache backend"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def record(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'sets': self.sets,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+class NullCache:
+    """Cache backend that never stores anything"""
+
+    backend = 'none'
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key):
+        self.stats.record('misses')
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+class MemoryCache:
+    """In-process LRU cache with a per-entry TTL"""
+
+    backend = 'memory'
+
+    def __init__(self, max_entries=1024, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.stats.record('hits')
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        self.stats.record('misses')
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.record('evictions')
+        self.stats.record('sets')
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteCache:
+    """Persistent cache in a local SQLite file, shared across processes and restarts"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path, ttl=86400):
+        self.path = path
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self._close_connection)
+
+    def _connect(self):
+        # One connection per thread; sqlite3 connections can't be shared across threads
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _close_connection(self):
+        # An SQLite connection must not be carried across fork(); the forking thread reopens lazily
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value FROM ai_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        if row is None:
+            self.stats.record('misses')
+            return None
+        self.stats.record('hits')
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + self.ttl)
+            )
+            # Opportunistically drop expired rows so the file doesn't grow forever
+            conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (time.time(),))
+        self.stats.record('sets')
+
+    def delete(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ai_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM ai_cache")
+
+def create_cache(backend, max_entries=1024, ttl=86400, path='ai_cache.db'):
+    """Build the cache backend named in configuration ('memory', 'sqlite' or 'none')"""
+    if backend == 'memory':
+        return MemoryCache(max_entries=max_entries, ttl=ttl)
+    if backend == 'sqlite':
+        try:
+            return SQLiteCache(path, ttl=ttl)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to open cache at {path}, caching in memory instead: {e}")
+            return MemoryCache(max_entries=max_entries, ttl=ttl)
+    return NullCache()
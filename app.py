@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_session import Session
 import os
@@ -8,8 +8,18 @@ from datetime import datetime
 import json
 
 # Import our modules
-from database import init_db, get_db
-from routes import api_bp
+from database import init_db, get_db, remove_db_session
+from search import init_search_index
+from ingredients import init_ingredient_index
+from embeddings import init_embeddings
+from stats import init_recipe_stats
+from routes import api_bp, run_image_analysis_job
+from jobs import init_jobs
+from commands import register_commands
+from metrics import init_metrics
+from assets import init_static
+from ratelimit import init_rate_limits
+from uploads import UploadRequest
 from config import Config
 
 # Load environment variables
@@ -19,8 +29,10 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def create_app():
+def create_app(start_job_workers=True):
     app = Flask(__name__, static_folder='static')
+    # Uploaded files stream to disk and are hashed on the way in
+    app.request_class = UploadRequest
     
     # Configure the app
     app.config.from_object(Config)
@@ -32,18 +44,31 @@ def create_app():
     # Initialize database
     with app.app_context():
         init_db()
+        init_search_index()
+        init_ingredient_index()
+        init_recipe_stats()
+        init_embeddings(app.config['EMBEDDINGS_PATH'], app.config['EMBEDDING_DIM'])
+    
+    # Start the background workers for image analysis (wsgi.py defers this to each forked worker)
+    init_jobs(app.config, {'analyze_image': run_image_analysis_job}, start_workers=start_job_workers)
+    
+    # Request latency, query and in-flight metrics, served at /metrics
+    init_metrics(app)
+    
+    # Per-client rate limits and the AI call cap for the expensive endpoints
+    init_rate_limits(app)
+    
+    # One database session per request, released when the request ends
+    app.teardown_appcontext(remove_db_session)
     
     # Register blueprints
     app.register_blueprint(api_bp, url_prefix='/api')
     
-    # Serve static files
-    @app.route('/')
-    def index():
-        return send_from_directory('static', 'index.html')
+    # Register maintenance CLI commands (flask --app app <command>)
+    register_commands(app)
     
-    @app.route('/<path:path>')
-    def static_files(path):
-        return send_from_directory('static', path)
+    # Serve the front end and uploaded images
+    init_static(app)
     
     # Error handlers
     @app.errorhandler(404)
@@ -69,6 +94,7 @@ def create_app():
     return app
 
 if __name__ == '__main__':
+    # Development server; in production run gunicorn -c gunicorn.conf.py wsgi:app
     app = create_app()
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
@@ -0,0 +1,163 @@
+from flask import Response, current_app, jsonify, request, send_from_directory
+from werkzeug.security import safe_join
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import logging
+from images import create_thumbnail
+
+try:
+    import brotli  # optional, ~15% smaller than gzip for text assets
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Text assets kept in memory with their compressed variants
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.svg', '.json', '.txt')
+# Assets referenced from index.html under a content-hashed name
+FINGERPRINTED_EXTENSIONS = ('.css', '.js')
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Uploads are stored under the sha256 of the uploaded bytes (images.preprocess_image)
+CONTENT_ADDRESSED = re.compile(r'^[0-9a-f]{64}\.[a-z]+$')
+
+class StaticAsset:
+    """One text file from static/, with its gzip and brotli encodings precomputed"""
+
+    def __init__(self, path, data):
+        self.path = path
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        self.digest = hashlib.sha256(data).hexdigest()
+        self.variants = {'identity': data}
+        compressed = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(data, quality=11)
+        for encoding, body in compressed.items():
+            # Tiny files can grow when compressed
+            if len(body) < len(data):
+                self.variants[encoding] = body
+
+    @property
+    def fingerprinted_path(self):
+        root, extension = os.path.splitext(self.path)
+        return f'{root}.{self.digest[:12]}{extension}'
+
+class AssetManifest:
+    """Fingerprinted names and encodings for the text assets in static/"""
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.assets = {}
+        self.fingerprinted = {}
+        for root, _, files in os.walk(static_folder):
+            for name in files:
+                if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                    continue
+                full_path = os.path.join(root, name)
+                path = os.path.relpath(full_path, static_folder).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    self.assets[path] = StaticAsset(path, f.read())
+        for path, asset in self.assets.items():
+            if path.endswith(FINGERPRINTED_EXTENSIONS):
+                self.fingerprinted[asset.fingerprinted_path] = asset
+        self.index = self._build_index()
+
+    def _build_index(self):
+        """index.html with asset references rewritten to their fingerprinted names"""
+        page = self.assets.get('index.html')
+        if page is None:
+            return None
+        html = page.variants['identity'].decode('utf-8')
+        for asset in self.fingerprinted.values():
+            html = html.replace(f'"/{asset.path}"', f'"/{asset.fingerprinted_path}"')
+        return StaticAsset('index.html', html.encode('utf-8'))
+
+def negotiate_encoding(asset):
+    """Best encoding of asset the client accepts: brotli, then gzip, then none"""
+    for encoding in ('br', 'gzip'):
+        if encoding in asset.variants and request.accept_encodings[encoding]:
+            return encoding
+    return 'identity'
+
+def asset_response(asset, cache_control):
+    encoding = negotiate_encoding(asset)
+    response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+    if encoding != 'identity':
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = cache_control
+    # Each encoding is a different representation, so each gets its own strong ETag
+    response.set_etag(f'{asset.digest[:32]}-{encoding}')
+    return response.make_conditional(request)
+
+def _parse_width(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+def serve_upload(filename):
+    """An uploaded image, or a thumbnail of it with ?w=<width>; byte ranges are supported"""
+    # Uploads are written relative to the working directory (routes.upload_image)
+    upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    folder = upload_folder
+    if not os.path.isfile(safe_join(upload_folder, filename) or ''):
+        # The bundled screenshots live in static/uploads
+        folder = os.path.join(current_app.static_folder, 'uploads')
+
+    if 'w' in request.args:
+        width = _parse_width(request.args['w'])
+        widths = current_app.config['THUMBNAIL_WIDTHS']
+        if width not in widths:
+            return jsonify({'error': f"w must be one of: {', '.join(str(w) for w in widths)}"}), 400
+        source = safe_join(folder, filename)
+        if source is None or not os.path.isfile(source):
+            return jsonify({'error': 'Not found'}), 404
+        folder = os.path.join(upload_folder, 'thumbs', str(width))
+        thumbnail = safe_join(folder, filename)
+        if not os.path.isfile(thumbnail):
+            os.makedirs(os.path.dirname(thumbnail), exist_ok=True)
+            create_thumbnail(source, thumbnail, width, quality=current_app.config['THUMBNAIL_QUALITY'])
+
+    immutable = CONTENT_ADDRESSED.match(os.path.basename(filename)) is not None
+    response = send_from_directory(folder, filename, max_age=current_app.config['STATIC_MAX_AGE'])
+    if immutable:
+        response.headers['Cache-Control'] = IMMUTABLE
+    return response
+
+def init_static(app):
+    """Serve the front end with fingerprinted, precompressed assets, and uploads with thumbnails"""
+    manifest = AssetManifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+    logger.info(
+        f"Static assets: {len(manifest.assets)} precompressed ({'br, ' if brotli else ''}gzip), "
+        f"{len(manifest.fingerprinted)} fingerprinted"
+    )
+
+    @app.route('/')
+    def index():
+        if manifest.index is None:
+            return jsonify({'error': 'Not found'}), 404
+        # The entry point is revalidated on every load; the assets it names never change
+        return asset_response(manifest.index, REVALIDATE)
+
+    @app.route('/uploads/<path:filename>')
+    def uploads(filename):
+        return serve_upload(filename)
+
+    @app.route('/<path:path>')
+    def static_files(path):
+        if path == 'index.html':
+            return index()
+        asset = manifest.fingerprinted.get(path)
+        if asset is not None:
+            return asset_response(asset, IMMUTABLE)
+        asset = manifest.assets.get(path)
+        if asset is not None:
+            return asset_response(asset, REVALIDATE)
+        return send_from_directory(app.static_folder, path, max_age=app.config['STATIC_MAX_AGE'])
@@ -0,0 +1,117 @@
+"""Microbenchmark for recipe serialization.
+
+Seeds an in-memory SQLite database, fetches the rows column-projected
+and times turning it into a JSON body three ways:
+
+    legacy   the old per-route dicts (json.loads on ingredients, isoformat on
+             timestamps) encoded with Flask's JSON provider
+    json     serializers.RecipeSerializer on the stdlib json module
+    orjson   serializers.RecipeSerializer on orjson (skipped if not installed)
+
+    python bench/bench_serialization.py --rows 5000 --repeat 20
+"""
+from datetime import datetime
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from sqlalchemy import insert
+import database
+import serializers
+from serializers import RECIPE_FIELDS, RecipeSerializer, encode_page
+
+def seed(count):
+    database.init_db()
+    db = database.get_db_session()
+    now = time.time()
+    db.execute(insert(database.Recipe), [
+        {
+            'title': f'Recipe {i}',
+            'description': 'A quick weeknight dinner with a crunchy topping',
+            'ingredients': json.dumps([f'{i % 5 + 1} cups flour', '2 tomatoes', 'salt', 'olive oil', f'spice {i % 40}']),
+            'instructions': '1. Mix everything.\n2. Bake for 20 minutes.\n3. Serve warm.',
+            'cooking_time': 20 + i % 60,
+            'servings': 2 + i % 4,
+            'difficulty': 'Easy',
+            'cuisine': 'Italian',
+            'created_at': datetime.fromtimestamp(now - i),
+            'updated_at': datetime.fromtimestamp(now - i),
+        }
+        for i in range(count)
+    ])
+    db.commit()
+    return db
+
+def legacy_body(app, rows):
+    recipe_list = []
+    for row in rows:
+        recipe_list.append({
+            'id': row.id,
+            'title': row.title,
+            'description': row.description,
+            'ingredients': json.loads(row.ingredients) if row.ingredients else [],
+            'instructions': row.instructions,
+            'cooking_time': row.cooking_time,
+            'servings': row.servings,
+            'difficulty': row.difficulty,
+            'cuisine': row.cuisine,
+            'image_url': row.image_url,
+            'created_at': row.created_at.isoformat() if row.created_at else None,
+            'updated_at': row.updated_at.isoformat() if row.updated_at else None
+        })
+    return app.json.dumps({'recipes': recipe_list, 'next_cursor': None})
+
+def serializer_body(serializer, rows):
+    return encode_page([serializer.encode(row) for row in rows], next_cursor=None)
+
+def measure(fn, rows, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - start)
+    return len(rows) / best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    serializer = RecipeSerializer(RECIPE_FIELDS)
+    db = seed(args.rows)
+    rows = db.query(*serializer.columns).order_by(database.Recipe.id).all()
+    db.close()
+
+    orjson = serializers.orjson
+    results = {}
+    with app.app_context():
+        expected = json.loads(legacy_body(app, rows))
+        results['legacy'] = measure(lambda r: legacy_body(app, r), rows, args.repeat)
+
+        serializers.orjson = None
+        assert json.loads(serializer_body(serializer, rows)) == expected
+        results['json'] = measure(lambda r: serializer_body(serializer, r), rows, args.repeat)
+
+        serializers.orjson = orjson
+        if orjson is not None:
+            assert json.loads(serializer_body(serializer, rows)) == expected
+            results['orjson'] = measure(lambda r: serializer_body(serializer, r), rows, args.repeat)
+
+    if args.json:
+        print(json.dumps({'rows': args.rows, 'rows_per_sec': {k: round(v) for k, v in results.items()}}))
+        return
+    baseline = results['legacy']
+    for name, rate in results.items():
+        print(f'{name:8} {rate:12,.0f} rows/s  {rate / baseline:5.2f}x')
+
+if __name__ == '__main__':
+    main()
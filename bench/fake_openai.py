@@ -0,0 +1,148 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Serves POST /v1/chat/completions with a canned recipe after a configurable
+delay, so the app, the async client and the benchmarks can run without
+network access or API spend. Point the app at it with:
+
+    python bench/fake_openai.py --port 8089 --latency 1.5
+    OPENAI_API_KEY=fake OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python app.py
+
+GET /stats returns how many completions were served, which is how request
+coalescing and caching can be observed from the outside.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+RECIPE = {
+    "title": "Fake Tomato Pasta",
+    "description": "A stub recipe served by the local fake OpenAI server",
+    "ingredients": ["200g pasta", "3 tomatoes", "2 cloves garlic", "olive oil", "salt"],
+    "instructions": "1. Boil the pasta.\n2. Cook garlic and tomatoes in olive oil.\n3. Toss together and season.",
+    "cooking_time": 20,
+    "servings": 2,
+    "difficulty": "Easy",
+    "cuisine": "Italian"
+}
+
+MARKDOWN = "## Fake Tomato Pasta\n\n1. Boil the pasta.\n2. Cook the sauce.\n3. Toss and serve. 🍝\n"
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.5, jitter=0.0, fail_rate=0.0):
+        super().__init__(address, FakeOpenAIHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.completions = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self._send_json(200, {'completions': self.server.completions, 'failures': self.server.failures})
+        else:
+            self._send_json(404, {'error': {'message': 'Not found'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': 'Not found'}})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if random.random() < self.server.fail_rate:
+            with self.server.lock:
+                self.server.failures += 1
+            self._send_json(429, {'error': {'message': 'Rate limit exceeded', 'type': 'rate_limit'}},
+                            headers={'Retry-After': '0.1'})
+            return
+
+        latency = max(0.0, self.server.latency + random.uniform(-self.server.jitter, self.server.jitter))
+        with self.server.lock:
+            self.server.completions += 1
+
+        prompt_text = json.dumps(request.get('messages', []))
+        content = json.dumps(RECIPE) if 'JSON' in prompt_text or 'json' in prompt_text else MARKDOWN
+        if request.get('stream'):
+            self._stream(request, content, latency)
+            return
+        time.sleep(latency)
+        usage = {
+            'prompt_tokens': len(prompt_text) // 4,
+            'completion_tokens': len(content) // 4,
+            'total_tokens': len(prompt_text) // 4 + len(content) // 4,
+        }
+        self._send_json(200, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': usage
+        })
+
+    def _stream(self, request, content, latency):
+        """Send content as SSE chunks, spreading the latency over the whole answer"""
+        pieces = [content[i:i + 8] for i in range(0, len(content), 8)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for piece in pieces:
+            time.sleep(latency / len(pieces))
+            chunk = {
+                'id': 'chatcmpl-fake',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': request.get('model', 'fake'),
+                'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+def start_server(host='127.0.0.1', port=0, latency=0.5, jitter=0.0, fail_rate=0.0):
+    """Start the fake server on a background thread, returns the server (see server.server_address)"""
+    server = FakeOpenAIServer((host, port), latency=latency, jitter=jitter, fail_rate=fail_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency', type=float, default=0.5, help='seconds per completion')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds of random latency')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer((args.host, args.port), args.latency, args.jitter, args.fail_rate)
+    print(f"Fake OpenAI API on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,336 @@
+"""Load test for the API and AI endpoints.
+
+Seeds N recipes (see seed.py), starts the local fake OpenAI server for the AI
+endpoints and drives each endpoint at a fixed concurrency, either in-process
+through the Flask test client or over HTTP (an in-process threaded server, or
+any running deployment with --url). Reports p50/p95/p99 latency, throughput,
+errors and peak RSS per endpoint, and writes the results as JSON.
+
+    python bench/loadtest.py --recipes 100000 --concurrency 16 --output results.json
+    python bench/loadtest.py --mode http --compare baseline.json
+
+With --compare, endpoints whose p95 latency rose or throughput fell by more
+than --threshold against a previous results file are listed and the exit
+status is 1, so the run can gate a release.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+import argparse
+import contextlib
+import http.client
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+from fake_openai import start_server
+from seed import seed_database, INGREDIENTS, PROTEINS, DISHES
+
+SEARCH_TERMS = PROTEINS + [d.lower() for d in DISHES] + ['spicy chicken', 'creamy pasta', 'garl']
+
+def _recipe_body(rng):
+    return {
+        'title': f'Load test recipe {rng.randrange(10 ** 9)}',
+        'ingredients': rng.sample(INGREDIENTS, 5),
+        'instructions': 'Mix and cook.',
+    }
+
+# name -> (needs the fake OpenAI server, builds (method, path, json_body) from (rng, recipe_count))
+ENDPOINTS = {
+    'list': (False, lambda rng, n: ('GET', '/api/recipes?limit=50', None)),
+    'list_fields': (False, lambda rng, n: ('GET', '/api/recipes?limit=50&fields=id,title,cuisine', None)),
+    'get': (False, lambda rng, n: ('GET', f'/api/recipes/{rng.randint(1, n)}', None)),
+    'search': (False, lambda rng, n: ('GET', f'/api/recipes/search?q={quote(rng.choice(SEARCH_TERMS))}&limit=20', None)),
+    'by_ingredients': (False, lambda rng, n: (
+        'GET', f"/api/recipes/by-ingredients?ingredients={','.join(rng.sample(INGREDIENTS + PROTEINS, 6))}", None
+    )),
+    'stats': (False, lambda rng, n: ('GET', '/api/stats', None)),
+    'ndjson': (False, lambda rng, n: ('GET', '/api/recipes?format=ndjson&limit=1000', None)),
+    'create': (False, lambda rng, n: ('POST', '/api/recipes', _recipe_body(rng))),
+    'health': (False, lambda rng, n: ('GET', '/api/health', None)),
+    'generate_recipe': (True, lambda rng, n: (
+        'POST', '/api/generate-recipe', {'ingredients': rng.sample(INGREDIENTS, 4)}
+    )),
+    'ai_chef': (True, lambda rng, n: (
+        'POST', '/api/ai-chef', {'prompt': f'How long should I roast {rng.choice(INGREDIENTS)}? {rng.random()}'}
+    )),
+}
+
+class RssSampler:
+    """Peak resident set size of this process while running, sampled from /proc"""
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current():
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except OSError:
+            # No /proc (macOS): fall back to the lifetime peak, reported in bytes there
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+class TestClientDriver:
+    """Sends requests through the Flask test client, one client per thread"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        response.get_data()  # drain streamed bodies
+        response.close()
+        return response.status_code
+
+class HTTPDriver:
+    """Sends requests over keep-alive HTTP connections, one per thread"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self._local = threading.local()
+
+    def request(self, method, path, body):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            conn.request(method, self.prefix + path, body=payload, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self._local.conn = None
+            raise
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_endpoint(driver, build, recipe_count, requests, concurrency, warmup, seed, measure_rss):
+    """Issue requests to one endpoint from concurrency threads and summarize the latencies"""
+    for i in range(warmup):
+        driver.request(*build(random.Random(seed - i - 1), recipe_count))
+
+    counter = itertools.count()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        local_latencies, local_errors = [], 0
+        while next(counter) < requests:
+            method, path, body = build(rng, recipe_count)
+            started = time.perf_counter()
+            try:
+                status = driver.request(method, path, body)
+            except Exception:
+                status = None
+            local_latencies.append(time.perf_counter() - started)
+            if status is None or status >= 400:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    with RssSampler() if measure_rss else contextlib.nullcontext() as sampler:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    to_ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors),
+        'p50_ms': to_ms(percentile(latencies, 0.50)),
+        'p95_ms': to_ms(percentile(latencies, 0.95)),
+        'p99_ms': to_ms(percentile(latencies, 0.99)),
+        'mean_ms': to_ms(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': to_ms(latencies[-1]) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'peak_rss_mb': round(sampler.peak / 2 ** 20, 1) if sampler else None,
+    }
+
+def compare(results, baseline, threshold):
+    """Endpoints that regressed against a previous results file, as printable lines"""
+    regressions = []
+    for key in ('mode', 'database', 'recipes', 'concurrency', 'cache'):
+        if baseline.get('meta', {}).get(key) != results['meta'][key]:
+            print(f"warning: baseline was run with {key}={baseline.get('meta', {}).get(key)!r}, "
+                  f"this run with {key}={results['meta'][key]!r}")
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        if previous.get('p95_ms') and current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if previous.get('throughput_rps') and current['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{name}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+    return regressions
+
+def git_revision():
+    try:
+        with os.popen(f'git -C {os.path.join(BENCH_DIR, "..")} rev-parse --short HEAD 2>/dev/null') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipes', type=int, default=10000, help='recipes to seed (1k to 1M)')
+    parser.add_argument('--database-url', help='database to seed and test (default: a fresh SQLite file)')
+    parser.add_argument('--mode', choices=['testclient', 'http'], default='testclient')
+    parser.add_argument('--url', help='test a running server over HTTP instead of an in-process app')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+    parser.add_argument('--ai-requests', type=int, default=50, help='requests per AI endpoint')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma-separated subset to run')
+    parser.add_argument('--ai-latency', type=float, default=0.5, help='fake OpenAI seconds per completion')
+    parser.add_argument('--cache', action='store_true', help='keep the response and AI caches enabled')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results JSON here')
+    parser.add_argument('--compare', help='previous results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args()
+
+    names = [n.strip() for n in args.endpoints.split(',') if n.strip()]
+    unknown = [n for n in names if n not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # The app reads its configuration at import time, and keeps its files in the working directory
+    workdir = tempfile.mkdtemp(prefix='ez-bench-')
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{workdir}/bench.db'
+    os.environ.setdefault('JOB_WORKERS', '0')
+    os.environ['OPENAI_API_KEY'] = 'fake'
+    # Every simulated client shares one address; measure the endpoints, not the limiter
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    if not args.cache:
+        os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+        os.environ['AI_CACHE_BACKEND'] = 'none'
+    fake = None
+    if any(ENDPOINTS[n][0] for n in names) and not args.url:
+        fake = start_server(latency=args.ai_latency)
+        os.environ['OPENAI_BASE_URL'] = f'http://127.0.0.1:{fake.server_address[1]}/v1'
+
+    seeding = None
+    app = server = None
+    if not args.url:
+        seeding = seed_database(args.recipes, seed=args.seed)
+        print(f"Seeded: {seeding}")
+        from app import create_app
+        app = create_app()
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    if args.url:
+        driver = HTTPDriver(args.url)
+    elif args.mode == 'http':
+        from werkzeug.serving import make_server
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        driver = HTTPDriver(f'http://127.0.0.1:{server.server_port}')
+    else:
+        driver = TestClientDriver(app)
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'mode': 'http' if args.url else args.mode,
+            'target': args.url,
+            'database': os.environ['DATABASE_URL'].split(':', 1)[0],
+            'recipes': args.recipes,
+            'concurrency': args.concurrency,
+            'cache': args.cache,
+            'ai_latency': args.ai_latency if fake else None,
+        },
+        'seed': seeding,
+        'endpoints': {},
+    }
+
+    print(f"{'endpoint':16} {'reqs':>6} {'err':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'rss MB':>8}")
+    for name in names:
+        needs_ai, build = ENDPOINTS[name]
+        stats = run_endpoint(
+            driver, build, args.recipes,
+            requests=args.ai_requests if needs_ai else args.requests,
+            concurrency=args.concurrency, warmup=args.warmup, seed=args.seed,
+            measure_rss=app is not None
+        )
+        results['endpoints'][name] = stats
+        print(f"{name:16} {stats['requests']:6} {stats['errors']:5} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} "
+              f"{stats['p99_ms']:9.2f} {stats['throughput_rps']:9.1f} {stats['peak_rss_mb'] or 0:8.1f}")
+
+    if server:
+        server.shutdown()
+    if fake:
+        fake.shutdown()
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Seed the configured database with synthetic recipes.
+
+Rows go through the bulk import path (batched inserts plus search index and
+ingredient links), so the schema from database.py is used as-is on SQLite and
+Postgres alike. Seeding is deterministic and tops up: an existing database
+that already holds N recipes is left alone.
+
+    DATABASE_URL=sqlite:///bench.db python bench/seed.py --recipes 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+CUISINES = ['Italian', 'Indian', 'Mexican', 'Chinese', 'Thai', 'French', 'Japanese', 'Greek', 'American', 'Korean']
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+ADJECTIVES = ['Spicy', 'Creamy', 'Crispy', 'Smoky', 'Zesty', 'Hearty', 'Quick', 'Roasted', 'Garlic', 'Herbed']
+DISHES = ['Pasta', 'Curry', 'Tacos', 'Stir Fry', 'Soup', 'Salad', 'Risotto', 'Stew', 'Noodles', 'Bake', 'Pancakes']
+PROTEINS = ['chicken', 'tofu', 'beef', 'shrimp', 'chickpea', 'lentil', 'salmon', 'pork', 'egg', 'mushroom']
+INGREDIENTS = [
+    'onion', 'garlic', 'tomato', 'olive oil', 'salt', 'black pepper', 'butter', 'flour', 'rice', 'pasta',
+    'ginger', 'soy sauce', 'lime', 'lemon', 'cilantro', 'basil', 'parmesan', 'cream', 'milk', 'potato',
+    'carrot', 'celery', 'bell pepper', 'spinach', 'cumin', 'paprika', 'chili flakes', 'coconut milk',
+    'honey', 'vinegar', 'sesame oil', 'green onion', 'corn', 'black beans', 'cheddar', 'yogurt',
+]
+QUANTITIES = ['1', '2', '3', '1/2', '1 1/2', '200g', '400g', '1 cup', '2 cups', '2 tbsp', '1 tsp', 'a pinch of']
+
+def generate_recipes(count, start=0, seed=0):
+    """Yield (row_number, recipe) pairs for bulk.import_recipes, the same ones for the same seed"""
+    for number in range(start, start + count):
+        rng = random.Random(seed * 1_000_003 + number)
+        protein = rng.choice(PROTEINS)
+        dish = rng.choice(DISHES)
+        items = [protein] + rng.sample(INGREDIENTS, rng.randint(4, 10))
+        yield number + 1, {
+            'title': f'{rng.choice(ADJECTIVES)} {protein.title()} {dish} #{number + 1}',
+            'description': f'A {rng.choice(DIFFICULTIES).lower()} {dish.lower()} with {protein} and {items[1]}',
+            'ingredients': [f'{rng.choice(QUANTITIES)} {item}' for item in items],
+            'instructions': '\n'.join(
+                f'{step}. {rng.choice(["Chop", "Stir in", "Simmer", "Roast", "Season", "Fold in"])} the {item}.'
+                for step, item in enumerate(items, 1)
+            ),
+            'cooking_time': rng.randint(10, 120),
+            'servings': rng.randint(1, 8),
+            'difficulty': rng.choice(DIFFICULTIES),
+            'cuisine': rng.choice(CUISINES),
+        }
+
+def seed_database(count, batch_size=5000, seed=0):
+    """Insert recipes until the database holds at least count of them, returns a summary"""
+    from sqlalchemy import func
+    import database
+    from search import init_search_index
+    from ingredients import init_ingredient_index
+    from stats import init_recipe_stats
+    from bulk import import_recipes
+
+    database.init_db()
+    init_search_index()
+    init_ingredient_index()
+    init_recipe_stats()
+
+    db = database.get_db_session()
+    try:
+        existing = db.query(func.count(database.Recipe.id)).scalar()
+        missing = max(0, count - existing)
+        started = time.perf_counter()
+        report = import_recipes(db, generate_recipes(missing, start=existing, seed=seed), batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+    finally:
+        db.close()
+    return {
+        'existing': existing,
+        'inserted': report['imported'],
+        'failed': report['failed'],
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(report['imported'] / elapsed) if report['imported'] and elapsed else None,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipes', type=int, default=10000, help='total recipes the database should hold')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(seed_database(args.recipes, batch_size=args.batch_size, seed=args.seed))
@@ -0,0 +1,236 @@
+from sqlalchemy import insert
+from types import SimpleNamespace
+from datetime import datetime, timezone
+import codecs
+import json
+import zlib
+import logging
+from database import Recipe
+from search import index_recipes
+from ingredients import sync_ingredients_for_recipes
+from embeddings import update_recipe_embeddings
+from stats import record_new_recipes
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request body per chunk
+READ_CHUNK_SIZE = 64 * 1024
+
+# Per-row errors reported back to the client; the counts are always complete
+MAX_REPORTED_ERRORS = 100
+
+class BulkFormatError(ValueError):
+    """The request body is not a parseable NDJSON stream or JSON array"""
+
+def iter_body_chunks(stream, gzipped=False):
+    """Yield the request body in chunks, gunzipping on the fly when gzipped"""
+    decompressor = zlib.decompressobj(wbits=31) if gzipped else None
+    while True:
+        chunk = stream.read(READ_CHUNK_SIZE)
+        if not chunk:
+            break
+        if decompressor:
+            try:
+                chunk = decompressor.decompress(chunk)
+            except zlib.error as e:
+                raise BulkFormatError(f'Invalid gzip body: {e}')
+        if chunk:
+            yield chunk
+    if decompressor:
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+
+def iter_ndjson(chunks):
+    """Yield (row_number, object_or_error) for each non-blank line of an NDJSON body"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    row = 0
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                row += 1
+                yield row, _parse_line(line)
+    buffer += decoder.decode(b'', final=True)
+    if buffer.strip():
+        yield row + 1, _parse_line(buffer)
+
+def _parse_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return BulkFormatError(f'Invalid JSON: {e}')
+
+def iter_json_array(chunks):
+    """Yield (row_number, object) for each element of a JSON array, decoding incrementally"""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    json_decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    row = 0
+    started = False
+    chunks = iter(chunks)
+    exhausted = False
+
+    def fill():
+        nonlocal buffer, position, exhausted
+        chunk = next(chunks, None)
+        if chunk is None:
+            buffer = buffer[position:] + decoder.decode(b'', final=True)
+            exhausted = True
+        else:
+            buffer = buffer[position:] + decoder.decode(chunk)
+        position = 0
+
+    while True:
+        # Skip whitespace and separators between elements
+        while position < len(buffer) and buffer[position] in ' \t\r\n' + (',' if started and row else ''):
+            position += 1
+        if position >= len(buffer):
+            if exhausted:
+                raise BulkFormatError('Unexpected end of JSON array')
+            fill()
+            continue
+        if not started:
+            if buffer[position] != '[':
+                raise BulkFormatError('Expected a JSON array')
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+        try:
+            value, end = json_decoder.raw_decode(buffer, position)
+        except ValueError as e:
+            if exhausted:
+                raise BulkFormatError(f'Invalid JSON at element {row + 1}: {e}')
+            fill()  # the element is probably split across chunks
+            continue
+        row += 1
+        position = end
+        yield row, value
+
+# Optional text columns; lengths come from the recipes table so they can't drift from the schema
+TEXT_FIELDS = ('description', 'difficulty', 'cuisine', 'image_url')
+
+def _check_text(data, field, required=False):
+    value = data.get(field)
+    if value is None and not required:
+        return
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    length = Recipe.__table__.c[field].type.length
+    if length is not None and len(value) > length:
+        raise ValueError(f'{field} must be at most {length} characters')
+
+def _parse_timestamp(data, field, default):
+    value = data.get(field)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be an ISO 8601 timestamp')
+    try:
+        parsed = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    except ValueError:
+        raise ValueError(f'{field} must be an ISO 8601 timestamp')
+    if parsed.tzinfo is not None:
+        # Stored naive in UTC, like datetime.utcnow()
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def validate_recipe_row(data):
+    """Check one imported row and map it to recipes columns, raises ValueError with the reason
+
+    Every column is type-checked here, so a bad row is reported against its row
+    number instead of failing the INSERT of its whole batch.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Row must be a JSON object')
+    if not data.get('title') or not data.get('ingredients') or not data.get('instructions'):
+        raise ValueError('Missing required fields')
+    _check_text(data, 'title', required=True)
+    _check_text(data, 'instructions', required=True)
+    for field in TEXT_FIELDS:
+        _check_text(data, field)
+    if not isinstance(data['ingredients'], list) or not all(isinstance(i, str) for i in data['ingredients']):
+        raise ValueError('ingredients must be a list of strings')
+    for field in ('cooking_time', 'servings'):
+        value = data.get(field)
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool)):
+            raise ValueError(f'{field} must be an integer')
+    if not isinstance(data.get('is_public', True), bool):
+        raise ValueError('is_public must be true or false')
+
+    # Exported rows carry their timestamps, so export followed by import round-trips
+    now = datetime.utcnow()
+    created_at = _parse_timestamp(data, 'created_at', now)
+    return {
+        'title': data['title'],
+        'description': data.get('description', ''),
+        'ingredients': json.dumps(data['ingredients']),
+        'instructions': data['instructions'],
+        'cooking_time': data.get('cooking_time'),
+        'servings': data.get('servings'),
+        'difficulty': data.get('difficulty'),
+        'cuisine': data.get('cuisine'),
+        'image_url': data.get('image_url'),
+        'is_public': data.get('is_public', True),
+        'created_at': created_at,
+        'updated_at': _parse_timestamp(data, 'updated_at', now),
+    }
+
+def _insert_batch(db, rows):
+    """Insert validated rows with one executemany, then index them, in one transaction"""
+    ids = db.execute(
+        insert(Recipe).returning(Recipe.id, sort_by_parameter_order=True),
+        rows
+    ).scalars().all()
+    recipes = [SimpleNamespace(id=recipe_id, **row) for recipe_id, row in zip(ids, rows)]
+    index_recipes(db, recipes)
+    sync_ingredients_for_recipes(db, recipes)
+    record_new_recipes(db, recipes)
+    db.commit()
+    update_recipe_embeddings(recipes)
+
+def import_recipes(db, rows, batch_size=500):
+    """Validate and insert (row_number, data) pairs in batches, returns a per-row report"""
+    imported = 0
+    errors = []
+    failed = 0
+    batch = []
+    for row_number, data in rows:
+        try:
+            if isinstance(data, Exception):
+                raise data
+            batch.append(validate_recipe_row(data))
+        except ValueError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': row_number, 'error': str(e)})
+            continue
+        if len(batch) >= batch_size:
+            _insert_batch(db, batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        _insert_batch(db, batch)
+        imported += len(batch)
+    return {'imported': imported, 'failed': failed, 'errors': errors}
+
+def export_recipes_gzip(rows, encode, flush_bytes=256 * 1024):
+    """Yield gzip-compressed NDJSON for rows (encode turns a row into JSON text), in roughly flush_bytes pieces"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = []
+    pending_size = 0
+    for row in rows:
+        line = (encode(row) + '\n').encode('utf-8')
+        pending.append(line)
+        pending_size += len(line)
+        if pending_size >= flush_bytes:
+            compressed = compressor.compress(b''.join(pending))
+            pending, pending_size = [], 0
+            if compressed:
+                yield compressed
+    yield compressor.compress(b''.join(pending)) + compressor.flush()
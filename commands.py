@@ -0,0 +1,114 @@
+import click
+import logging
+from database import get_db_session
+from search import rebuild_search_index
+from ingredients import backfill_recipe_ingredients
+import embeddings
+from stats import rebuild_recipe_stats
+from listing import hot_listing_queries, explain_query
+import improve
+
+logger = logging.getLogger(__name__)
+
+def register_commands(app):
+    """Attach maintenance commands to the Flask CLI"""
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index_command():
+        """Re-index every recipe for full-text search"""
+        db = get_db_session()
+        try:
+            rebuild_search_index(db)
+            db.commit()
+            click.echo('Search index rebuilt')
+        finally:
+            db.close()
+
+    @app.cli.command('backfill-ingredients')
+    def backfill_ingredients_command():
+        """Rebuild the normalized ingredient tables from each recipe's JSON ingredients"""
+        db = get_db_session()
+        try:
+            count = backfill_recipe_ingredients(db)
+            click.echo(f'Backfilled ingredients for {count} recipes')
+        finally:
+            db.close()
+
+    @app.cli.command('rebuild-embeddings')
+    def rebuild_embeddings_command():
+        """Recompute the similarity vectors of every public recipe"""
+        db = get_db_session()
+        try:
+            count = embeddings.store.rebuild(db)
+            click.echo(f'Computed embeddings for {count} recipes')
+        finally:
+            db.close()
+
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats_command():
+        """Recount the /api/stats summary table from the recipes table"""
+        db = get_db_session()
+        try:
+            count = rebuild_recipe_stats(db)
+            click.echo(f'Computed statistics for {count} recipes')
+        finally:
+            db.close()
+
+    @app.cli.command('check-query-plans')
+    @click.option('--verbose', is_flag=True, help='Print every plan, not just the failing ones')
+    def check_query_plans_command(verbose):
+        """EXPLAIN the hot listing queries and fail if any of them is not served by an index"""
+        db = get_db_session()
+        failures = 0
+        try:
+            for name, query in hot_listing_queries(db):
+                plan, uses_index = explain_query(db, query)
+                failures += not uses_index
+                click.echo(f"{'ok  ' if uses_index else 'FAIL'} {name}")
+                if verbose or not uses_index:
+                    click.echo('\n'.join(f'       {line}' for line in plan.splitlines()))
+        finally:
+            db.rollback()
+            db.close()
+        if failures:
+            raise click.ClickException(f'{failures} queries are not served by an index; run `alembic upgrade head`')
+
+    @app.cli.command('improve-recipes')
+    @click.option('--select', 'selection', type=click.Choice(list(improve.SELECTIONS)), default='missing-description',
+                  show_default=True, help='Which recipes to improve')
+    @click.option('--limit', type=int, help='Improve at most this many recipes')
+    @click.option('--concurrency', type=int, default=4, show_default=True, help='Model calls in flight at once')
+    @click.option('--batch-size', type=int, default=50, show_default=True, help='Recipes written per transaction')
+    @click.option('--checkpoint', default='improve_checkpoint.jsonl', show_default=True,
+                  help='Progress log; rerunning with the same file resumes an interrupted run')
+    @click.option('--dry-run', is_flag=True, help='Only estimate the tokens and cost of the run')
+    @click.option('--no-cache', is_flag=True, help='Call the model even for recipes with a cached answer')
+    def improve_recipes_command(selection, limit, concurrency, batch_size, checkpoint, dry_run, no_cache):
+        """Rewrite the descriptions and instructions of stored recipes with the model"""
+        db = get_db_session()
+        try:
+            if dry_run:
+                estimate = improve.estimate_improvement_cost(db, selection, limit)
+                cost = estimate['max_cost_usd']
+                click.echo(
+                    f"{estimate['recipes']} recipes, {estimate['prompt_tokens']} prompt tokens, "
+                    f"at most {estimate['max_completion_tokens']} completion tokens on {estimate['model']}"
+                    + (f", at most ${cost:.2f}" if cost is not None else '')
+                )
+                return
+
+            def progress(summary):
+                done = summary['improved'] + summary['failed']
+                if done % 10 == 0:
+                    click.echo(f"{summary['improved']} improved, {summary['failed']} failed")
+
+            summary = improve.improve_recipes(
+                db, selection, checkpoint_path=checkpoint, concurrency=concurrency, batch_size=batch_size,
+                limit=limit, use_cache=not no_cache, progress=progress
+            )
+            click.echo(
+                f"Improved {summary['improved']} recipes ({summary['failed']} failed); "
+                f"wrote {summary['resumed']} answers from the checkpoint"
+            )
+        finally:
+            db.close()
@@ -13,13 +13,102 @@ class Config:
     # Database configuration
     DATABASE_URL = os.environ.get('DATABASE_URL') or 'sqlite:///ez_cooking.db'
     
+    # Response cache for recipe reads: 'memory', 'sqlite' (shared between processes) or 'none'.
+    # gunicorn.conf.py defaults to 'sqlite' when it runs more than one worker
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300))  # seconds
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 2048))
+    RESPONSE_CACHE_PATH = os.environ.get('RESPONSE_CACHE_PATH', 'response_cache.db')
+    
+    # Connection pool
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a connection
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))  # seconds before a connection is replaced
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    
+    # Recipe listing pagination
+    RECIPES_PAGE_SIZE = int(os.environ.get('RECIPES_PAGE_SIZE', 50))
+    RECIPES_MAX_PAGE_SIZE = int(os.environ.get('RECIPES_MAX_PAGE_SIZE', 500))
+    BULK_IMPORT_BATCH_SIZE = int(os.environ.get('BULK_IMPORT_BATCH_SIZE', 500))
+    
+    # Recipe vectors for /api/recipes/<id>/similar, memory-mapped from a local file
+    EMBEDDINGS_PATH = os.environ.get('EMBEDDINGS_PATH', 'recipe_embeddings.f32')
+    EMBEDDING_DIM = int(os.environ.get('EMBEDDING_DIM', 256))  # 1KB per recipe; changing it rebuilds the file
+    
+    # /api/generate-recipe answers from a stored recipe when its ingredient overlap with the
+    # request (Dice score, 0-1) reaches this, and only calls the model below it
+    LOCAL_RECIPE_MATCH = os.environ.get('LOCAL_RECIPE_MATCH', 'true').lower() == 'true'
+    LOCAL_RECIPE_MIN_SCORE = float(os.environ.get('LOCAL_RECIPE_MIN_SCORE', 0.85))
+    
     # OpenAI configuration
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
+    OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL')  # e.g. a local stub server
+    OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 60))
+    
+    # Shared asyncio client: concurrency cap, retries and per-model limits
+    # as "model=requests_per_min:tokens_per_min,..."
+    OPENAI_ASYNC = os.environ.get('OPENAI_ASYNC', 'true').lower() == 'true'
+    OPENAI_MAX_CONCURRENCY = int(os.environ.get('OPENAI_MAX_CONCURRENCY', 8))
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 4))
+    OPENAI_RATE_LIMITS = os.environ.get('OPENAI_RATE_LIMITS', '')
+    
+    # AI response cache: 'memory' (per-process LRU), 'sqlite' (shared file) or 'none'
+    AI_CACHE_BACKEND = os.environ.get('AI_CACHE_BACKEND', 'memory')
+    AI_CACHE_TTL = int(os.environ.get('AI_CACHE_TTL', 24 * 60 * 60))  # seconds
+    AI_CACHE_MAX_ENTRIES = int(os.environ.get('AI_CACHE_MAX_ENTRIES', 1024))
+    AI_CACHE_PATH = os.environ.get('AI_CACHE_PATH', 'ai_cache.db')
+    
+    # Per-client token buckets for the expensive endpoints, refilled at RATE_LIMIT_PER_MINUTE
+    # up to RATE_LIMIT_BURST, with a cost per request as "endpoint=tokens,..."; 'memory'
+    # limits each process on its own, 'sqlite' shares the buckets between workers
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_PATH = os.environ.get('RATE_LIMIT_PATH', 'ratelimit.db')
+    RATE_LIMIT_PER_MINUTE = float(os.environ.get('RATE_LIMIT_PER_MINUTE', 20))
+    RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', 20))
+    RATE_LIMIT_COSTS = os.environ.get('RATE_LIMIT_COSTS', 'upload-image=4,generate-recipe=2,ai-chef=2')
+    RATE_LIMIT_PROXY_HOPS = int(os.environ.get('RATE_LIMIT_PROXY_HOPS', 0))  # proxies in front that set X-Forwarded-For
+    # Requests calling the model at once across the service (0 = no cap); more get a 503
+    AI_MAX_IN_FLIGHT = int(os.environ.get('AI_MAX_IN_FLIGHT', 16))
     
     # File upload configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     UPLOAD_FOLDER = 'uploads'
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
     
+    # Browser caching for static files and uploads that aren't fingerprinted or content-addressed
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 24 * 60 * 60))  # seconds
+    
+    # Widths served as /uploads/<name>?w=<width>, generated on first request
+    THUMBNAIL_WIDTHS = tuple(int(w) for w in os.environ.get('THUMBNAIL_WIDTHS', '160,320,640').split(','))
+    THUMBNAIL_QUALITY = int(os.environ.get('THUMBNAIL_QUALITY', 80))
+    
+    # Uploaded images are downscaled to fit this box and re-encoded before analysis
+    IMAGE_MAX_DIMENSION = int(os.environ.get('IMAGE_MAX_DIMENSION', 1536))
+    IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 85))
+    # Vision detail level: 'auto' (low for images no bigger than 512px), 'low' or 'high'
+    IMAGE_DETAIL = os.environ.get('IMAGE_DETAIL', 'auto')
+    
+    # Background jobs (image analysis), queued in a local SQLite file
+    JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', 'jobs.db')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_QUEUE_MAX_PENDING = int(os.environ.get('JOB_QUEUE_MAX_PENDING', 100))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+    JOB_STALE_AFTER = int(os.environ.get('JOB_STALE_AFTER', 600))  # seconds
+    
+    # Requests slower than this many milliseconds are logged with their query breakdown (0 = off)
+    SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 0))
+    
+    # Production server (gunicorn -c gunicorn.conf.py wsgi:app); 0 workers = 2 x CPUs + 1
+    SERVER_BIND = os.environ.get('SERVER_BIND') or f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 0))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 4))  # per worker; AI calls mostly wait on I/O
+    SERVER_TIMEOUT = int(os.environ.get('SERVER_TIMEOUT', 120))  # seconds before a silent worker is restarted
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))  # seconds to finish in-flight work on shutdown
+    SERVER_KEEPALIVE = int(os.environ.get('SERVER_KEEPALIVE', 5))
+    SERVER_MAX_REQUESTS = int(os.environ.get('SERVER_MAX_REQUESTS', 0))  # recycle a worker after this many requests (0 = never)
+    SERVER_PRELOAD = os.environ.get('SERVER_PRELOAD', 'true').lower() == 'true'
+    
     # CORS configuration
     CORS_ORIGINS = ['http://localhost:5000', 'http://127.0.0.1:5000'] 
\ No newline at end of file
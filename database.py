@@ -1,12 +1,32 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Float, Boolean
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, Float, Boolean, ForeignKey, Index
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool, StaticPool
 from datetime import datetime
+import threading
+import time
 import os
 from config import Config
 
 Base = declarative_base()
 
+def _not_postgresql(ddl, target, bind, **kw):
+    return kw['dialect'].name != 'postgresql'
+
+def listing_indexes(name, prefix, sort_column, id_column):
+    """An index serving `WHERE <prefix> = ... ORDER BY sort DESC NULLS LAST, id DESC` (and its reverse)
+
+    NULLs sort lowest in listings. That is SQLite's native index order, while
+    Postgres needs the NULLS LAST spelled out in the index, so the index is
+    declared once per backend and only one of the two is created.
+    """
+    return (
+        Index(name, *prefix, sort_column.desc().nulls_last(), id_column.desc()).ddl_if(dialect='postgresql'),
+        Index(name, *prefix, sort_column, id_column).ddl_if(callable_=_not_postgresql),
+    )
+
 class Recipe(Base):
     __tablename__ = 'recipes'
     
@@ -24,6 +44,48 @@ class Recipe(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_public = Column(Boolean, default=True)
     user_id = Column(String(100))  # For future user system
+    # Distinct canonical ingredients, kept in step with recipe_ingredients by ingredients.py
+    ingredient_count = Column(Integer, nullable=False, default=0, server_default='0')
+    
+    # Serve the listing filters and sorts in listing.py; created by migrations/versions/0002
+    __table_args__ = (
+        *listing_indexes('ix_recipes_public_created', (is_public,), created_at, id),
+        *listing_indexes('ix_recipes_public_cuisine_created', (is_public, cuisine), created_at, id),
+        *listing_indexes('ix_recipes_public_difficulty_created', (is_public, difficulty), created_at, id),
+        *listing_indexes('ix_recipes_public_cooking_time', (is_public,), cooking_time, id),
+        *listing_indexes('ix_recipes_user_created', (user_id, is_public), created_at, id),
+    )
+
+class Ingredient(Base):
+    __tablename__ = 'ingredients'
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), unique=True, nullable=False)  # canonical name, see ingredients.canonicalize_ingredient
+
+class RecipeIngredient(Base):
+    __tablename__ = 'recipe_ingredients'
+    
+    # The primary key serves recipe -> ingredients lookups,
+    # the secondary index serves the ingredient -> recipes reverse lookup
+    recipe_id = Column(Integer, ForeignKey('recipes.id'), primary_key=True)
+    ingredient_id = Column(Integer, ForeignKey('ingredients.id'), primary_key=True)
+    
+    __table_args__ = (
+        Index('ix_recipe_ingredients_ingredient_recipe', 'ingredient_id', 'recipe_id'),
+    )
+
+class RecipeStat(Base):
+    __tablename__ = 'recipe_stats'
+    
+    # Running count of public recipes per (dimension, key), kept current by stats.py:
+    # e.g. ('cuisine', 'Italian'), ('ingredient', 'tomato'), ('created_month', '2024-05')
+    dimension = Column(String(20), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index('ix_recipe_stats_dimension_count', 'dimension', 'count'),
+    )
 
 class User(Base):
     __tablename__ = 'users'
@@ -38,19 +100,134 @@ class User(Base):
 # Database setup
 engine = None
 SessionLocal = None
+db_session = None
+
+# Applied to every new SQLite connection: WAL lets readers run alongside a writer
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,  # ms to wait for a lock instead of failing with "database is locked"
+    'cache_size': -64000,  # 64MB page cache
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
+}
+
+class PoolWaitStats:
+    """How long connection checkouts had to wait for a free pooled connection"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, wait, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += int(timed_out)
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def as_dict(self):
+        return {
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+        }
+
+pool_wait_stats = PoolWaitStats()
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait times in pool_wait_stats"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_wait_stats.record(time.perf_counter() - start)
+        return connection
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+def build_engine(database_url):
+    """Create an engine with the pool settings from Config"""
+    url = make_url(database_url)
+    is_sqlite = url.get_backend_name() == 'sqlite'
+    
+    if is_sqlite and url.database in (None, '', ':memory:'):
+        # An in-memory database only exists on its one connection
+        engine = create_engine(url, poolclass=StaticPool, connect_args={'check_same_thread': False})
+    else:
+        engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=Config.DB_POOL_SIZE,
+            max_overflow=Config.DB_MAX_OVERFLOW,
+            pool_timeout=Config.DB_POOL_TIMEOUT,
+            pool_recycle=Config.DB_POOL_RECYCLE,
+            pool_pre_ping=Config.DB_POOL_PRE_PING
+        )
+    
+    if is_sqlite:
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
+    return engine
 
 def init_db():
-    global engine, SessionLocal
+    global engine, SessionLocal, db_session
     
     # Create database engine
-    engine = create_engine(Config.DATABASE_URL)
+    engine = build_engine(Config.DATABASE_URL)
     
-    # Create session factory
+    # Create session factory, plus a thread-local registry so that every
+    # get_db_session() call within one request shares one session and connection
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db_session = scoped_session(SessionLocal)
     
     # Create all tables
     Base.metadata.create_all(bind=engine)
 
+def _reset_engine_after_fork():
+    # Pooled connections inherited from the parent share its sockets and file handles.
+    # Drop them without closing (closing would end the parent's connections too) so the
+    # child opens its own, and give the child a fresh thread-local session registry
+    global db_session
+    if engine is not None:
+        engine.dispose(close=False)
+        db_session = scoped_session(SessionLocal)
+
+# Pre-forking servers (gunicorn --preload) create the engine before forking workers
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_engine_after_fork)
+
+def remove_db_session(exception=None):
+    """Close the current thread's session and return its connection to the pool (request teardown)"""
+    if db_session is not None:
+        db_session.remove()
+
+def get_pool_stats():
+    """Pool utilization and checkout wait times, for sizing the pool under load"""
+    pool = engine.pool
+    stats = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+        })
+    stats.update(pool_wait_stats.as_dict())
+    return stats
+
 def get_db():
     """Get database session"""
     if SessionLocal is None:
@@ -63,8 +240,8 @@ def get_db():
         db.close()
 
 def get_db_session():
-    """Get a database session for direct use"""
+    """Get the current thread's (request's) database session"""
     if SessionLocal is None:
         raise RuntimeError("Database not initialized. Call init_db() first.")
     
-    return SessionLocal() 
\ No newline at end of file
+    return db_session() 
\ No newline at end of file
@@ -0,0 +1,258 @@
+import numpy as np
+import json
+import os
+import re
+import struct
+import tempfile
+import threading
+import zlib
+import logging
+import database
+from database import Recipe
+from ingredients import canonical_ingredient_names
+
+try:
+    import fcntl  # serializes file growth between worker processes (POSIX only)
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# File layout: a 64-byte header, then one float32 row per recipe id (row N is recipe N,
+# all zeros when the recipe is missing or private)
+MAGIC = b'EZEMB'
+FEATURE_VERSION = 1  # bump when recipe_features() changes so stored vectors are rebuilt
+HEADER_SIZE = 64
+HEADER = struct.Struct('<5sBI')
+
+# Rows scored per matrix product; bounds the temporary score arrays on large catalogs
+SCORE_CHUNK_ROWS = 65536
+REBUILD_BATCH_SIZE = 5000
+
+# Feature weights: title words count most, then ingredients, then cuisine and spelling
+TITLE_WORD_WEIGHT = 1.5
+TITLE_TRIGRAM_WEIGHT = 0.5
+INGREDIENT_WEIGHT = 2.0
+INGREDIENT_WORD_WEIGHT = 1.0
+CUISINE_WEIGHT = 1.5
+
+def recipe_features(title, ingredients, cuisine):
+    """(feature, weight) pairs describing a recipe; ingredients is the JSON column text"""
+    features = []
+    for word in re.findall(r'[a-z0-9]+', (title or '').lower()):
+        features.append((f'w:{word}', TITLE_WORD_WEIGHT))
+        # Character trigrams match spelling variants: "spaghetti" ~ "spagetti"
+        padded = f' {word} '
+        features.extend((f'g:{padded[i:i + 3]}', TITLE_TRIGRAM_WEIGHT) for i in range(len(padded) - 2))
+    try:
+        items = json.loads(ingredients) if ingredients else []
+    except ValueError:
+        items = []
+    for name in canonical_ingredient_names(items if isinstance(items, list) else []):
+        features.append((f'i:{name}', INGREDIENT_WEIGHT))
+        features.extend((f'w:{word}', INGREDIENT_WORD_WEIGHT) for word in name.split())
+    if cuisine and cuisine.strip():
+        features.append((f'c:{cuisine.strip().lower()}', CUISINE_WEIGHT))
+    return features
+
+def embed_recipes(recipes, dim):
+    """Unit-length float32 vectors (len(recipes), dim) from hashed recipe features
+
+    Each feature is hashed with crc32 into one of dim buckets, with the hash's top bit
+    choosing a +/- sign so that colliding features tend to cancel rather than add up.
+    """
+    rows, hashes, weights = [], [], []
+    for row, recipe in enumerate(recipes):
+        for feature, weight in recipe_features(recipe.title, recipe.ingredients, recipe.cuisine):
+            rows.append(row)
+            hashes.append(zlib.crc32(feature.encode('utf-8')))
+            weights.append(weight)
+    hashes = np.array(hashes, dtype=np.uint32)
+    signs = np.where(hashes & 0x80000000, -1.0, 1.0)
+    # One bincount over flattened (row, bucket) cells sums every feature in a single pass
+    cells = np.array(rows, dtype=np.int64) * dim + (hashes & 0x7fffffff) % dim
+    vectors = np.bincount(cells, np.array(weights) * signs, minlength=len(recipes) * dim)
+    vectors = vectors.reshape(len(recipes), dim).astype(np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms == 0, 1, norms)
+    return vectors
+
+class EmbeddingStore:
+    """Recipe vectors in a memory-mapped float32 file, indexed by recipe id
+
+    The file is mapped shared, so every worker process sees writes from the others;
+    a process remaps when the file has grown or been replaced by a rebuild.
+    """
+
+    def __init__(self, path, dim=256):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._mapped = None
+        self.is_new = not self._has_valid_header()
+        if self.is_new:
+            self._write_empty_file(path)
+
+    def _header(self):
+        return HEADER.pack(MAGIC, FEATURE_VERSION, self.dim).ljust(HEADER_SIZE, b'\0')
+
+    def _has_valid_header(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return f.read(HEADER_SIZE) == self._header()
+        except OSError:
+            return False
+
+    def _write_empty_file(self, path):
+        # Write then rename so processes mapping the old file never see it shrink
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._header())
+        os.replace(tmp_path, path)
+
+    def _rows(self):
+        """The current mapping, remapped if the file changed since it was last mapped"""
+        stat = os.stat(self.path)
+        if self._mapped != (stat.st_ino, stat.st_size):
+            count = (stat.st_size - HEADER_SIZE) // (self.dim * 4)
+            if count > 0:
+                self._matrix = np.memmap(
+                    self.path, dtype=np.float32, mode='r+', offset=HEADER_SIZE, shape=(count, self.dim)
+                )
+            else:
+                self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self._mapped = (stat.st_ino, stat.st_size)
+        return self._matrix
+
+    def _ensure_capacity(self, max_id):
+        if max_id < len(self._rows()):
+            return
+        with open(self.path, 'r+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            # Re-read the size under the lock, another process may have grown the file already
+            count = (os.fstat(f.fileno()).st_size - HEADER_SIZE) // (self.dim * 4)
+            if max_id >= count:
+                # Doubling keeps the number of remaps logarithmic in the catalog size
+                f.truncate(HEADER_SIZE + max(max_id + 1, count * 2, 1024) * self.dim * 4)
+        self._rows()
+
+    def put(self, ids, vectors):
+        """Store vectors for recipe ids"""
+        if len(ids) == 0:
+            return
+        with self._lock:
+            self._ensure_capacity(max(ids))
+            self._rows()[np.asarray(ids)] = vectors
+
+    def remove(self, ids):
+        """Forget the vectors of recipe ids"""
+        with self._lock:
+            matrix = self._rows()
+            ids = [i for i in ids if i < len(matrix)]
+            if ids:
+                matrix[ids] = 0
+
+    def get(self, recipe_id):
+        """A copy of the stored vector of recipe_id, or None if there is none"""
+        with self._lock:
+            matrix = self._rows()
+            if recipe_id >= len(matrix) or not matrix[recipe_id].any():
+                return None
+            return np.array(matrix[recipe_id])
+
+    def top_k(self, queries, k=10, exclude=()):
+        """Best (recipe_id, cosine similarity) matches for each row of queries, best first
+
+        Scores are computed a chunk of rows at a time with one matrix product for the
+        whole batch of queries, keeping the k best of each chunk with argpartition.
+        Recipes without a vector score 0 and are never returned.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            matrix = self._rows()
+        exclude = np.array([i for i in exclude if i < len(matrix)], dtype=np.int64)
+        candidate_ids, candidate_scores = [], []
+        for start in range(0, len(matrix), SCORE_CHUNK_ROWS):
+            scores = queries @ np.asarray(matrix[start:start + SCORE_CHUNK_ROWS]).T
+            in_chunk = exclude[(exclude >= start) & (exclude < start + scores.shape[1])]
+            scores[:, in_chunk - start] = -np.inf
+            keep = min(k, scores.shape[1])
+            best = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+            candidate_ids.append(best + start)
+            candidate_scores.append(np.take_along_axis(scores, best, axis=1))
+        if not candidate_ids:
+            return [[] for _ in queries]
+        ids = np.concatenate(candidate_ids, axis=1)
+        scores = np.concatenate(candidate_scores, axis=1)
+        order = np.argsort(-scores, axis=1)[:, :k]
+        results = []
+        for query_ids, query_scores in zip(np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)):
+            results.append([(int(i), float(s)) for i, s in zip(query_ids, query_scores) if s > 0])
+        return results
+
+    def rebuild(self, db):
+        """Re-embed every public recipe into a fresh file, returns recipes embedded"""
+        tmp_path = f'{self.path}.rebuild'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)  # left over from an interrupted rebuild
+        target = EmbeddingStore(tmp_path, self.dim)
+        count = 0
+        last_id = 0
+        while True:
+            # Keyset batches keep memory flat on large catalogs
+            batch = (
+                db.query(Recipe.id, Recipe.title, Recipe.ingredients, Recipe.cuisine)
+                .filter(Recipe.id > last_id, Recipe.is_public == True)
+                .order_by(Recipe.id)
+                .limit(REBUILD_BATCH_SIZE)
+                .all()
+            )
+            if not batch:
+                break
+            target.put([r.id for r in batch], embed_recipes(batch, self.dim))
+            count += len(batch)
+            last_id = batch[-1].id
+        target._matrix = None
+        # Other processes pick up the new file on their next access (see _rows)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._mapped = None
+        return count
+
+# Set up by init_embeddings()
+store = None
+
+def init_embeddings(path, dim=256):
+    """Open the embedding file and fill it from the recipes table if it is new or outdated"""
+    global store
+    store = EmbeddingStore(path, dim)
+    if store.is_new:
+        db = database.get_db_session()
+        try:
+            count = store.rebuild(db)
+            if count:
+                logger.info(f"Computed embeddings for {count} recipes")
+        finally:
+            db.close()
+
+def update_recipe_embeddings(recipes):
+    """Re-embed recipes after they were written; private recipes are dropped from the index"""
+    if store is None or not recipes:
+        return
+    public = [r for r in recipes if r.is_public is not False]
+    store.remove([r.id for r in recipes if r.is_public is False])
+    store.put([r.id for r in public], embed_recipes(public, store.dim))
+
+def remove_recipe_embedding(recipe_id):
+    """Drop a deleted recipe from the index"""
+    if store is not None:
+        store.remove([recipe_id])
+
+def find_similar_recipes(recipe, limit=10):
+    """(recipe_id, similarity) pairs of the public recipes most like recipe, best first"""
+    vector = store.get(recipe.id)
+    if vector is None:
+        vector = embed_recipes([recipe], store.dim)[0]
+    return store.top_k(vector, limit, exclude=[recipe.id])[0]
@@ -0,0 +1,52 @@
+"""Gunicorn settings, read from Config (gunicorn -c gunicorn.conf.py wsgi:app)"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import Config
+
+def _cpu_count():
+    # Respect CPU affinity (containers, taskset) when the platform exposes it
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+bind = Config.SERVER_BIND
+workers = Config.SERVER_WORKERS or 2 * _cpu_count() + 1
+threads = Config.SERVER_THREADS
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# The memory response cache is per process, so with several workers a write on one would
+# leave the others serving stale recipes: share the SQLite cache instead, and refuse an
+# explicit memory cache. Set before the app (and response_cache.py) is imported.
+if workers > 1:
+    if 'RESPONSE_CACHE_BACKEND' not in os.environ:
+        os.environ['RESPONSE_CACHE_BACKEND'] = Config.RESPONSE_CACHE_BACKEND = 'sqlite'
+    elif Config.RESPONSE_CACHE_BACKEND == 'memory':
+        raise RuntimeError(
+            f"RESPONSE_CACHE_BACKEND=memory can't be shared by {workers} workers; "
+            "use sqlite (or none), or set SERVER_WORKERS=1"
+        )
+
+timeout = Config.SERVER_TIMEOUT
+graceful_timeout = Config.SERVER_GRACEFUL_TIMEOUT
+keepalive = Config.SERVER_KEEPALIVE
+max_requests = Config.SERVER_MAX_REQUESTS
+max_requests_jitter = max_requests // 10
+
+# Import the app once in the master so workers fork with it already loaded.
+# Connections opened while loading are dropped in each child (see database.py)
+preload_app = Config.SERVER_PRELOAD
+
+accesslog = '-'
+
+def post_worker_init(worker):
+    # Runs in the worker after the app is loaded, with or without preload_app
+    import jobs
+    jobs.start_job_workers()
+
+def worker_exit(server, worker):
+    # Let running image-analysis jobs finish; anything cut off is re-queued as stale on the next start
+    import jobs
+    jobs.stop_job_workers(timeout=Config.SERVER_GRACEFUL_TIMEOUT)
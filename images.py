@@ -0,0 +1,156 @@
+from PIL import Image, ImageOps, UnidentifiedImageError
+import base64
+import hashlib
+import io
+import os
+import re
+import tempfile
+
+# Re-encoded format per image kind: photos as JPEG, images with transparency as WebP
+OPAQUE_FORMAT = ('JPEG', 'jpg', 'image/jpeg')
+ALPHA_FORMAT = ('WEBP', 'webp', 'image/webp')
+
+# Leading bytes of each accepted upload type; the extension and Content-Type are the client's word only
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+SNIFF_BYTES = 12
+
+# Chunk size for hashing and base64-encoding stored files; a multiple of 3 so chunks encode without padding
+FILE_CHUNK_SIZE = 3 * 64 * 1024
+
+CONTENT_HASH_NAME = re.compile(r'^([0-9a-f]{64})\.[a-z]+$')
+
+def sniff_image_type(head):
+    """Image type ('jpeg', 'png', 'gif' or 'webp') from the first SNIFF_BYTES bytes of a file, or None"""
+    for signature, image_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def has_alpha(img):
+    return img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+
+def find_stored_image(upload_folder, content_hash):
+    """(filename, mime_type) of the image already stored under content_hash, or None"""
+    for _, extension, mime_type in (OPAQUE_FORMAT, ALPHA_FORMAT):
+        filename = f'{content_hash}.{extension}'
+        if os.path.exists(os.path.join(upload_folder, filename)):
+            return filename, mime_type
+    return None
+
+def _decode_image(source, max_dimension):
+    """Open and decode the first frame of an image, at reduced scale where the format allows"""
+    img = None
+    try:
+        img = Image.open(source)
+        img.seek(0)  # first frame of animated images
+        # JPEGs decode straight at 1/2, 1/4 or 1/8 scale when that still covers the box,
+        # so a large photo is never held in memory at full resolution
+        img.draft(img.mode, (max_dimension, max_dimension))
+        img.load()
+        return img
+    except OSError as e:
+        if img is not None:
+            img.close()
+        if isinstance(e, UnidentifiedImageError):
+            raise
+        # Truncated or corrupt data behind a valid header
+        raise UnidentifiedImageError(f'Cannot decode image: {e}') from e
+
+def preprocess_image(source, upload_folder, max_dimension=1536, quality=85, content_hash=None):
+    """Downscale, strip metadata and re-encode an uploaded image, storing it under its content hash
+
+    source is a path or a binary file object. The file is named by content_hash when
+    given (the sha256 of the uploaded bytes, so a repeated upload is found without
+    decoding it), otherwise by the sha256 of the re-encoded image. Returns
+    (filename, mime_type, content_hash); an image that is already stored is not written again.
+    Raises PIL.UnidentifiedImageError if source is not an image.
+    """
+    if content_hash:
+        stored = find_stored_image(upload_folder, content_hash)
+        if stored is not None:
+            return (*stored, content_hash)
+    with _decode_image(source, max_dimension) as img:
+        # Bake the EXIF orientation into the pixels, since the EXIF block itself is dropped
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        pil_format, extension, mime_type = ALPHA_FORMAT if has_alpha(img) else OPAQUE_FORMAT
+        img = img.convert('RGBA' if pil_format == 'WEBP' else 'RGB')
+
+        buffer = io.BytesIO()
+        if pil_format == 'JPEG':
+            img.save(buffer, 'JPEG', quality=quality, optimize=True, progressive=True)
+        else:
+            img.save(buffer, 'WEBP', quality=quality, method=4)
+        data = buffer.getvalue()
+
+    content_hash = content_hash or hashlib.sha256(data).hexdigest()
+    filename = f'{content_hash}.{extension}'
+    path = os.path.join(upload_folder, filename)
+    if not os.path.exists(path):
+        # Write to a temp file first so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    return filename, mime_type, content_hash
+
+def create_thumbnail(source_path, dest_path, width, quality=80):
+    """Write source_path scaled down to width pixels wide (never up) to dest_path, in the same format"""
+    with Image.open(source_path) as img:
+        img.seek(0)
+        img = ImageOps.exif_transpose(img)
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        pil_format = Image.registered_extensions().get(os.path.splitext(dest_path)[1].lower(), 'JPEG')
+        if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            if pil_format == 'JPEG':
+                img.save(tmp, 'JPEG', quality=quality, optimize=True, progressive=True)
+            elif pil_format == 'WEBP':
+                img.save(tmp, 'WEBP', quality=quality, method=4)
+            else:
+                img.save(tmp, pil_format, optimize=True)
+        os.replace(tmp_path, dest_path)
+
+def image_dimensions(path):
+    """(width, height) of a stored image, read from its header"""
+    with Image.open(path) as img:
+        return img.size
+
+def stored_image_hash(path):
+    """sha256 of a stored image: taken from its content-addressed name, or computed a chunk at a time"""
+    match = CONTENT_HASH_NAME.match(os.path.basename(path))
+    if match:
+        return match.group(1)
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(FILE_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def encode_file_base64(path):
+    """Base64 text of a file, encoded a chunk at a time rather than from one bytes copy of the file"""
+    parts = []
+    with open(path, 'rb') as f:
+        while chunk := f.read(FILE_CHUNK_SIZE):
+            parts.append(base64.b64encode(chunk).decode('ascii'))
+    return ''.join(parts)
+
+IMAGE_MIME_TYPES = {
+    'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp',
+}
+
+def guess_image_mime_type(path):
+    """MIME type for a stored image, from its extension"""
+    return IMAGE_MIME_TYPES.get(path.rsplit('.', 1)[-1].lower(), 'image/jpeg')
@@ -0,0 +1,214 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from sqlalchemy import func, or_, update
+from datetime import datetime
+import json
+import os
+import logging
+from database import Recipe
+from search import index_recipes
+from response_cache import response_cache
+import openai_client
+import prompts
+
+logger = logging.getLogger(__name__)
+
+# Recipe selections the pipeline can run over, as filters on the recipes table
+SELECTIONS = {
+    'missing-description': lambda: or_(Recipe.description.is_(None), func.trim(Recipe.description) == ''),
+    'short-instructions': lambda: func.length(Recipe.instructions) < 200,
+    'all': lambda: Recipe.id > 0,
+}
+
+# Columns written back; title and ingredients stay as they are so the ingredient index holds
+IMPROVED_FIELDS = ('description', 'instructions')
+
+RECIPE_COLUMNS = (
+    'id', 'title', 'description', 'ingredients', 'instructions', 'cooking_time', 'servings', 'difficulty', 'cuisine'
+)
+
+# Rows read from the database per query
+READ_BATCH_SIZE = 500
+
+def recipe_text(row):
+    """The JSON a stored recipe is sent as"""
+    try:
+        ingredients = json.loads(row.ingredients) if row.ingredients else []
+    except ValueError:
+        ingredients = []
+    return json.dumps({
+        'title': row.title,
+        'description': row.description or '',
+        'ingredients': ingredients,
+        'instructions': row.instructions,
+        'cooking_time': row.cooking_time,
+        'servings': row.servings,
+        'difficulty': row.difficulty,
+        'cuisine': row.cuisine,
+    }, ensure_ascii=False)
+
+class Checkpoint:
+    """Append-only JSON-lines log of a run, so an interrupted run resumes where it stopped
+
+    Improved recipes are logged as soon as the model answers, and logged again as
+    written once their batch is committed; on resume, answers that were paid for but
+    not yet written are written without calling the model again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.improved = {}
+        self.written = set()
+        if path and os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut off by the interruption
+                    if entry.get('status') == 'improved':
+                        self.improved[entry['id']] = entry['fields']
+                    elif entry.get('status') == 'written':
+                        self.written.update(entry['ids'])
+        for recipe_id in self.written:
+            self.improved.pop(recipe_id, None)
+        self._file = open(path, 'a', encoding='utf-8') if path else None
+
+    def _append(self, entry):
+        if self._file is not None:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self._file.flush()
+
+    def record_improved(self, recipe_id, fields):
+        self._append({'id': recipe_id, 'status': 'improved', 'fields': fields})
+
+    def record_failed(self, recipe_id, error):
+        self._append({'id': recipe_id, 'status': 'failed', 'error': error})
+
+    def record_written(self, ids):
+        self.written.update(ids)
+        self._append({'ids': ids, 'status': 'written'})
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+def iter_selected(db, selection, limit=None, skip=()):
+    """Recipes matching a selection in id order, read in keyset batches"""
+    condition = SELECTIONS[selection]()
+    last_id = 0
+    yielded = 0
+    while limit is None or yielded < limit:
+        # Plain rows rather than entities, so the commits in between don't expire them
+        batch = (
+            db.query(*[getattr(Recipe, name) for name in RECIPE_COLUMNS])
+            .filter(condition, Recipe.id > last_id)
+            .order_by(Recipe.id).limit(READ_BATCH_SIZE).all()
+        )
+        if not batch:
+            return
+        for row in batch:
+            if row.id in skip:
+                continue
+            yield row
+            yielded += 1
+            if limit is not None and yielded >= limit:
+                return
+        last_id = batch[-1].id
+
+def estimate_improvement_cost(db, selection, limit=None):
+    """Dry run: recipes selected, prompt tokens and the completion token budget, and the cost bound"""
+    recipes = prompt_tokens = completion_tokens = 0
+    for row in iter_selected(db, selection, limit):
+        options, tokens = openai_client.improve_recipe_request(recipe_text(row), as_json=True)
+        recipes += 1
+        prompt_tokens += tokens
+        completion_tokens += options['max_tokens']
+    cost = prompts.estimate_cost(openai_client.RECIPE_MODEL, prompt_tokens, completion_tokens)
+    return {
+        'model': openai_client.RECIPE_MODEL,
+        'recipes': recipes,
+        'prompt_tokens': prompt_tokens,
+        'max_completion_tokens': completion_tokens,
+        'max_cost_usd': round(cost, 2) if cost is not None else None,
+    }
+
+def _improve_one(recipe_id, text, use_cache):
+    content = openai_client.improve_recipe(text, use_cache=use_cache, as_json=True)
+    if prompts.extract_json_object(content) is None:
+        raise ValueError('Reply held no recipe JSON')
+    improved = prompts.parse_recipe(content, json.loads(text))
+    return recipe_id, {field: improved[field] for field in IMPROVED_FIELDS if improved.get(field)}
+
+def write_improvements(db, improvements):
+    """Write {recipe_id: fields} back in one transaction and refresh the search index"""
+    if not improvements:
+        return
+    now = datetime.utcnow()
+    db.execute(update(Recipe), [
+        {'id': recipe_id, **fields, 'updated_at': now} for recipe_id, fields in improvements.items()
+    ])
+    index_recipes(db, db.query(Recipe).filter(Recipe.id.in_(list(improvements))).all())
+    db.commit()
+    for recipe_id in improvements:
+        response_cache.invalidate_recipe(recipe_id)
+
+def improve_recipes(db, selection, checkpoint_path=None, concurrency=4, batch_size=50, limit=None,
+                    use_cache=True, progress=None):
+    """Improve the selected recipes with the model and write the results back in batches
+
+    Up to `concurrency` calls run at once; answers are checkpointed as they arrive
+    and committed batch_size recipes at a time. Returns counts of improved, failed
+    and resumed (written from the checkpoint without a call) recipes.
+    """
+    checkpoint = Checkpoint(checkpoint_path)
+    summary = {'improved': 0, 'failed': 0, 'resumed': len(checkpoint.improved)}
+    pending_writes = dict(checkpoint.improved)
+
+    def flush(force=False):
+        if pending_writes and (force or len(pending_writes) >= batch_size):
+            write_improvements(db, pending_writes)
+            checkpoint.record_written(list(pending_writes))
+            pending_writes.clear()
+
+    def collect(done):
+        for future in done:
+            recipe_id = in_flight.pop(future)
+            try:
+                _, fields = future.result()
+            except Exception as e:
+                summary['failed'] += 1
+                checkpoint.record_failed(recipe_id, str(e))
+                logger.warning(f"Improving recipe {recipe_id} failed: {str(e)}")
+            else:
+                summary['improved'] += 1
+                checkpoint.record_improved(recipe_id, fields)
+                pending_writes[recipe_id] = fields
+            if progress:
+                progress(summary)
+        flush()
+
+    in_flight = {}
+    skip = checkpoint.written | set(checkpoint.improved)
+    try:
+        flush()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                for row in iter_selected(db, selection, limit, skip):
+                    # Keep a bounded number of calls queued rather than the whole selection
+                    while len(in_flight) >= concurrency * 2:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    future = executor.submit(_improve_one, row.id, recipe_text(row), use_cache)
+                    in_flight[future] = row.id
+                while in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+            except BaseException:
+                # Interrupted: don't start queued calls whose answers would not be checkpointed
+                for future in in_flight:
+                    future.cancel()
+                raise
+        flush(force=True)
+    finally:
+        checkpoint.close()
+    return summary
@@ -0,0 +1,243 @@
+from sqlalchemy import func, update, bindparam, cast, Float
+import json
+import re
+import logging
+import database
+from database import Recipe, Ingredient, RecipeIngredient
+
+logger = logging.getLogger(__name__)
+
+# Recipes processed per transaction when backfilling from the JSON column
+BACKFILL_BATCH_SIZE = 500
+
+UNITS = {
+    'cup', 'cups', 'c', 'tablespoon', 'tablespoons', 'tbsp', 'tbs', 'teaspoon', 'teaspoons', 'tsp',
+    'gram', 'grams', 'g', 'kg', 'kilogram', 'kilograms', 'mg', 'ml', 'l', 'liter', 'liters',
+    'litre', 'litres', 'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound', 'pounds', 'pinch',
+    'dash', 'clove', 'cloves', 'can', 'cans', 'slice', 'slices', 'piece', 'pieces',
+    'bunch', 'handful', 'sprig', 'sprigs', 'stick', 'sticks', 'packet', 'pkg', 'quart', 'pint',
+}
+
+DESCRIPTORS = {
+    'fresh', 'freshly', 'chopped', 'diced', 'minced', 'sliced', 'grated', 'ground', 'large',
+    'small', 'medium', 'finely', 'roughly', 'thinly', 'crushed', 'peeled', 'boneless',
+    'skinless', 'whole', 'dried', 'frozen', 'cooked', 'raw', 'ripe', 'optional', 'to', 'taste',
+    'of', 'a', 'an', 'about', 'some', 'few', 'and', 'or', 'for', 'serving', 'garnish',
+}
+
+# Plural forms that the suffix rules below would get wrong
+IRREGULAR_SINGULARS = {
+    'leaves': 'leaf', 'loaves': 'loaf', 'halves': 'half', 'molasses': 'molasses',
+}
+
+def singularize(word):
+    """Cheap English singularization, good enough to merge "tomatoes" and "tomato" """
+    if word in IRREGULAR_SINGULARS:
+        return IRREGULAR_SINGULARS[word]
+    if len(word) <= 3 or word.endswith('ss') or word.endswith('us'):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'xes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+def canonicalize_ingredient(text):
+    """Reduce a free-text ingredient line like "2 cups chopped Tomatoes" to "tomato" """
+    text = text.lower()
+    text = re.sub(r'\([^)]*\)', ' ', text)  # drop parentheticals: "(about 200g)"
+    text = text.split(',')[0]  # drop preparation notes: "onion, finely chopped"
+    words = []
+    for word in re.findall(r'[a-z]+', text):
+        if word in UNITS or word in DESCRIPTORS:
+            continue
+        words.append(singularize(word))
+    return ' '.join(words)
+
+def canonical_ingredient_names(ingredients):
+    """Canonical, de-duplicated names for a list of ingredient strings"""
+    names = {canonicalize_ingredient(i) for i in ingredients if isinstance(i, str)}
+    names.discard('')
+    return names
+
+def get_or_create_ingredient_ids(db, names):
+    """Map canonical names to ingredient ids, inserting any that are new"""
+    if not names:
+        return {}
+    ids = dict(db.query(Ingredient.name, Ingredient.id).filter(Ingredient.name.in_(names)))
+    missing = [n for n in names if n not in ids]
+    if missing:
+        new_ingredients = [Ingredient(name=n) for n in missing]
+        db.add_all(new_ingredients)
+        db.flush()
+        ids.update((i.name, i.id) for i in new_ingredients)
+    return ids
+
+def sync_recipe_ingredients(db, recipe):
+    """Rewrite a recipe's ingredient links from its JSON column, within the caller's transaction"""
+    sync_ingredients_for_recipes(db, [recipe])
+
+def sync_ingredients_for_recipes(db, recipes):
+    """Rewrite the ingredient links of many recipes with a fixed number of round-trips"""
+    if not recipes:
+        return
+    names_by_recipe = {}
+    for recipe in recipes:
+        try:
+            ingredients = json.loads(recipe.ingredients) if recipe.ingredients else []
+        except ValueError:
+            ingredients = []
+        names_by_recipe[recipe.id] = canonical_ingredient_names(ingredients)
+    ids = get_or_create_ingredient_ids(db, set().union(*names_by_recipe.values()))
+
+    db.query(RecipeIngredient).filter(
+        RecipeIngredient.recipe_id.in_(list(names_by_recipe))
+    ).delete(synchronize_session=False)
+    db.bulk_insert_mappings(RecipeIngredient, [
+        {'recipe_id': recipe_id, 'ingredient_id': ids[name]}
+        for recipe_id, names in names_by_recipe.items()
+        for name in names
+    ])
+    # updated_at is set to itself so its onupdate doesn't fire: reindexing is not an edit,
+    # and must keep ETags (and timestamps carried over by a bulk import) as they are
+    table = Recipe.__table__
+    db.execute(
+        update(table)
+        .where(table.c.id == bindparam('recipe_id'))
+        .values(ingredient_count=bindparam('count'), updated_at=table.c.updated_at),
+        [{'recipe_id': recipe_id, 'count': len(names)} for recipe_id, names in names_by_recipe.items()]
+    )
+
+def remove_recipe_ingredients(db, recipe_id):
+    """Drop a recipe's ingredient links, within the caller's transaction"""
+    db.query(RecipeIngredient).filter(RecipeIngredient.recipe_id == recipe_id).delete(synchronize_session=False)
+
+def backfill_recipe_ingredients(db):
+    """Migrate every recipe's JSON ingredients into the normalized tables, returns recipes processed"""
+    db.query(RecipeIngredient).delete(synchronize_session=False)
+    last_id = 0
+    processed = 0
+    while True:
+        # Keyset batches keep memory flat on large catalogs
+        batch = (
+            db.query(Recipe.id, Recipe.ingredients)
+            .filter(Recipe.id > last_id)
+            .order_by(Recipe.id)
+            .limit(BACKFILL_BATCH_SIZE)
+            .all()
+        )
+        if not batch:
+            break
+        sync_ingredients_for_recipes(db, batch)
+        db.commit()
+        processed += len(batch)
+        last_id = batch[-1].id
+    return processed
+
+def init_ingredient_index():
+    """Backfill the normalized ingredient tables the first time they are empty"""
+    db = database.get_db_session()
+    try:
+        has_links = db.query(RecipeIngredient.recipe_id).first() is not None
+        has_recipes = db.query(Recipe.id).first() is not None
+        if has_recipes and not has_links:
+            count = backfill_recipe_ingredients(db)
+            logger.info(f"Backfilled ingredient index for {count} recipes")
+    finally:
+        db.close()
+
+def _pantry_ingredient_ids(db, names):
+    if not names:
+        return []
+    return [i for (i,) in db.query(Ingredient.id).filter(Ingredient.name.in_(names))]
+
+def _overlap_query(db, pantry_ids):
+    """Grouped (recipe_id, matched, total) rows for public recipes using any pantry ingredient
+
+    Candidates come from the reverse index and list sizes from recipes.ingredient_count,
+    so callers rank and limit in SQL. Also returns the matched and total expressions
+    to order by; total falls back to matched for a recipe whose count is not set yet.
+    """
+    matched = func.count()
+    total = func.coalesce(func.nullif(Recipe.ingredient_count, 0), matched)
+    query = (
+        db.query(RecipeIngredient.recipe_id, matched.label('matched'), Recipe.ingredient_count.label('total'))
+        .join(Recipe, Recipe.id == RecipeIngredient.recipe_id)
+        .filter(RecipeIngredient.ingredient_id.in_(pantry_ids), Recipe.is_public == True)
+        .group_by(RecipeIngredient.recipe_id, Recipe.ingredient_count)
+    )
+    return query, matched, total
+
+def find_recipes_by_ingredients(db, pantry, limit=20):
+    """Rank public recipes by how much of their ingredient list the pantry covers
+
+    Returns a list of dicts with recipe_id, matched, total, coverage and the
+    matched/missing canonical ingredient names, best coverage first.
+    """
+    names = canonical_ingredient_names(pantry)
+    pantry_ids = _pantry_ingredient_ids(db, names)
+    if not pantry_ids:
+        return []
+    query, matched, total = _overlap_query(db, pantry_ids)
+    rows = query.order_by(
+        (cast(matched, Float) / total).desc(), matched.desc(), RecipeIngredient.recipe_id.desc()
+    ).limit(limit).all()
+    if not rows:
+        return []
+    ranked = [row.recipe_id for row in rows]
+
+    # Spell out what is matched and missing for the page being returned
+    recipe_names = {rid: set() for rid in ranked}
+    for recipe_id, name in (
+        db.query(RecipeIngredient.recipe_id, Ingredient.name)
+        .join(Ingredient, Ingredient.id == RecipeIngredient.ingredient_id)
+        .filter(RecipeIngredient.recipe_id.in_(ranked))
+    ):
+        recipe_names[recipe_id].add(name)
+
+    return [
+        {
+            'recipe_id': row.recipe_id,
+            'matched': row.matched,
+            'total': row.total or row.matched,
+            'coverage': round(row.matched / (row.total or row.matched), 3),
+            'matched_ingredients': sorted(recipe_names[row.recipe_id] & names),
+            'missing_ingredients': sorted(recipe_names[row.recipe_id] - names),
+        }
+        for row in rows
+    ]
+
+def find_best_recipe_match(db, pantry):
+    """The public recipe whose ingredient list best overlaps the pantry, or None
+
+    The score is the Dice overlap 2 * shared / (recipe ingredients + pantry ingredients),
+    which is 1.0 only when the recipe uses exactly the pantry: a recipe needing much
+    more than the pantry, or using only a little of it, scores low.
+    Returns a dict with recipe_id, score and the matched/missing canonical names.
+    """
+    names = canonical_ingredient_names(pantry)
+    pantry_ids = _pantry_ingredient_ids(db, names)
+    if not pantry_ids:
+        return None
+    query, matched, total = _overlap_query(db, pantry_ids)
+    row = query.order_by(
+        (2 * cast(matched, Float) / (total + len(names))).desc(), RecipeIngredient.recipe_id
+    ).first()
+    if row is None:
+        return None
+    best = row.recipe_id
+    total = row.total or row.matched
+    recipe_names = {
+        name for (name,) in
+        db.query(Ingredient.name)
+        .join(RecipeIngredient, RecipeIngredient.ingredient_id == Ingredient.id)
+        .filter(RecipeIngredient.recipe_id == best)
+    }
+    return {
+        'recipe_id': best,
+        'score': round(2 * row.matched / (total + len(names)), 3),
+        'matched_ingredients': sorted(recipe_names & names),
+        'missing_ingredients': sorted(recipe_names - names),
+    }
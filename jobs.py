@@ -0,0 +1,243 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Statuses a job moves through; queued jobs that fail are re-queued until max_attempts
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+class QueueFull(Exception):
+    """Raised by JobQueue.submit when the backlog is at capacity"""
+
+class JobQueue:
+    """Durable job queue in a local SQLite file, safe to share between threads and processes"""
+
+    def __init__(self, path, max_pending=100, max_attempts=3, retry_delay=2.0):
+        self.path = path
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, dedup_key TEXT, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, run_after REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after)")
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_dedup_key ON jobs (dedup_key)")
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self._close_connection)
+
+    def _connect(self):
+        # One autocommit connection per thread; transactions are opened explicitly
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _close_connection(self):
+        # An SQLite connection must not be carried across fork(); the forking thread reopens lazily
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def _transaction(self, work):
+        """Run work(conn) inside BEGIN IMMEDIATE so concurrent claimers can't race"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def submit(self, kind, payload, dedup_key=None):
+        """Enqueue a job, returns (job, created); an identical live or finished job is reused"""
+        def work(conn):
+            if dedup_key:
+                existing = conn.execute(
+                    "SELECT * FROM jobs WHERE dedup_key = ? AND kind = ? AND status != ? "
+                    "ORDER BY created_at DESC LIMIT 1",
+                    (dedup_key, kind, FAILED)
+                ).fetchone()
+                if existing:
+                    return self._to_dict(existing), False
+
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                raise QueueFull(f"{pending} jobs pending")
+
+            now = time.time()
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, kind, payload, dedup_key, status, created_at, updated_at, run_after) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), dedup_key, QUEUED, now, now, now)
+            )
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()), True
+
+        return self._transaction(work)
+
+    def claim(self):
+        """Take the oldest runnable job and mark it running, or return None"""
+        def work(conn):
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = ? AND run_after <= ? ORDER BY created_at LIMIT 1",
+                (QUEUED, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, time.time(), row['id'])
+            )
+            return self._to_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone())
+
+        return self._transaction(work)
+
+    def complete(self, job_id, result):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?",
+            (DONE, json.dumps(result), time.time(), job_id)
+        )
+
+    def fail(self, job_id, error):
+        """Record a failed attempt; retry with exponential backoff until max_attempts"""
+        def work(conn):
+            attempts = conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            now = time.time()
+            if attempts < self.max_attempts:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ?, run_after = ? WHERE id = ?",
+                    (QUEUED, error, now, now + self.retry_delay * 2 ** (attempts - 1), job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (FAILED, error, now, job_id)
+                )
+
+        self._transaction(work)
+
+    def get(self, job_id):
+        return self._to_dict(self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def requeue_stale(self, older_than):
+        """Put jobs left running by a crashed worker back in the queue"""
+        cursor = self._connect().execute(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+            (QUEUED, time.time(), RUNNING, time.time() - older_than)
+        )
+        return cursor.rowcount
+
+    def stats(self):
+        counts = dict(self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+class WorkerPool:
+    """Threads that claim jobs from a JobQueue and run the handler registered for their kind"""
+
+    def __init__(self, queue, handlers, workers=2, poll_interval=1.0):
+        self.queue = queue
+        self.handlers = handlers
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        """Wake an idle worker right away instead of waiting for the next poll"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                job = None
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            handler = self.handlers.get(job['kind'])
+            try:
+                if handler is None:
+                    raise ValueError(f"No handler for job kind {job['kind']}")
+                self.queue.complete(job['id'], handler(job['payload']))
+            except Exception as e:
+                logger.error(f"Job {job['id']} ({job['kind']}) failed on attempt {job['attempts']}: {str(e)}")
+                self.queue.fail(job['id'], str(e))
+
+# Set up by init_jobs()
+job_queue = None
+worker_pool = None
+
+def init_jobs(config, handlers, start_workers=True):
+    """Open the job queue and, unless disabled, start its worker threads
+
+    Threads don't survive fork(), so a pre-forking server passes start_workers=False
+    and calls start_job_workers() in each worker process instead.
+    """
+    global job_queue, worker_pool
+    job_queue = JobQueue(
+        config['JOB_QUEUE_PATH'],
+        max_pending=config['JOB_QUEUE_MAX_PENDING'],
+        max_attempts=config['JOB_MAX_ATTEMPTS']
+    )
+    # Jobs still marked running this long after their last update were orphaned by a crash
+    job_queue.requeue_stale(older_than=config['JOB_STALE_AFTER'])
+    if config['JOB_WORKERS'] > 0:
+        worker_pool = WorkerPool(job_queue, handlers, workers=config['JOB_WORKERS'])
+        if start_workers:
+            worker_pool.start()
+    return job_queue
+
+def start_job_workers():
+    """Start the worker threads set up by init_jobs(start_workers=False) in this process"""
+    if worker_pool is not None and not worker_pool._threads:
+        worker_pool.start()
+
+def stop_job_workers(timeout=None):
+    """Stop taking jobs and wait up to timeout seconds for running ones to finish"""
+    if worker_pool is not None:
+        worker_pool.stop(timeout)
@@ -0,0 +1,144 @@
+from sqlalchemy import and_, or_, func, tuple_, text
+from datetime import datetime
+import base64
+import json
+from database import Recipe
+from serializers import RecipeSerializer
+
+# Sortable columns, each backed by one of the listing indexes on Recipe
+SORT_FIELDS = ('created_at', 'cooking_time')
+SORT_ORDERS = ('desc', 'asc')
+
+# Columns with facet counts; both lead a (is_public, <column>, ...) index
+FACET_FIELDS = ('cuisine', 'difficulty')
+
+def parse_filters(args):
+    """Listing filters from query parameters; cuisine and difficulty accept comma-separated values"""
+    filters = {}
+    for field in FACET_FIELDS:
+        values = [v.strip() for value in args.getlist(field) for v in value.split(',') if v.strip()]
+        if values:
+            filters[field] = values
+    for param in ('min_time', 'max_time'):
+        value = args.get(param)
+        if value is not None:
+            try:
+                filters[param] = int(value)
+            except ValueError:
+                raise ValueError(f'{param} must be an integer')
+    if args.get('user_id'):
+        filters['user_id'] = args.get('user_id')
+    return filters
+
+def parse_sort(args):
+    """(sort, order) from the `sort=` and `order=` query parameters"""
+    sort = args.get('sort', 'created_at')
+    order = args.get('order', 'desc')
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_FIELDS)}")
+    if order not in SORT_ORDERS:
+        raise ValueError(f"order must be one of: {', '.join(SORT_ORDERS)}")
+    return sort, order
+
+def apply_filters(query, filters, exclude=None):
+    """Restrict a recipes query to public recipes matching filters, optionally ignoring one facet"""
+    query = query.filter(Recipe.is_public == True)
+    for field in FACET_FIELDS:
+        values = filters.get(field)
+        if values and field != exclude:
+            column = getattr(Recipe, field)
+            query = query.filter(column == values[0] if len(values) == 1 else column.in_(values))
+    if 'min_time' in filters:
+        query = query.filter(Recipe.cooking_time >= filters['min_time'])
+    if 'max_time' in filters:
+        query = query.filter(Recipe.cooking_time <= filters['max_time'])
+    if 'user_id' in filters:
+        query = query.filter(Recipe.user_id == filters['user_id'])
+    return query
+
+def encode_cursor(sort, order, value, recipe_id):
+    """Encode a keyset position into an opaque cursor string"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, order, value, recipe_id])
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, sort='created_at', order='desc'):
+    """Decode a cursor produced by encode_cursor for the same sort, raises ValueError if malformed"""
+    try:
+        cursor_sort, cursor_order, value, recipe_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if (cursor_sort, cursor_order) != (sort, order):
+            raise ValueError
+        if value is not None:
+            value = datetime.fromisoformat(value) if sort == 'created_at' else int(value)
+        return value, int(recipe_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def listing_serializer(fields, sort='created_at'):
+    """Serializer for listing rows; id and the sort column are always selected because the cursor is built from them"""
+    return RecipeSerializer(fields, required=('id', sort))
+
+def build_recipe_listing_query(db, serializer, filters=None, sort='created_at', order='desc', cursor=None):
+    """Column-projected query over public recipes, keyset-positioned; NULLs sort lowest"""
+    query = apply_filters(db.query(*serializer.columns), filters or {})
+    column = getattr(Recipe, sort)
+    descending = order == 'desc'
+    if cursor:
+        value, recipe_id = decode_cursor(cursor, sort, order)
+        # Row-value comparisons let the index seek straight to the cursor position
+        if descending and value is None:
+            query = query.filter(column.is_(None), Recipe.id < recipe_id)
+        elif descending:
+            query = query.filter(or_(tuple_(column, Recipe.id) < (value, recipe_id), column.is_(None)))
+        elif value is None:
+            query = query.filter(or_(and_(column.is_(None), Recipe.id > recipe_id), column.isnot(None)))
+        else:
+            query = query.filter(tuple_(column, Recipe.id) > (value, recipe_id))
+    if descending:
+        return query.order_by(column.desc().nulls_last(), Recipe.id.desc())
+    return query.order_by(column.asc().nulls_first(), Recipe.id.asc())
+
+def facet_counts(db, filters=None):
+    """Recipe counts per cuisine and difficulty, each under the other active filters"""
+    facets = {}
+    for field in FACET_FIELDS:
+        column = getattr(Recipe, field)
+        rows = apply_filters(db.query(column, func.count()), filters or {}, exclude=field).group_by(column).all()
+        facets[field] = [
+            {'value': value, 'count': count}
+            for value, count in sorted(rows, key=lambda row: (-row[1], row[0] is None, row[0] or ''))
+        ]
+    return facets
+
+def hot_listing_queries(db):
+    """The listing queries that must be served by an index, as (name, query) pairs"""
+    serializer = listing_serializer(['id', 'title'])
+    cursor = encode_cursor('created_at', 'desc', datetime(2024, 1, 1), 100)
+    by_time = listing_serializer(['id', 'title'], 'cooking_time')
+    return [
+        ('newest', build_recipe_listing_query(db, serializer).limit(50)),
+        ('newest, next page', build_recipe_listing_query(db, serializer, cursor=cursor).limit(50)),
+        ('by cuisine', build_recipe_listing_query(db, serializer, {'cuisine': ['Italian']}).limit(50)),
+        ('by difficulty', build_recipe_listing_query(db, serializer, {'difficulty': ['Easy']}).limit(50)),
+        ('by user', build_recipe_listing_query(db, serializer, {'user_id': 'u1'}).limit(50)),
+        ('quickest', build_recipe_listing_query(db, by_time, sort='cooking_time', order='asc').limit(50)),
+        ('cuisine facet', apply_filters(db.query(Recipe.cuisine, func.count()), {}).group_by(Recipe.cuisine)),
+        ('difficulty facet', apply_filters(db.query(Recipe.difficulty, func.count()), {}).group_by(Recipe.difficulty)),
+    ]
+
+def explain_query(db, query):
+    """(plan text, uses an index for both filtering and ordering) for a query on this database"""
+    statement = query.statement.compile(dialect=db.bind.dialect, compile_kwargs={'literal_binds': True})
+    dialect = db.bind.dialect.name
+    if dialect == 'sqlite':
+        rows = db.execute(text(f'EXPLAIN QUERY PLAN {statement}')).fetchall()
+        plan = '\n'.join(row[-1] for row in rows)
+        # "SCAN recipes" is a full table scan, a temp B-tree is a sort the index didn't cover
+        return plan, 'SCAN recipes' not in plan and 'TEMP B-TREE' not in plan
+    if dialect == 'postgresql':
+        # Small tables are cheaper to scan, so make the planner show what it would do at scale
+        db.execute(text('SET LOCAL enable_seqscan = off'))
+        plan = '\n'.join(row[0] for row in db.execute(text(f'EXPLAIN {statement}')))
+        return plan, 'Seq Scan' not in plan and 'Sort' not in plan.replace('Sort Key', '')
+    return f'EXPLAIN not supported on {dialect}', True
@@ -0,0 +1,228 @@
+from flask import Response, request
+from sqlalchemy import event
+import bisect
+import threading
+import time
+import logging
+import database
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+DB_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+
+# Statements listed in a slow-request log line
+SLOW_LOG_TOP_QUERIES = 5
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """One metric family with a fixed set of label names"""
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_sample(labels, value) for labels, value in items)
+        return '\n'.join(lines)
+
+    def _render_sample(self, labels, value):
+        return f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram in the Prometheus exposition format"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _render_sample(self, labels, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += bucket_count
+            bucket_labels = _format_labels(self.labelnames + ('le',), labels + (bound,))
+            lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+        label_text = _format_labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{label_text} {_format_value(total)}')
+        lines.append(f'{self.name}_count{label_text} {count}')
+        return '\n'.join(lines)
+
+http_requests = Counter(
+    'http_requests_total', 'HTTP requests by method, route and status',
+    ('method', 'endpoint', 'status')
+)
+http_request_duration = Histogram(
+    'http_request_duration_seconds', 'Time to produce the response (streamed bodies excluded)',
+    ('method', 'endpoint')
+)
+http_in_flight = Gauge('http_requests_in_flight', 'Requests currently being handled', ('endpoint',))
+db_queries_per_request = Histogram(
+    'db_queries_per_request', 'SQL statements executed per request', ('endpoint',), buckets=COUNT_BUCKETS
+)
+db_query_duration = Histogram(
+    'db_query_duration_seconds', 'Time per SQL statement', (), buckets=DB_QUERY_BUCKETS
+)
+openai_request_duration = Histogram(
+    'openai_request_duration_seconds', 'OpenAI chat completion latency, including retries',
+    ('model', 'call', 'outcome')
+)
+openai_tokens = Counter(
+    'openai_tokens_total', 'Tokens per call from response.usage (counted locally for streamed calls)',
+    ('model', 'call', 'kind')
+)
+rate_limited_requests = Counter(
+    'rate_limited_requests_total', 'Requests turned away by client rate limits or the AI call cap',
+    ('endpoint', 'reason')
+)
+ai_requests_in_flight = Gauge('ai_requests_in_flight', 'Requests holding an AI call slot in this process')
+
+REGISTRY = [
+    http_requests, http_request_duration, http_in_flight, db_queries_per_request,
+    db_query_duration, openai_request_duration, openai_tokens, rate_limited_requests, ai_requests_in_flight,
+]
+
+def render_metrics():
+    """Every metric in the Prometheus text exposition format"""
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+def record_openai_call(model, call, outcome, seconds, usage=None):
+    """Record one chat completion; usage is the response.usage object when the API returned one"""
+    openai_request_duration.observe((model, call, outcome), seconds)
+    if usage is not None:
+        openai_tokens.inc((model, call, 'prompt'), getattr(usage, 'prompt_tokens', 0) or 0)
+        openai_tokens.inc((model, call, 'completion'), getattr(usage, 'completion_tokens', 0) or 0)
+
+# Queries of the request being handled on this thread, as [statement, seconds] pairs
+_request_state = threading.local()
+
+# Start times live on the statement's execution context rather than the connection, so a
+# statement that raises (and never reaches after_cursor_execute) leaves nothing behind
+QUERY_START_ATTR = '_metrics_query_start'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    setattr(context, QUERY_START_ATTR, time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, QUERY_START_ATTR, None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    db_query_duration.observe((), elapsed)
+    queries = getattr(_request_state, 'queries', None)
+    if queries is not None:
+        queries.append((statement, elapsed))
+
+def instrument_engine(engine):
+    """Time every statement run on engine, attributing it to the current request"""
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+def _endpoint_label():
+    # The route pattern rather than the path keeps label cardinality bounded
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def _log_slow_request(status, elapsed, queries):
+    by_statement = {}
+    for statement, seconds in queries:
+        entry = by_statement.setdefault(' '.join(statement.split())[:200], [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+    top = sorted(by_statement.items(), key=lambda item: item[1][1], reverse=True)[:SLOW_LOG_TOP_QUERIES]
+    breakdown = '; '.join(f'{count}x {seconds * 1000:.1f}ms {statement}' for statement, (count, seconds) in top)
+    logger.warning(
+        f"Slow request: {request.method} {request.full_path.rstrip('?')} -> {status} in {elapsed * 1000:.1f}ms, "
+        f"{len(queries)} queries in {sum(s for _, s in queries) * 1000:.1f}ms"
+        + (f" [{breakdown}]" if breakdown else '')
+    )
+
+def init_metrics(app):
+    """Instrument requests and the database engine, and serve GET /metrics"""
+    instrument_engine(database.engine)
+    slow_request_seconds = app.config['SLOW_REQUEST_MS'] / 1000
+
+    @app.before_request
+    def start_request_metrics():
+        _request_state.started = time.perf_counter()
+        _request_state.queries = []
+        _request_state.endpoint = _endpoint_label()
+        http_in_flight.inc((_request_state.endpoint,))
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = getattr(_request_state, 'started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = _request_state.endpoint
+        queries = _request_state.queries
+        http_requests.inc((request.method, endpoint, str(response.status_code)))
+        http_request_duration.observe((request.method, endpoint), elapsed)
+        db_queries_per_request.observe((endpoint,), len(queries))
+        if slow_request_seconds and elapsed >= slow_request_seconds:
+            _log_slow_request(response.status_code, elapsed, queries)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exception=None):
+        if getattr(_request_state, 'started', None) is not None:
+            http_in_flight.dec((_request_state.endpoint,))
+        _request_state.started = None
+        _request_state.queries = None
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
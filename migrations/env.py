@@ -0,0 +1,42 @@
+from logging.config import fileConfig
+
+from alembic import context
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import Config
+from database import Base, build_engine
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL for DATABASE_URL without connecting (alembic upgrade head --sql)"""
+    context.configure(
+        url=Config.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online() -> None:
+    """Migrate DATABASE_URL through the same engine setup the app uses"""
+    engine = build_engine(Config.DATABASE_URL)
+    with engine.connect() as connection:
+        # Batch mode lets ALTER-style operations work on SQLite by rebuilding the table
+        context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,82 @@
+"""Baseline schema: recipes, ingredients, recipe_ingredients and users
+
+Databases created by init_db() before migrations existed already have these
+tables, so each one is only created when missing and `alembic upgrade head`
+works on new and existing databases alike. The full-text index is managed by
+search.init_search_index(), not by migrations.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Offline (--sql) runs can't inspect the database and emit every table
+    existing = set() if op.get_context().as_sql else set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'recipes' not in existing:
+        op.create_table(
+            'recipes',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('title', sa.String(255), nullable=False),
+            sa.Column('description', sa.Text()),
+            sa.Column('ingredients', sa.Text(), nullable=False),
+            sa.Column('instructions', sa.Text(), nullable=False),
+            sa.Column('cooking_time', sa.Integer()),
+            sa.Column('servings', sa.Integer()),
+            sa.Column('difficulty', sa.String(50)),
+            sa.Column('cuisine', sa.String(100)),
+            sa.Column('image_url', sa.String(500)),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('updated_at', sa.DateTime()),
+            sa.Column('is_public', sa.Boolean()),
+            sa.Column('user_id', sa.String(100)),
+        )
+
+    if 'ingredients' not in existing:
+        op.create_table(
+            'ingredients',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('name', sa.String(255), nullable=False, unique=True),
+        )
+
+    if 'recipe_ingredients' not in existing:
+        op.create_table(
+            'recipe_ingredients',
+            sa.Column('recipe_id', sa.Integer(), sa.ForeignKey('recipes.id'), primary_key=True),
+            sa.Column('ingredient_id', sa.Integer(), sa.ForeignKey('ingredients.id'), primary_key=True),
+        )
+        op.create_index(
+            'ix_recipe_ingredients_ingredient_recipe', 'recipe_ingredients', ['ingredient_id', 'recipe_id']
+        )
+
+    if 'users' not in existing:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('username', sa.String(100), nullable=False, unique=True),
+            sa.Column('email', sa.String(255), nullable=False, unique=True),
+            sa.Column('password_hash', sa.String(255), nullable=False),
+            sa.Column('created_at', sa.DateTime()),
+            sa.Column('is_active', sa.Boolean()),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('users')
+    op.drop_table('recipe_ingredients')
+    op.drop_table('ingredients')
+    op.drop_table('recipes')
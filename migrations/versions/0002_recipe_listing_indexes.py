@@ -0,0 +1,47 @@
+"""Composite indexes for the recipe listing filters, sorts and facet counts
+
+Mirrors the listing_indexes() declared on Recipe: on Postgres the sort
+column is stored DESC NULLS LAST to match the listing order, SQLite's native
+index order already matches it.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name -> (equality prefix columns, sort column)
+INDEXES = {
+    'ix_recipes_public_created': (['is_public'], 'created_at'),
+    'ix_recipes_public_cuisine_created': (['is_public', 'cuisine'], 'created_at'),
+    'ix_recipes_public_difficulty_created': (['is_public', 'difficulty'], 'created_at'),
+    'ix_recipes_public_cooking_time': (['is_public'], 'cooking_time'),
+    'ix_recipes_user_created': (['user_id', 'is_public'], 'created_at'),
+}
+
+
+def upgrade() -> None:
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    for name, (prefix, sort_column) in INDEXES.items():
+        if postgresql:
+            columns = prefix + [sa.text(f'{sort_column} DESC NULLS LAST'), sa.text('id DESC')]
+        else:
+            columns = prefix + [sort_column, 'id']
+        # init_db() creates these too on a fresh database
+        op.create_index(name, 'recipes', columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.drop_index(name, table_name='recipes', if_exists=True)
@@ -0,0 +1,38 @@
+"""Summary table of recipe counts per cuisine, difficulty, cooking time, ingredient and month
+
+Filled by stats.rebuild_recipe_stats() on the next start (or with
+`flask --app app rebuild-stats`) and kept current by the recipe write paths.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set() if op.get_context().as_sql else set(sa.inspect(op.get_bind()).get_table_names())
+    # init_db() creates it too on a fresh database
+    if 'recipe_stats' not in existing:
+        op.create_table(
+            'recipe_stats',
+            sa.Column('dimension', sa.String(20), primary_key=True),
+            sa.Column('key', sa.String(255), primary_key=True),
+            sa.Column('count', sa.Integer(), nullable=False),
+        )
+        op.create_index('ix_recipe_stats_dimension_count', 'recipe_stats', ['dimension', 'count'])
+
+
+def downgrade() -> None:
+    op.drop_table('recipe_stats')
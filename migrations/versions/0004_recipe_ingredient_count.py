@@ -0,0 +1,42 @@
+"""Store each recipe's ingredient count, so pantry ranking runs as one grouped query
+
+Backfilled from recipe_ingredients here and kept current by
+ingredients.sync_ingredients_for_recipes().
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    columns = set() if op.get_context().as_sql else {
+        column['name'] for column in sa.inspect(op.get_bind()).get_columns('recipes')
+    }
+    # init_db() creates it too on a fresh database
+    if 'ingredient_count' not in columns:
+        op.add_column(
+            'recipes',
+            sa.Column('ingredient_count', sa.Integer(), nullable=False, server_default='0')
+        )
+    op.execute(
+        "UPDATE recipes SET ingredient_count = "
+        "(SELECT count(*) FROM recipe_ingredients WHERE recipe_ingredients.recipe_id = recipes.id)"
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('recipes') as batch_op:
+        batch_op.drop_column('ingredient_count')
@@ -1,191 +1,319 @@
 import openai
 import os
-import base64
 import logging
+import time
+from types import SimpleNamespace
 from config import Config
+from metrics import record_openai_call
+from ai_cache import create_cache, ingredients_key, prompt_key, image_key
+from ai_async import AsyncAIClient, parse_rate_limits
+from images import guess_image_mime_type, image_dimensions, stored_image_hash, encode_file_base64
+import prompts
 
 logger = logging.getLogger(__name__)
 
+# Models used by each call, also part of the cache keys
+VISION_MODEL = "gpt-4-vision-preview"
+RECIPE_MODEL = "gpt-4"
+CHEF_MODEL = "gpt-4o"
+
+CHEF_SYSTEM_MESSAGE = (
+    "You are ChefGenius, a passionate and knowledgeable culinary expert with expertise in global cuisine! "
+    "Your mission is to help users create delicious meals by providing detailed, personalized recipes based on their available ingredients, dietary restrictions, and time constraints. "
+    "Combine deep culinary knowledge with nutritional wisdom to suggest recipes that are both practical and enjoyable. "
+    "Present your answers in clear markdown formatting, with structured lists, numbered steps, emoji for dietary tags, and extra tips as described in the instructions."
+)
+
+# Response cache for identical requests, see ai_cache.py
+cache = create_cache(
+    Config.AI_CACHE_BACKEND,
+    max_entries=Config.AI_CACHE_MAX_ENTRIES,
+    ttl=Config.AI_CACHE_TTL,
+    path=Config.AI_CACHE_PATH
+)
+
 # Initialize OpenAI client only if API key is available
 client = None
+async_client = None
 if Config.OPENAI_API_KEY:
     try:
-        client = openai.OpenAI(api_key=Config.OPENAI_API_KEY)
+        client = openai.OpenAI(api_key=Config.OPENAI_API_KEY, base_url=Config.OPENAI_BASE_URL)
     except Exception as e:
         logger.warning(f"Failed to initialize OpenAI client: {e}")
         client = None
+    if client and Config.OPENAI_ASYNC:
+        async_client = AsyncAIClient(
+            api_key=Config.OPENAI_API_KEY,
+            base_url=Config.OPENAI_BASE_URL,
+            max_concurrency=Config.OPENAI_MAX_CONCURRENCY,
+            rate_limits=parse_rate_limits(Config.OPENAI_RATE_LIMITS),
+            max_retries=Config.OPENAI_MAX_RETRIES,
+            timeout=Config.OPENAI_TIMEOUT
+        )
+
+def _log_usage(call, model, prompt_tokens, usage, seconds):
+    # The local estimate next to the billed count shows how good the budgeting is
+    logger.info(
+        f"OpenAI {call} ({model}): {usage.prompt_tokens} prompt tokens (estimated {prompt_tokens}), "
+        f"{usage.completion_tokens} completion tokens in {seconds * 1000:.0f}ms"
+    )
+
+def create_chat_completion(call='completion', prompt_tokens=None, **kwargs):
+    """chat.completions.create through the shared async client when enabled, else directly
+
+    call names the operation in metrics and logs; prompt_tokens is the local estimate, if any.
+    """
+    started = time.perf_counter()
+    try:
+        if async_client:
+            response = async_client.run(async_client.chat_completion(**kwargs))
+        else:
+            response = client.chat.completions.create(**kwargs)
+    except Exception:
+        record_openai_call(kwargs.get('model'), call, 'error', time.perf_counter() - started)
+        raise
+    elapsed = time.perf_counter() - started
+    usage = getattr(response, 'usage', None)
+    record_openai_call(kwargs.get('model'), call, 'ok', elapsed, usage)
+    if usage is not None:
+        if prompt_tokens is None:
+            prompt_tokens = prompts.count_message_tokens(kwargs.get('messages', []), kwargs.get('model'))
+        _log_usage(call, kwargs.get('model'), prompt_tokens, usage, elapsed)
+    return response
+
+def stream_chat_completion(call='stream', prompt_tokens=None, **kwargs):
+    """Yield the content deltas of a streamed chat completion as they arrive"""
+    started = time.perf_counter()
+    outcome = 'error'
+    parts = []
+    chunks = None
+    try:
+        if async_client:
+            # Through the shared client, so streams count against its concurrency, rate limits and retries
+            chunks = async_client.iterate(async_client.stream_chat_completion(**kwargs))
+        else:
+            chunks = client.chat.completions.create(stream=True, **kwargs)
+        for chunk in chunks:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+                yield delta
+        outcome = 'ok'
+    finally:
+        if hasattr(chunks, 'close'):
+            # A client that disconnected mid-stream gives back its concurrency slot right away
+            chunks.close()
+        # Streamed responses carry no usage block, so the tokens are counted locally
+        model = kwargs.get('model')
+        if prompt_tokens is None:
+            prompt_tokens = prompts.count_message_tokens(kwargs.get('messages', []), model)
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=prompts.count_tokens(''.join(parts), model))
+        elapsed = time.perf_counter() - started
+        record_openai_call(model, call, outcome, elapsed, usage)
+        _log_usage(call, model, prompt_tokens, usage, elapsed)
+
+def cached_call(key, compute, use_cache=True):
+    """Return the cached result for key, or compute and cache it; use_cache=False bypasses the cache
+
+    compute returns (result, cacheable). A result that is not cacheable, such as the
+    fallback for a reply that didn't parse, is returned but never stored, so the next
+    identical request asks the model again.
+    """
+    if use_cache:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    result, cacheable = compute()
+    if cacheable:
+        cache.set(key, result)
+    return result
+
+def get_cache_stats():
+    """Hit/miss metrics of the AI response cache"""
+    return {'backend': cache.backend, **cache.stats.as_dict()}
 
 def encode_image_to_base64(image_path):
     """Encode image to base64 for OpenAI API"""
     try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
+        return encode_file_base64(image_path)
     except Exception as e:
         logger.error(f"Error encoding image: {str(e)}")
         raise
 
-def analyze_recipe_image(image_path):
+def analyze_recipe_image(image_path, use_cache=True):
     """Analyze a recipe image using OpenAI Vision API"""
     try:
         if not client:
             raise ValueError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
         
-        # Encode image
-        base64_image = encode_image_to_base64(image_path)
-        
-        # Create prompt for recipe analysis
-        prompt = """
-        Analyze this food/recipe image and extract the following information in JSON format:
-        {
-            "title": "Recipe title",
-            "description": "Brief description of the dish",
-            "ingredients": ["ingredient 1", "ingredient 2", ...],
-            "instructions": "Step-by-step cooking instructions",
-            "cooking_time": 30,
-            "servings": 4,
-            "difficulty": "Easy/Medium/Hard",
-            "cuisine": "Type of cuisine"
-        }
-        
-        Be as detailed and accurate as possible. If you can't identify certain ingredients or details, make reasonable estimates based on what you can see.
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4-vision-preview",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1000,
+        return cached_call(
+            image_key(VISION_MODEL, stored_image_hash(image_path)),
+            lambda: _analyze_image_file(image_path, guess_image_mime_type(image_path)),
+            use_cache
         )
-        
-        # Parse the response
-        content = response.choices[0].message.content
-        
-        # Try to extract JSON from the response
-        import json
-        import re
-        
-        # Look for JSON in the response
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-        if json_match:
-            recipe_data = json.loads(json_match.group())
-        else:
-            # If no JSON found, create a basic structure
-            recipe_data = {
-                "title": "Recipe from Image",
-                "description": content,
-                "ingredients": [],
-                "instructions": "Please review and edit the recipe details.",
-                "cooking_time": 30,
-                "servings": 4,
-                "difficulty": "Medium",
-                "cuisine": "General"
-            }
-        
-        return recipe_data
     
     except Exception as e:
         logger.error(f"Error analyzing recipe image: {str(e)}")
         raise
 
-def generate_recipe_from_ingredients(ingredients):
+# Returned when the vision model's answer holds no recipe JSON
+IMAGE_RECIPE_FALLBACK = {
+    "title": "Recipe from Image",
+    "description": "",
+    "ingredients": [],
+    "instructions": "Please review and edit the recipe details.",
+    "cooking_time": 30,
+    "servings": 4,
+    "difficulty": "Medium",
+    "cuisine": "General"
+}
+
+def _analyze_image_file(image_path, mime_type='image/jpeg'):
+    """Run the vision model over a stored image, returns (recipe, parsed)"""
+    width, height = image_dimensions(image_path)
+    detail = prompts.choose_image_detail(width, height, Config.IMAGE_DETAIL)
+    messages = prompts.image_recipe_messages(encode_file_base64(image_path), mime_type, detail)
+    options, prompt_tokens = prompts.request_options(
+        VISION_MODEL, messages, prompts.IMAGE_RECIPE_MAX_TOKENS,
+        image_prompt_tokens=prompts.image_tokens(width, height, detail)
+    )
+    response = create_chat_completion(call='analyze_image', prompt_tokens=prompt_tokens, **options)
+    return prompts.parse_recipe_reply(response.choices[0].message.content, IMAGE_RECIPE_FALLBACK)
+
+def generate_recipe_from_ingredients(ingredients, use_cache=True):
     """Generate a recipe from a list of ingredients using OpenAI"""
     try:
         if not client:
             raise ValueError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
         
-        # Create prompt for recipe generation
-        ingredients_text = ", ".join(ingredients)
-        prompt = f"""
-        Create a recipe using these ingredients: {ingredients_text}
-        
-        Return the recipe in this JSON format:
-        {{
-            "title": "Recipe title",
-            "description": "Brief description of the dish",
-            "ingredients": ["ingredient 1", "ingredient 2", ...],
-            "instructions": "Step-by-step cooking instructions",
-            "cooking_time": 30,
-            "servings": 4,
-            "difficulty": "Easy/Medium/Hard",
-            "cuisine": "Type of cuisine"
-        }}
-        
-        Make sure the recipe is practical and delicious. Include any additional ingredients that would complement the provided ingredients.
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
+        return cached_call(
+            ingredients_key(RECIPE_MODEL, ingredients),
+            lambda: _generate_recipe(ingredients),
+            use_cache
         )
-        
-        content = response.choices[0].message.content
-        
-        # Parse the response
-        import json
-        import re
-        
-        # Look for JSON in the response
-        json_match = re.search(r'\{.*\}', content, re.DOTALL)
-        if json_match:
-            recipe_data = json.loads(json_match.group())
-        else:
-            # If no JSON found, create a basic structure
-            recipe_data = {
-                "title": f"Recipe with {ingredients[0]}",
-                "description": content,
-                "ingredients": ingredients,
-                "instructions": "Please review and edit the recipe details.",
-                "cooking_time": 30,
-                "servings": 4,
-                "difficulty": "Medium",
-                "cuisine": "General"
-            }
-        
-        return recipe_data
     
     except Exception as e:
         logger.error(f"Error generating recipe from ingredients: {str(e)}")
         raise
 
-def improve_recipe(recipe_text):
-    """Improve an existing recipe using OpenAI"""
+def recipe_request(ingredients):
+    """chat.completions.create arguments for a recipe from ingredients, and the prompt token count"""
+    return prompts.request_options(
+        RECIPE_MODEL,
+        prompts.ingredients_recipe_messages(ingredients),
+        prompts.ingredients_recipe_tokens(ingredients)
+    )
+
+def parse_generated_recipe(content, ingredients):
+    """(recipe, parsed): the recipe JSON in a completion, or the raw text wrapped as a recipe if there is none"""
+    return prompts.parse_recipe_reply(content, {
+        "title": f"Recipe with {ingredients[0]}",
+        "description": "",
+        "ingredients": ingredients,
+        "instructions": "Please review and edit the recipe details.",
+        "cooking_time": 30,
+        "servings": 4,
+        "difficulty": "Medium",
+        "cuisine": "General"
+    })
+
+def _generate_recipe(ingredients):
+    """Ask the model for a recipe using the given ingredients, returns (recipe, parsed)"""
+    options, prompt_tokens = recipe_request(ingredients)
+    response = create_chat_completion(call='generate_recipe', prompt_tokens=prompt_tokens, **options)
+    return parse_generated_recipe(response.choices[0].message.content, ingredients)
+
+def improve_recipe_request(recipe_text, as_json=False):
+    """chat.completions.create arguments for improving a recipe, and the prompt token count"""
+    return prompts.request_options(
+        RECIPE_MODEL,
+        prompts.improve_recipe_messages(recipe_text, as_json),
+        prompts.improve_recipe_tokens(recipe_text, RECIPE_MODEL),
+        json_output=as_json
+    )
+
+def improve_recipe(recipe_text, use_cache=True, as_json=False):
+    """Improve an existing recipe using OpenAI; as_json asks for the recipe JSON schema in reply"""
     try:
         if not client:
             raise ValueError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
         
-        prompt = f"""
-        Improve this recipe to make it more delicious and detailed:
+        options, prompt_tokens = improve_recipe_request(recipe_text, as_json)
+        messages = options['messages']
+        
+        def compute():
+            response = create_chat_completion(call='improve_recipe', prompt_tokens=prompt_tokens, **options)
+            content = response.choices[0].message.content
+            # A JSON reply without its object is retried by the caller, so it must not be cached
+            return content, not as_json or prompts.extract_json_object(content or '') is not None
         
-        {recipe_text}
+        return cached_call(prompt_key(RECIPE_MODEL, messages), compute, use_cache)
+    
+    except Exception as e:
+        logger.error(f"Error improving recipe: {str(e)}")
+        raise
+
+def build_chef_messages(prompt):
+    """Chat messages for a free-form AI Chef question"""
+    return [
+        {"role": "system", "content": CHEF_SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+def ask_ai_chef(prompt, use_cache=True):
+    """Free-form cooking assistant, returns a markdown answer"""
+    try:
+        if not client:
+            raise ValueError("AI Chef is not available. Please set your OpenAI API key.")
         
-        Return the improved recipe in the same format, with better instructions, tips, and suggestions.
-        """
+        messages = build_chef_messages(prompt)
         
-        response = client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1000,
-        )
+        def compute():
+            response = create_chat_completion(call='ai_chef', model=CHEF_MODEL, messages=messages, max_tokens=1200)
+            return response.choices[0].message.content, True
         
-        return response.choices[0].message.content
+        return cached_call(prompt_key(CHEF_MODEL, messages), compute, use_cache)
     
     except Exception as e:
-        logger.error(f"Error improving recipe: {str(e)}")
-        raise 
\ No newline at end of file
+        logger.error(f"Error asking AI Chef: {str(e)}")
+        raise
+
+def stream_ai_chef(prompt, use_cache=True):
+    """Like ask_ai_chef, but yields the markdown answer in pieces as the model writes it"""
+    if not client:
+        raise ValueError("AI Chef is not available. Please set your OpenAI API key.")
+    
+    messages = build_chef_messages(prompt)
+    key = prompt_key(CHEF_MODEL, messages)
+    cached = cache.get(key) if use_cache else None
+    if cached is not None:
+        yield cached
+        return
+    
+    parts = []
+    for delta in stream_chat_completion(call='ai_chef', model=CHEF_MODEL, messages=messages, max_tokens=1200):
+        parts.append(delta)
+        yield delta
+    cache.set(key, ''.join(parts))
+
+def stream_recipe_from_ingredients(ingredients, use_cache=True):
+    """Like generate_recipe_from_ingredients, but yields ('token', text) pieces as they
+    arrive and finally ('recipe', recipe_data) once the full completion is parsed"""
+    if not client:
+        raise ValueError("OpenAI API key not configured. Please set OPENAI_API_KEY environment variable.")
+    
+    key = ingredients_key(RECIPE_MODEL, ingredients)
+    cached = cache.get(key) if use_cache else None
+    if cached is not None:
+        yield 'recipe', cached
+        return
+    
+    parts = []
+    options, prompt_tokens = recipe_request(ingredients)
+    for delta in stream_chat_completion(call='generate_recipe', prompt_tokens=prompt_tokens, **options):
+        parts.append(delta)
+        yield 'token', delta
+    recipe_data, parsed = parse_generated_recipe(''.join(parts), ingredients)
+    if parsed:
+        cache.set(key, recipe_data)
+    yield 'recipe', recipe_data
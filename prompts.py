@@ -0,0 +1,239 @@
+from functools import lru_cache
+import json
+import math
+import re
+
+try:
+    import tiktoken  # optional, exact token counts; otherwise ~4 characters per token
+except ImportError:
+    tiktoken = None
+
+# Context window per model, to keep prompt + max_tokens within bounds
+CONTEXT_WINDOWS = {
+    'gpt-4': 8192,
+    'gpt-4-vision-preview': 128000,
+    'gpt-4o': 128000,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Models that accept response_format={"type": "json_object"}; the others get the
+# same instructions and are parsed the same way, just without the API guarantee
+JSON_MODE_MODEL_PREFIXES = ('gpt-4o', 'gpt-4-turbo', 'gpt-4-1106', 'gpt-4-0125', 'gpt-3.5-turbo-1106', 'gpt-3.5-turbo-0125')
+
+# Chat format overhead: tokens per message and for priming the reply
+TOKENS_PER_MESSAGE = 3
+REPLY_PRIMING_TOKENS = 3
+
+# Vision pricing: a flat cost per image, plus per 512px tile at high detail
+IMAGE_BASE_TOKENS = 85
+IMAGE_TILE_TOKENS = 170
+# Low detail sends a 512px thumbnail, so smaller images lose nothing by using it
+LOW_DETAIL_MAX_SIDE = 512
+
+# Output budgets: a recipe JSON is a few hundred tokens, longer with more ingredients
+RECIPE_BASE_TOKENS = 350
+RECIPE_TOKENS_PER_INGREDIENT = 40
+IMAGE_RECIPE_MAX_TOKENS = 700
+IMPROVE_MIN_TOKENS = 400
+MAX_COMPLETION_TOKENS = 1500
+
+RECIPE_SCHEMA = (
+    'Reply with one JSON object with these keys: '
+    'title (string), description (one sentence), '
+    'ingredients (array of strings with quantities), '
+    'instructions (string of numbered steps separated by newlines), '
+    'cooking_time (integer minutes), servings (integer), '
+    'difficulty ("Easy", "Medium" or "Hard"), cuisine (string).'
+)
+
+RECIPE_SYSTEM_MESSAGE = f'You are a precise recipe writer. {RECIPE_SCHEMA}'
+
+IMAGE_PROMPT = (
+    'Identify the dish in this photo and write its recipe. '
+    'Estimate any ingredients or details you cannot see.'
+)
+
+INGREDIENTS_PROMPT = (
+    'Write a practical, tasty recipe using these ingredients: {ingredients}. '
+    'You may add common complementary ingredients.'
+)
+
+IMPROVE_PROMPT = (
+    'Improve this recipe: make it tastier and the instructions clearer, adding tips where useful. '
+    'Keep the same format.\n\n{recipe}'
+)
+
+IMPROVE_JSON_PROMPT = (
+    'Improve this recipe: make it tastier and the instructions clearer, adding tips where useful. '
+    'Write a description if it has none. Keep the title and ingredients.\n\n{recipe}'
+)
+
+# USD per million (prompt, completion) tokens, for cost estimates
+MODEL_PRICES = {
+    'gpt-4': (30.0, 60.0),
+    'gpt-4-vision-preview': (10.0, 30.0),
+    'gpt-4o': (5.0, 15.0),
+}
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+
+def count_tokens(text, model):
+    """Tokens in text for model; an estimate of ~4 characters per token without tiktoken"""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return math.ceil(len(text) / 4)
+    return len(_encoding(model).encode(text))
+
+def image_tokens(width, height, detail):
+    """Prompt tokens the vision API charges for an image of this size"""
+    if detail == 'low':
+        return IMAGE_BASE_TOKENS
+    # High detail fits the image in 2048x2048, scales the short side to 768, then counts 512px tiles
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return IMAGE_BASE_TOKENS + IMAGE_TILE_TOKENS * math.ceil(width / 512) * math.ceil(height / 512)
+
+def choose_image_detail(width, height, setting='auto'):
+    """'low' or 'high'; auto picks low when the image is no bigger than the low-detail thumbnail"""
+    if setting in ('low', 'high'):
+        return setting
+    return 'low' if max(width, height) <= LOW_DETAIL_MAX_SIDE else 'high'
+
+def count_message_tokens(messages, model):
+    """Prompt tokens for the text of a list of chat messages; images are counted by image_tokens()"""
+    total = REPLY_PRIMING_TOKENS
+    for message in messages:
+        total += TOKENS_PER_MESSAGE
+        content = message['content']
+        if isinstance(content, str):
+            total += count_tokens(content, model)
+        else:
+            total += sum(count_tokens(part['text'], model) for part in content if part['type'] == 'text')
+    return total
+
+def budget_max_tokens(model, prompt_tokens, wanted):
+    """max_tokens for a call: what the answer needs, capped by what the context window has left"""
+    available = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW) - prompt_tokens
+    return max(1, min(wanted, MAX_COMPLETION_TOKENS, available))
+
+def supports_json_mode(model):
+    return model.startswith(JSON_MODE_MODEL_PREFIXES)
+
+def request_options(model, messages, wanted_tokens, json_output=True, image_prompt_tokens=0):
+    """chat.completions.create keyword arguments with an adaptive max_tokens, and the prompt token count"""
+    prompt_tokens = count_message_tokens(messages, model) + image_prompt_tokens
+    options = {
+        'model': model,
+        'messages': messages,
+        'max_tokens': budget_max_tokens(model, prompt_tokens, wanted_tokens),
+    }
+    if json_output and supports_json_mode(model):
+        options['response_format'] = {'type': 'json_object'}
+    return options, prompt_tokens
+
+def image_recipe_messages(image_b64, mime_type, detail):
+    """Messages asking for the recipe of a food photo"""
+    return [
+        {'role': 'system', 'content': RECIPE_SYSTEM_MESSAGE},
+        {'role': 'user', 'content': [
+            {'type': 'text', 'text': IMAGE_PROMPT},
+            {'type': 'image_url', 'image_url': {'url': f'data:{mime_type};base64,{image_b64}', 'detail': detail}},
+        ]},
+    ]
+
+def ingredients_recipe_messages(ingredients):
+    """Messages asking for a JSON recipe built around the given ingredients"""
+    return [
+        {'role': 'system', 'content': RECIPE_SYSTEM_MESSAGE},
+        {'role': 'user', 'content': INGREDIENTS_PROMPT.format(ingredients=', '.join(ingredients))},
+    ]
+
+def ingredients_recipe_tokens(ingredients):
+    """Output budget for a recipe generated from this many ingredients"""
+    return RECIPE_BASE_TOKENS + RECIPE_TOKENS_PER_INGREDIENT * len(ingredients)
+
+def improve_recipe_messages(recipe_text, as_json=False):
+    """Messages asking for an improved version of a recipe, in its own format or as recipe JSON"""
+    if as_json:
+        return [
+            {'role': 'system', 'content': RECIPE_SYSTEM_MESSAGE},
+            {'role': 'user', 'content': IMPROVE_JSON_PROMPT.format(recipe=recipe_text.strip())},
+        ]
+    return [{'role': 'user', 'content': IMPROVE_PROMPT.format(recipe=recipe_text.strip())}]
+
+def improve_recipe_tokens(recipe_text, model):
+    """Output budget for an improved recipe: somewhat longer than the original"""
+    return max(IMPROVE_MIN_TOKENS, int(count_tokens(recipe_text, model) * 1.5))
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """USD cost of the given token counts, or None for a model without a known price"""
+    if model not in MODEL_PRICES:
+        return None
+    prompt_price, completion_price = MODEL_PRICES[model]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+def extract_json_object(content):
+    """The first complete JSON object in a completion, or None
+
+    JSON mode returns exactly one object; other models may wrap it in prose or a code fence.
+    """
+    content = re.sub(r'^```(?:json)?\s*|\s*```$', '', content.strip())
+    try:
+        data = json.loads(content)
+    except ValueError:
+        start = content.find('{')
+        if start == -1:
+            return None
+        try:
+            # raw_decode stops at the end of the first complete object, unlike a greedy regex
+            data, _ = json.JSONDecoder().raw_decode(content, start)
+        except ValueError:
+            return None
+    return data if isinstance(data, dict) else None
+
+def _as_int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def parse_recipe(content, fallback):
+    """The recipe object in a completion, with its fields coerced to the documented types
+
+    fallback is the recipe to return (with content as its description) when the
+    completion holds no JSON object.
+    """
+    return parse_recipe_reply(content, fallback)[0]
+
+def parse_recipe_reply(content, fallback):
+    """Like parse_recipe, but returns (recipe, parsed); parsed is False when fallback was used"""
+    data = extract_json_object(content or '')
+    if data is None:
+        return {**fallback, 'description': content}, False
+    ingredients = data.get('ingredients', fallback['ingredients'])
+    if isinstance(ingredients, str):
+        ingredients = [line.strip() for line in ingredients.splitlines() if line.strip()]
+    elif not isinstance(ingredients, list):
+        ingredients = fallback['ingredients']
+    instructions = data.get('instructions', fallback['instructions'])
+    if isinstance(instructions, list):
+        instructions = '\n'.join(str(step) for step in instructions)
+    return {
+        **data,
+        'title': str(data.get('title') or fallback['title']),
+        'description': str(data.get('description') or ''),
+        'ingredients': [str(i) for i in ingredients],
+        'instructions': str(instructions),
+        'cooking_time': _as_int(data.get('cooking_time'), fallback['cooking_time']),
+        'servings': _as_int(data.get('servings'), fallback['servings']),
+        'difficulty': str(data.get('difficulty') or fallback['difficulty']),
+        'cuisine': str(data.get('cuisine') or fallback['cuisine']),
+    }, True
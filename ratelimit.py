@@ -0,0 +1,286 @@
+from flask import jsonify, make_response, request
+from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
+import math
+import os
+import sqlite3
+import threading
+import time
+import logging
+from metrics import rate_limited_requests, ai_requests_in_flight
+
+logger = logging.getLogger(__name__)
+
+# Idle clients whose buckets have refilled are forgotten once this many are tracked
+MAX_TRACKED_CLIENTS = 10000
+
+# A worker killed mid-call can't release its slot; the slot frees itself after this many seconds
+SLOT_LEASE_SECONDS = 600
+
+# Retry-After sent when every AI slot is taken; calls take seconds, so retrying sooner rarely helps
+SATURATED_RETRY_AFTER = 5
+
+def parse_costs(spec):
+    """Parse "upload-image=4,generate-recipe=2" into {endpoint: tokens per request}"""
+    costs = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        name, cost = item.split('=', 1)
+        costs[name.strip()] = float(cost)
+    return costs
+
+def _refill(tokens, updated, now, rate, capacity):
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+class MemoryLimiterState:
+    """Token buckets and the AI slot count in this process only"""
+
+    backend = 'memory'
+
+    def __init__(self):
+        self._buckets = {}
+        self._slots = 0
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def _reset_after_fork(self):
+        # Each worker limits on its own; the lock may have been held by another thread at fork
+        self._buckets = {}
+        self._slots = 0
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, rate, capacity):
+        """Spend cost tokens from key's bucket; returns (allowed, seconds until it could be allowed)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, rate, capacity)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._prune(now, rate, capacity)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def _prune(self, now, rate, capacity):
+        # A full bucket is the same as no bucket
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if _refill(tokens, updated, now, rate, capacity) < capacity
+        }
+
+    def acquire_slot(self, limit):
+        """Take one of limit AI call slots; returns a handle for release_slot, or None when all are taken"""
+        with self._lock:
+            if self._slots >= limit:
+                return None
+            self._slots += 1
+            return True
+
+    def release_slot(self, slot):
+        with self._lock:
+            self._slots -= 1
+
+class SQLiteLimiterState:
+    """Token buckets and AI slots in a local SQLite file, shared by every worker process"""
+
+    backend = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_buckets_updated ON rate_buckets (updated)")
+        conn.execute("CREATE TABLE IF NOT EXISTS ai_slots (id INTEGER PRIMARY KEY, expires_at REAL NOT NULL)")
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self._close_connection)
+
+    def _connect(self):
+        # One connection per thread; autocommit mode so transactions are begun explicitly below
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _close_connection(self):
+        # An SQLite connection must not be carried across fork(); the forking thread reopens lazily
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def _transaction(self, work):
+        # IMMEDIATE takes the write lock up front, so two processes can't both read a
+        # bucket and then both spend from it
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def take(self, key, cost, rate, capacity):
+        def work(conn):
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = _refill(row[0], row[1], now, rate, capacity) if row else capacity
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, now)
+            )
+            # Buckets idle long enough to have refilled completely carry no state
+            conn.execute("DELETE FROM rate_buckets WHERE updated < ?", (now - capacity / rate,))
+            return allowed, 0.0 if allowed else (cost - tokens) / rate
+        return self._transaction(work)
+
+    def acquire_slot(self, limit):
+        def work(conn):
+            now = time.time()
+            conn.execute("DELETE FROM ai_slots WHERE expires_at <= ?", (now,))
+            if conn.execute("SELECT COUNT(*) FROM ai_slots").fetchone()[0] >= limit:
+                return None
+            return conn.execute(
+                "INSERT INTO ai_slots (expires_at) VALUES (?)", (now + SLOT_LEASE_SECONDS,)
+            ).lastrowid
+        return self._transaction(work)
+
+    def release_slot(self, slot):
+        self._connect().execute("DELETE FROM ai_slots WHERE id = ?", (slot,))
+
+def create_limiter_state(backend, path='ratelimit.db'):
+    """Build the limiter state backend named in configuration ('memory' or 'sqlite')"""
+    if backend == 'sqlite':
+        try:
+            return SQLiteLimiterState(path)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to open rate limit state at {path}, limiting per process instead: {e}")
+    return MemoryLimiterState()
+
+class RateLimiter:
+    """Per-client token buckets with a cost per endpoint, and a global cap on in-flight AI calls"""
+
+    def __init__(self, state, per_minute=20, burst=20, costs=None, max_ai_in_flight=16):
+        self.state = state
+        self.rate = per_minute / 60.0
+        self.capacity = burst
+        self.costs = costs or {}
+        self.max_ai_in_flight = max_ai_in_flight
+
+    def take(self, client, endpoint):
+        """(allowed, retry_after_seconds) for one request from client to endpoint"""
+        # One bucket per client across endpoints; a cost above the burst could never be
+        # paid, so it is charged a full bucket instead
+        cost = min(self.costs.get(endpoint, 1), self.capacity)
+        return self.state.take(client, cost, self.rate, self.capacity)
+
+    def acquire_ai_slot(self):
+        """A slot handle, or None when max_ai_in_flight calls are already running (0 = no cap)"""
+        if not self.max_ai_in_flight:
+            return True
+        return self.state.acquire_slot(self.max_ai_in_flight)
+
+    def release_ai_slot(self, slot):
+        if self.max_ai_in_flight:
+            self.state.release_slot(slot)
+
+# Set up by init_rate_limits()
+limiter = None
+
+def _client_key():
+    # remote_addr is the peer, or the forwarded client address behind RATE_LIMIT_PROXY_HOPS proxies
+    return request.remote_addr or 'unknown'
+
+def _reject(endpoint, reason, status, message, retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    rate_limited_requests.inc((endpoint, reason))
+    response = jsonify({'error': message, 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
+def rate_limited(endpoint, ai_call=True):
+    """Admit a request only if the client's bucket covers the endpoint's cost and, for
+    endpoints that call the model in the request, an AI slot is free
+
+    Rejections fail fast with 429 (this client is over its rate) or 503 (the service
+    is at its AI call cap), both with Retry-After. The slot is held until the response,
+    including a streamed one, has been sent.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if limiter is None:
+                return view(*args, **kwargs)
+            try:
+                allowed, retry_after = limiter.take(_client_key(), endpoint)
+                slot = limiter.acquire_ai_slot() if allowed and ai_call else True
+            except Exception as e:
+                # Rate limiting must not take the endpoint down with it
+                logger.error(f"Error checking rate limit for {endpoint}: {str(e)}")
+                return view(*args, **kwargs)
+            if not allowed:
+                return _reject(endpoint, 'client', 429, 'Too many requests, please slow down', retry_after)
+            if slot is None:
+                return _reject(
+                    endpoint, 'saturated', 503, 'The AI service is busy, please retry shortly', SATURATED_RETRY_AFTER
+                )
+            if not ai_call:
+                return view(*args, **kwargs)
+
+            released = False
+
+            def release():
+                nonlocal released
+                if not released:
+                    released = True
+                    ai_requests_in_flight.dec()
+                    try:
+                        limiter.release_ai_slot(slot)
+                    except Exception as e:
+                        logger.error(f"Error releasing AI slot: {str(e)}")
+
+            ai_requests_in_flight.inc()
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                release()
+                raise
+            response.call_on_close(release)
+            return response
+        return wrapper
+    return decorator
+
+def init_rate_limits(app):
+    """Set up the limiter from configuration; RATE_LIMIT_ENABLED=false turns it off"""
+    global limiter
+    if app.config['RATE_LIMIT_PROXY_HOPS']:
+        # Trust that many X-Forwarded-For hops so clients aren't all the proxy's address
+        hops = app.config['RATE_LIMIT_PROXY_HOPS']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops)
+    if not app.config['RATE_LIMIT_ENABLED']:
+        limiter = None
+        return
+    limiter = RateLimiter(
+        create_limiter_state(app.config['RATE_LIMIT_BACKEND'], app.config['RATE_LIMIT_PATH']),
+        per_minute=app.config['RATE_LIMIT_PER_MINUTE'],
+        burst=app.config['RATE_LIMIT_BURST'],
+        costs=parse_costs(app.config['RATE_LIMIT_COSTS']),
+        max_ai_in_flight=app.config['AI_MAX_IN_FLIGHT']
+    )
+    logger.info(
+        f"Rate limits: {app.config['RATE_LIMIT_PER_MINUTE']}/min per client ({limiter.state.backend}), "
+        f"{app.config['AI_MAX_IN_FLIGHT'] or 'unlimited'} AI calls in flight"
+    )
@@ -0,0 +1,90 @@
+from flask import Response, request
+import hashlib
+import logging
+import uuid
+from config import Config
+from ai_cache import create_cache
+
+logger = logging.getLogger(__name__)
+
+# Replaced by a fresh random token on every recipe write; listing keys embed it, so one write
+# retires every cached page. Tokens are never reused, so losing the key to TTL or eviction can
+# only retire pages early, never bring back pages cached before a write.
+LISTING_GENERATION_KEY = 'listing-generation'
+
+class ResponseCache:
+    """Read-through cache of serialized recipe responses with write invalidation
+
+    Single recipes are keyed by id and dropped exactly when that recipe changes.
+    Listing pages (which any write can affect) are keyed by endpoint, query
+    string and a generation token that every write replaces.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    @staticmethod
+    def recipe_key(recipe_id):
+        return f'recipe:{recipe_id}'
+
+    def _new_generation(self):
+        generation = uuid.uuid4().hex
+        self.store.set(LISTING_GENERATION_KEY, generation)
+        return generation
+
+    def generation(self):
+        """The current generation token; take it before a database read to pass to set(generation=...)"""
+        return self.store.get(LISTING_GENERATION_KEY) or self._new_generation()
+
+    def listing_key(self, endpoint, args):
+        generation = self.generation()
+        query = '&'.join(f'{k}={v}' for k, v in sorted(args.items(multi=True)))
+        return f'listing:{generation}:{endpoint}:{query}'
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, body, etag=None, last_modified=None, generation=None):
+        """Cache a JSON body; the ETag defaults to a hash of the body
+
+        For keys that don't embed the generation (single recipes), pass the generation
+        taken before the body was read from the database: if a write invalidated the
+        cache in between, the body may be stale and is not kept.
+        """
+        entry = {
+            'body': body,
+            'etag': etag or hashlib.sha1(body.encode('utf-8')).hexdigest(),
+            'last_modified': last_modified,
+        }
+        self.store.set(key, entry)
+        if generation is not None and self.store.get(LISTING_GENERATION_KEY) != generation:
+            # Checked after storing: invalidate_recipe() replaces the generation before
+            # deleting the key, so a write racing with this set either shows up here
+            # or deletes the entry itself
+            self.store.delete(key)
+        return entry
+
+    def invalidate_recipe(self, recipe_id=None):
+        """Drop a changed recipe (if given) and retire every cached listing page"""
+        self._new_generation()
+        if recipe_id is not None:
+            self.store.delete(self.recipe_key(recipe_id))
+
+    def stats(self):
+        return {'backend': self.store.backend, **self.store.stats.as_dict()}
+
+def cached_json_response(entry):
+    """Build a JSON response from a cache entry, answering 304 to matching conditional requests"""
+    response = Response(entry['body'], mimetype='application/json')
+    response.set_etag(entry['etag'])
+    if entry['last_modified']:
+        response.last_modified = entry['last_modified']
+    response.headers['Cache-Control'] = 'no-cache'  # clients may store it, but must revalidate
+    return response.make_conditional(request)
+
+response_cache = ResponseCache(create_cache(
+    Config.RESPONSE_CACHE_BACKEND,
+    max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+    ttl=Config.RESPONSE_CACHE_TTL,
+    path=Config.RESPONSE_CACHE_PATH
+))
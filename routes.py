@@ -1,51 +1,402 @@
-from flask import Blueprint, request, jsonify, current_app
-from database import get_db_session, Recipe, User
-from openai_client import analyze_recipe_image, generate_recipe_from_ingredients
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
+from database import get_db_session, get_pool_stats, Recipe, User
+from openai_client import (
+    analyze_recipe_image, generate_recipe_from_ingredients, ask_ai_chef, get_cache_stats,
+    stream_ai_chef, stream_recipe_from_ingredients
+)
+from search import index_recipe, remove_recipe, search_recipe_ids
+from ingredients import (
+    sync_recipe_ingredients, remove_recipe_ingredients, find_recipes_by_ingredients, find_best_recipe_match
+)
+from embeddings import update_recipe_embeddings, remove_recipe_embedding, find_similar_recipes
+from stats import recipe_stat_keys, apply_stat_changes, record_new_recipes, recipe_stats
+from units import scale_ingredients, shopping_list
 import json
 import os
-from werkzeug.utils import secure_filename
+import calendar
+import hashlib
+import jobs
+from PIL import Image, UnidentifiedImageError
+from werkzeug.exceptions import RequestEntityTooLarge
+from images import preprocess_image
+from ratelimit import rate_limited
+from bulk import (
+    BulkFormatError, iter_body_chunks, iter_ndjson, iter_json_array, import_recipes, export_recipes_gzip
+)
+from response_cache import response_cache, cached_json_response
+from serializers import RECIPE_FIELDS, RecipeSerializer, encode_page, dumps
+from listing import (
+    parse_filters, parse_sort, encode_cursor, decode_cursor, listing_serializer,
+    build_recipe_listing_query, facet_counts
+)
 from datetime import datetime
 import logging
+import time
 
 api_bp = Blueprint('api', __name__)
 logger = logging.getLogger(__name__)
 
-def allowed_file(filename):
-    return '.' in filename and \
-           filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
+# Rows fetched per round-trip when streaming from a server-side cursor
+STREAM_BATCH_SIZE = 1000
+
+# Last NDJSON line of a stream that failed part-way, so clients can tell the export is incomplete
+STREAM_ERROR_LINE = dumps({'error': 'Export failed, the response is incomplete'})
+
+# Upper bound on ?top_ingredients= for /api/stats
+MAX_TOP_INGREDIENTS = 100
+
+# Upper bounds for ?servings= and for the recipes in one shopping list
+MAX_SERVINGS = 1000
+MAX_SHOPPING_LIST_RECIPES = 100
+
+# Seconds between job status checks when streaming job events, and the longest one stream lasts
+# (a client still waiting after that reconnects or polls GET /api/jobs/<id>)
+JOB_EVENTS_POLL_INTERVAL = 0.5
+JOB_EVENTS_MAX_SECONDS = 300
+
+def allowed_image(upload):
+    """True when an uploaded file's magic bytes are those of an allowed image type"""
+    image_type = getattr(upload, 'image_type', None)
+    return image_type is not None and image_type in current_app.config['ALLOWED_EXTENSIONS']
+
+def wants_stream():
+    """True when the client asked for Server-Sent Events (?stream=1 or Accept: text/event-stream)"""
+    if request.args.get('stream'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    """Stream an iterator of SSE strings without proxy buffering"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def parse_servings(value):
+    """A requested serving count as an int, ValueError unless it is between 1 and MAX_SERVINGS"""
+    try:
+        servings = 0 if isinstance(value, bool) else int(value)
+    except (TypeError, ValueError):
+        servings = 0
+    if not 1 <= servings <= MAX_SERVINGS:
+        raise ValueError(f'servings must be an integer between 1 and {MAX_SERVINGS}')
+    return servings
+
+def parse_units(value):
+    """True for ?units=metric, False for the recipe's own units"""
+    if value in (None, '', 'original'):
+        return False
+    if value == 'metric':
+        return True
+    raise ValueError("units must be 'original' or 'metric'")
+
+def check_scalable(recipe_id, stored_servings):
+    """ValueError unless a recipe's stored servings (which the API never validated) can be scaled from"""
+    if not isinstance(stored_servings, int) or isinstance(stored_servings, bool) or stored_servings < 1:
+        raise ValueError(f'Recipe {recipe_id} has no servings to scale from')
+
+def scaled_recipe_response(entry, servings, metric):
+    """A cached recipe body rescaled to another number of servings, with its own validators"""
+    recipe = json.loads(entry['body'])
+    check_scalable(recipe['id'], recipe.get('servings'))
+    if not isinstance(recipe.get('ingredients'), list):
+        raise ValueError(f"Recipe {recipe['id']} has no ingredient list to scale")
+    parsed = scale_ingredients(dumps(recipe['ingredients']), servings / recipe['servings'], metric)
+    recipe['original_servings'] = recipe['servings']
+    recipe['servings'] = servings
+    recipe['ingredients'] = [line['text'] for line in parsed]
+    recipe['parsed_ingredients'] = parsed
+    return cached_json_response({
+        'body': dumps(recipe),
+        'etag': f"{entry['etag']}-{servings}{'-metric' if metric else ''}",
+        'last_modified': entry['last_modified'],
+    })
+
+def use_ai_cache():
+    """False when the client asked to skip the AI response cache (?nocache=1 or Cache-Control: no-cache)"""
+    if request.args.get('nocache'):
+        return False
+    return 'no-cache' not in request.headers.get('Cache-Control', '')
+
+def parse_fields(fields_param):
+    """Parse the `fields=` query parameter into a list of recipe columns"""
+    if not fields_param:
+        return list(RECIPE_FIELDS)
+    fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in RECIPE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+def stream_recipes_ndjson(fields, filters, sort, order, cursor=None, limit=None):
+    """Yield public recipes as NDJSON lines from a server-side cursor"""
+    db = get_db_session()
+    try:
+        serializer = listing_serializer(fields, sort)
+        query = build_recipe_listing_query(db, serializer, filters, sort, order, cursor)
+        if limit:
+            query = query.limit(limit)
+        query = query.execution_options(stream_results=True, yield_per=STREAM_BATCH_SIZE)
+        for row in query:
+            yield serializer.encode(row) + '\n'
+    except Exception as e:
+        logger.error(f"Error streaming recipes: {str(e)}")
+        yield STREAM_ERROR_LINE + '\n'
+    finally:
+        db.close()
 
 @api_bp.route('/recipes', methods=['GET'])
 def get_recipes():
-    """Get all recipes"""
+    """Get public recipes, filtered and sorted, paginated with a keyset cursor or streamed as NDJSON"""
+    db = None
     try:
+        fields = parse_fields(request.args.get('fields'))
+        filters = parse_filters(request.args)
+        sort, order = parse_sort(request.args)
+        cursor = request.args.get('cursor')
+        limit = request.args.get('limit', type=int)
+        if cursor:
+            decode_cursor(cursor, sort, order)
+        if limit is not None and limit < 1:
+            raise ValueError('limit must be a positive integer')
+
+        if request.args.get('format') == 'ndjson':
+            return Response(
+                stream_with_context(stream_recipes_ndjson(fields, filters, sort, order, cursor, limit)),
+                mimetype='application/x-ndjson'
+            )
+
+        limit = min(limit or current_app.config['RECIPES_PAGE_SIZE'],
+                    current_app.config['RECIPES_MAX_PAGE_SIZE'])
+
+        cache_key = response_cache.listing_key('recipes', request.args)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return cached_json_response(entry)
+
         db = get_db_session()
-        recipes = db.query(Recipe).filter(Recipe.is_public == True).all()
-        
-        recipe_list = []
-        for recipe in recipes:
-            recipe_data = {
-                'id': recipe.id,
-                'title': recipe.title,
-                'description': recipe.description,
-                'ingredients': json.loads(recipe.ingredients) if recipe.ingredients else [],
-                'instructions': recipe.instructions,
-                'cooking_time': recipe.cooking_time,
-                'servings': recipe.servings,
-                'difficulty': recipe.difficulty,
-                'cuisine': recipe.cuisine,
-                'image_url': recipe.image_url,
-                'created_at': recipe.created_at.isoformat() if recipe.created_at else None,
-                'updated_at': recipe.updated_at.isoformat() if recipe.updated_at else None
-            }
-            recipe_list.append(recipe_data)
-        
-        return jsonify({'recipes': recipe_list})
+        # Fetch one extra row to find out whether another page exists
+        serializer = listing_serializer(fields, sort)
+        query = build_recipe_listing_query(db, serializer, filters, sort, order, cursor)
+        rows = query.limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        next_cursor = encode_cursor(sort, order, getattr(rows[-1], sort), rows[-1].id) if has_more else None
+        body = encode_page([serializer.encode(row) for row in rows], next_cursor=next_cursor)
+
+        entry = response_cache.set(cache_key, body)
+        return cached_json_response(entry)
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting recipes: {str(e)}")
         return jsonify({'error': 'Failed to get recipes'}), 500
     finally:
-        db.close()
+        if db is not None:
+            db.close()
+
+@api_bp.route('/recipes/facets', methods=['GET'])
+def get_recipe_facets():
+    """Counts of public recipes per cuisine and difficulty, under the same filters as the listing"""
+    db = None
+    try:
+        filters = parse_filters(request.args)
+
+        cache_key = response_cache.listing_key('facets', request.args)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return cached_json_response(entry)
+
+        db = get_db_session()
+        entry = response_cache.set(cache_key, dumps({'facets': facet_counts(db, filters)}))
+        return cached_json_response(entry)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting recipe facets: {str(e)}")
+        return jsonify({'error': 'Failed to get recipe facets'}), 500
+    finally:
+        if db is not None:
+            db.close()
+
+@api_bp.route('/stats', methods=['GET'])
+def get_stats():
+    """Dashboard aggregates over public recipes, read from the maintained summary table"""
+    db = None
+    try:
+        top_ingredients = request.args.get('top_ingredients', 20, type=int)
+        if not 1 <= top_ingredients <= MAX_TOP_INGREDIENTS:
+            raise ValueError(f'top_ingredients must be between 1 and {MAX_TOP_INGREDIENTS}')
+
+        cache_key = response_cache.listing_key('stats', request.args)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return cached_json_response(entry)
+
+        db = get_db_session()
+        entry = response_cache.set(cache_key, dumps(recipe_stats(db, top_ingredients)))
+        return cached_json_response(entry)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error getting recipe stats: {str(e)}")
+        return jsonify({'error': 'Failed to get recipe stats'}), 500
+    finally:
+        if db is not None:
+            db.close()
+
+@api_bp.route('/shopping-list', methods=['POST'])
+def get_shopping_list():
+    """Aggregated ingredient totals for a meal plan of recipes, each at its own serving count"""
+    db = None
+    try:
+        data = request.get_json(silent=True) or {}
+        plan = data.get('recipes')
+        if not isinstance(plan, list) or not plan:
+            raise ValueError('recipes must be a non-empty list of {"id": ..., "servings": ...} objects')
+        if len(plan) > MAX_SHOPPING_LIST_RECIPES:
+            raise ValueError(f'A shopping list can cover at most {MAX_SHOPPING_LIST_RECIPES} recipes')
+        # Bare ids are accepted for "as written"
+        plan = [item if isinstance(item, dict) else {'id': item} for item in plan]
+        for item in plan:
+            if not isinstance(item.get('id'), int) or isinstance(item['id'], bool):
+                raise ValueError('Each recipe needs an integer id')
+            if item.get('servings') is not None:
+                item['servings'] = parse_servings(item['servings'])
+        
+        db = get_db_session()
+        ids = {item['id'] for item in plan}
+        rows = {
+            row.id: row for row in
+            db.query(Recipe.id, Recipe.ingredients, Recipe.servings).filter(Recipe.id.in_(ids))
+        }
+        missing = sorted(ids - rows.keys())
+        if missing:
+            return jsonify({'error': 'Recipe not found', 'recipe_ids': missing}), 404
+        
+        recipes = []
+        for item in plan:
+            row = rows[item['id']]
+            factor = 1.0
+            if item.get('servings') is not None:
+                check_scalable(row.id, row.servings)
+                factor = item['servings'] / row.servings
+            recipes.append((row.id, row.ingredients, factor))
+        
+        return Response(dumps({'items': shopping_list(recipes)}), mimetype='application/json')
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error building shopping list: {str(e)}")
+        return jsonify({'error': 'Failed to build shopping list'}), 500
+    finally:
+        if db is not None:
+            db.close()
+
+@api_bp.route('/recipes/search', methods=['GET'])
+def search_recipes():
+    """Full-text search over public recipes, best match first"""
+    db = None
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'No search query provided'}), 400
+        
+        fields = parse_fields(request.args.get('fields'))
+        limit = request.args.get('limit', current_app.config['RECIPES_PAGE_SIZE'], type=int)
+        offset = request.args.get('offset', 0, type=int)
+        if limit < 1 or offset < 0:
+            raise ValueError('limit must be positive and offset non-negative')
+        limit = min(limit, current_app.config['RECIPES_MAX_PAGE_SIZE'])
+        
+        cache_key = response_cache.listing_key('search', request.args)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return cached_json_response(entry)
+        
+        db = get_db_session()
+        ids = search_recipe_ids(db, query, limit, offset)
+        
+        # Fetch the projected columns for this page only, then restore rank order
+        serializer = RecipeSerializer(fields)
+        rows = {}
+        if ids:
+            rows = {row.id: row for row in db.query(*serializer.columns).filter(Recipe.id.in_(ids))}
+        recipe_list = [serializer.encode(rows[i]) for i in ids if i in rows]
+        
+        entry = response_cache.set(cache_key, encode_page(
+            recipe_list,
+            next_offset=offset + limit if len(ids) == limit else None
+        ))
+        return cached_json_response(entry)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching recipes: {str(e)}")
+        return jsonify({'error': 'Failed to search recipes'}), 500
+    finally:
+        if db is not None:
+            db.close()
+
+@api_bp.route('/recipes/by-ingredients', methods=['GET'])
+def get_recipes_by_ingredients():
+    """Find public recipes that can be cooked from a pantry list, best coverage first"""
+    db = None
+    try:
+        pantry = [i for value in request.args.getlist('ingredients') for i in value.split(',')]
+        if not any(i.strip() for i in pantry):
+            return jsonify({'error': 'No ingredients provided'}), 400
+        
+        fields = parse_fields(request.args.get('fields'))
+        limit = request.args.get('limit', 20, type=int)
+        if limit < 1:
+            raise ValueError('limit must be a positive integer')
+        limit = min(limit, current_app.config['RECIPES_MAX_PAGE_SIZE'])
+        
+        cache_key = response_cache.listing_key('by-ingredients', request.args)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return cached_json_response(entry)
+        
+        db = get_db_session()
+        matches = find_recipes_by_ingredients(db, pantry, limit)
+        
+        serializer = RecipeSerializer(fields)
+        rows = {}
+        if matches:
+            ids = [m['recipe_id'] for m in matches]
+            rows = {row.id: row for row in db.query(*serializer.columns).filter(Recipe.id.in_(ids))}
+        
+        recipe_list = [
+            serializer.encode(
+                rows[match['recipe_id']],
+                extra={'match': {k: v for k, v in match.items() if k != 'recipe_id'}}
+            )
+            for match in matches if match['recipe_id'] in rows
+        ]
+        
+        entry = response_cache.set(cache_key, encode_page(recipe_list))
+        return cached_json_response(entry)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error finding recipes by ingredients: {str(e)}")
+        return jsonify({'error': 'Failed to find recipes'}), 500
+    finally:
+        if db is not None:
+            db.close()
 
 @api_bp.route('/recipes', methods=['POST'])
 def create_recipe():
@@ -72,8 +423,14 @@ def create_recipe():
         )
         
         db.add(new_recipe)
+        db.flush()
+        index_recipe(db, new_recipe)
+        sync_recipe_ingredients(db, new_recipe)
+        record_new_recipes(db, [new_recipe])
         db.commit()
         db.refresh(new_recipe)
+        update_recipe_embeddings([new_recipe])
+        response_cache.invalidate_recipe()
         
         return jsonify({
             'message': 'Recipe created successfully',
@@ -86,38 +443,165 @@ def create_recipe():
     finally:
         db.close()
 
+@api_bp.route('/recipes/bulk', methods=['POST'])
+def import_recipes_bulk():
+    """Import many recipes from an NDJSON or JSON-array body, optionally gzipped"""
+    db = None
+    try:
+        content_type = request.mimetype
+        if content_type not in ('application/x-ndjson', 'application/json'):
+            return jsonify({'error': 'Content-Type must be application/x-ndjson or application/json'}), 415
+
+        chunks = iter_body_chunks(request.stream, gzipped=request.content_encoding == 'gzip')
+        rows = iter_ndjson(chunks) if content_type == 'application/x-ndjson' else iter_json_array(chunks)
+        batch_size = request.args.get('batch_size', current_app.config['BULK_IMPORT_BATCH_SIZE'], type=int)
+        if batch_size < 1:
+            raise ValueError('batch_size must be a positive integer')
+
+        db = get_db_session()
+        try:
+            report = import_recipes(db, rows, batch_size=batch_size)
+        finally:
+            # Batches committed before a failure are kept, so cached listings are stale either way
+            response_cache.invalidate_recipe()
+
+        return jsonify(report)
+
+    except BulkFormatError as e:
+        if db is not None:
+            db.rollback()
+        return jsonify({'error': str(e)}), 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error importing recipes: {str(e)}")
+        return jsonify({'error': 'Failed to import recipes'}), 500
+    finally:
+        if db is not None:
+            db.close()
+
+@api_bp.route('/recipes/bulk', methods=['GET'])
+def export_recipes_bulk():
+    """Export every public recipe as gzip-compressed NDJSON, streamed from a server-side cursor"""
+    serializer = listing_serializer(RECIPE_FIELDS + ['is_public'])
+
+    def lines():
+        db = get_db_session()
+        try:
+            query = build_recipe_listing_query(db, serializer).execution_options(
+                stream_results=True, yield_per=STREAM_BATCH_SIZE
+            )
+            for row in query:
+                yield serializer.encode(row)
+        except Exception as e:
+            logger.error(f"Error exporting recipes: {str(e)}")
+            yield STREAM_ERROR_LINE
+        finally:
+            db.close()
+
+    return Response(
+        stream_with_context(export_recipes_gzip(lines(), lambda line: line)),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': 'attachment; filename=recipes.ndjson.gz'}
+    )
+
 @api_bp.route('/recipes/<int:recipe_id>', methods=['GET'])
 def get_recipe(recipe_id):
-    """Get a specific recipe"""
+    """Get a specific recipe, served from the response cache when possible
+
+    ?servings=N rescales the ingredients from the cached recipe (and ?units=metric converts them).
+    """
+    db = None
     try:
+        servings = parse_servings(request.args['servings']) if 'servings' in request.args else None
+        metric = parse_units(request.args.get('units'))
+        
+        cache_key = response_cache.recipe_key(recipe_id)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            if servings is not None:
+                return scaled_recipe_response(entry, servings, metric)
+            return cached_json_response(entry)
+        
+        generation = response_cache.generation()
         db = get_db_session()
-        recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
+        serializer = RecipeSerializer(RECIPE_FIELDS)
+        recipe = db.query(*serializer.columns).filter(Recipe.id == recipe_id).first()
         
         if not recipe:
             return jsonify({'error': 'Recipe not found'}), 404
         
-        recipe_data = {
-            'id': recipe.id,
-            'title': recipe.title,
-            'description': recipe.description,
-            'ingredients': json.loads(recipe.ingredients) if recipe.ingredients else [],
-            'instructions': recipe.instructions,
-            'cooking_time': recipe.cooking_time,
-            'servings': recipe.servings,
-            'difficulty': recipe.difficulty,
-            'cuisine': recipe.cuisine,
-            'image_url': recipe.image_url,
-            'created_at': recipe.created_at.isoformat() if recipe.created_at else None,
-            'updated_at': recipe.updated_at.isoformat() if recipe.updated_at else None
-        }
-        
-        return jsonify(recipe_data)
+        # Validators come from updated_at, so any write yields a new ETag
+        modified = recipe.updated_at or recipe.created_at
+        modified_ts = calendar.timegm(modified.utctimetuple()) if modified else None
+        entry = response_cache.set(
+            cache_key,
+            serializer.encode(recipe),
+            etag=f'{recipe.id}-{modified.timestamp() if modified else 0}',
+            last_modified=modified_ts,
+            generation=generation
+        )
+        if servings is not None:
+            return scaled_recipe_response(entry, servings, metric)
+        return cached_json_response(entry)
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Error getting recipe {recipe_id}: {str(e)}")
         return jsonify({'error': 'Failed to get recipe'}), 500
     finally:
-        db.close()
+        if db is not None:
+            db.close()
+
+@api_bp.route('/recipes/<int:recipe_id>/similar', methods=['GET'])
+def get_similar_recipes(recipe_id):
+    """Public recipes most like this one by title, ingredients and cuisine, most similar first"""
+    db = None
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        limit = request.args.get('limit', 10, type=int)
+        if limit < 1:
+            raise ValueError('limit must be a positive integer')
+        limit = min(limit, current_app.config['RECIPES_MAX_PAGE_SIZE'])
+        
+        cache_key = response_cache.listing_key(f'similar:{recipe_id}', request.args)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return cached_json_response(entry)
+        
+        db = get_db_session()
+        recipe = (
+            db.query(Recipe.id, Recipe.title, Recipe.ingredients, Recipe.cuisine)
+            .filter(Recipe.id == recipe_id)
+            .first()
+        )
+        if not recipe:
+            return jsonify({'error': 'Recipe not found'}), 404
+        
+        matches = find_similar_recipes(recipe, limit)
+        serializer = RecipeSerializer(fields)
+        rows = {}
+        if matches:
+            ids = [match_id for match_id, _ in matches]
+            rows = {row.id: row for row in db.query(*serializer.columns).filter(Recipe.id.in_(ids))}
+        
+        recipe_list = [
+            serializer.encode(rows[match_id], extra={'similarity': round(score, 4)})
+            for match_id, score in matches if match_id in rows
+        ]
+        
+        entry = response_cache.set(cache_key, encode_page(recipe_list))
+        return cached_json_response(entry)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error finding recipes similar to {recipe_id}: {str(e)}")
+        return jsonify({'error': 'Failed to find similar recipes'}), 500
+    finally:
+        if db is not None:
+            db.close()
 
 @api_bp.route('/recipes/<int:recipe_id>', methods=['PUT'])
 def update_recipe(recipe_id):
@@ -129,6 +613,7 @@ def update_recipe(recipe_id):
         recipe = db.query(Recipe).filter(Recipe.id == recipe_id).first()
         if not recipe:
             return jsonify({'error': 'Recipe not found'}), 404
+        old_stat_keys = recipe_stat_keys(recipe)
         
         # Update fields
         if 'title' in data:
@@ -151,7 +636,13 @@ def update_recipe(recipe_id):
             recipe.image_url = data['image_url']
         
         recipe.updated_at = datetime.utcnow()
+        index_recipe(db, recipe)
+        if 'ingredients' in data:
+            sync_recipe_ingredients(db, recipe)
+        apply_stat_changes(db, removed=old_stat_keys, added=recipe_stat_keys(recipe))
         db.commit()
+        update_recipe_embeddings([recipe])
+        response_cache.invalidate_recipe(recipe_id)
         
         return jsonify({'message': 'Recipe updated successfully'})
     
@@ -171,8 +662,13 @@ def delete_recipe(recipe_id):
         if not recipe:
             return jsonify({'error': 'Recipe not found'}), 404
         
+        remove_recipe(db, recipe.id)
+        remove_recipe_ingredients(db, recipe.id)
+        apply_stat_changes(db, removed=recipe_stat_keys(recipe))
         db.delete(recipe)
         db.commit()
+        remove_recipe_embedding(recipe_id)
+        response_cache.invalidate_recipe(recipe_id)
         
         return jsonify({'message': 'Recipe deleted successfully'})
     
@@ -182,9 +678,29 @@ def delete_recipe(recipe_id):
     finally:
         db.close()
 
+def run_image_analysis_job(payload):
+    """Job handler: analyze an uploaded image, runs on a background worker"""
+    recipe_data = analyze_recipe_image(payload['image_path'], use_cache=payload.get('use_cache', True))
+    return {'recipe_data': recipe_data, 'image_url': payload['image_url']}
+
+def job_response(job):
+    """Public view of a background job"""
+    response = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'attempts': job['attempts'],
+        'status_url': f"/api/jobs/{job['id']}",
+    }
+    if job['status'] == jobs.DONE:
+        response.update(job['result'])
+    elif job['status'] == jobs.FAILED:
+        response['error'] = 'Failed to analyze image'
+    return response
+
 @api_bp.route('/upload-image', methods=['POST'])
+@rate_limited('upload-image', ai_call=False)  # analysis runs in the job queue, which has its own bound
 def upload_image():
-    """Upload and analyze recipe image"""
+    """Upload a recipe image and queue it for analysis, returns a job to poll"""
     try:
         if 'image' not in request.files:
             return jsonify({'error': 'No image file provided'}), 400
@@ -193,38 +709,143 @@ def upload_image():
         if file.filename == '':
             return jsonify({'error': 'No file selected'}), 400
         
-        if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            
+        # The upload was hashed and sniffed as it streamed in (uploads.UploadRequest)
+        if file and allowed_image(file.stream):
             # Create uploads directory if it doesn't exist
             upload_folder = current_app.config['UPLOAD_FOLDER']
             os.makedirs(upload_folder, exist_ok=True)
             
-            # Save file
+            # Downscale and re-encode from the spooled upload, stored under the hash of
+            # the uploaded bytes, so a repeated upload is neither decoded nor written again
+            try:
+                filename, _, content_hash = preprocess_image(
+                    file.stream,
+                    upload_folder,
+                    max_dimension=current_app.config['IMAGE_MAX_DIMENSION'],
+                    quality=current_app.config['IMAGE_QUALITY'],
+                    content_hash=file.stream.hexdigest()
+                )
+            except (UnidentifiedImageError, Image.DecompressionBombError):
+                return jsonify({'error': 'Invalid image file'}), 400
             filepath = os.path.join(upload_folder, filename)
-            file.save(filepath)
             
-            # Analyze image with OpenAI
             try:
-                recipe_data = analyze_recipe_image(filepath)
-                return jsonify({
-                    'message': 'Image analyzed successfully',
-                    'recipe_data': recipe_data,
-                    'image_url': f'/uploads/{filename}'
-                })
-            except Exception as e:
-                logger.error(f"Error analyzing image: {str(e)}")
-                return jsonify({'error': 'Failed to analyze image'}), 500
+                job, created = jobs.job_queue.submit(
+                    'analyze_image',
+                    {
+                        'image_path': filepath,
+                        'image_url': f'/uploads/{filename}',
+                        'use_cache': use_ai_cache()
+                    },
+                    dedup_key=content_hash if use_ai_cache() else None
+                )
+            except jobs.QueueFull:
+                response = jsonify({'error': 'Too many images waiting for analysis, please retry shortly'})
+                response.headers['Retry-After'] = '10'
+                return response, 503
+            
+            if created and jobs.worker_pool:
+                jobs.worker_pool.notify()
+            return jsonify(job_response(job)), 202
         else:
             return jsonify({'error': 'Invalid file type'}), 400
     
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'Image is too large'}), 413
     except Exception as e:
         logger.error(f"Error uploading image: {str(e)}")
         return jsonify({'error': 'Failed to upload image'}), 500
 
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll the status of a background job"""
+    try:
+        job = jobs.job_queue.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job_response(job))
+    
+    except Exception as e:
+        logger.error(f"Error getting job {job_id}: {str(e)}")
+        return jsonify({'error': 'Failed to get job'}), 500
+
+@api_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Subscribe to a background job as Server-Sent Events until it finishes"""
+    if not jobs.job_queue.get(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def events():
+        last_status = None
+        deadline = time.monotonic() + JOB_EVENTS_MAX_SECONDS
+        while True:
+            job = jobs.job_queue.get(job_id)
+            if job is None:
+                yield sse_event('error', {'error': 'Job not found', 'job_id': job_id})
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                yield sse_event('status', job_response(job))
+            if job['status'] in (jobs.DONE, jobs.FAILED):
+                return
+            if time.monotonic() >= deadline:
+                # Don't hold a worker thread for a job that may never finish
+                yield sse_event('error', {'error': 'Timed out waiting for the job', 'job_id': job_id})
+                return
+            time.sleep(JOB_EVENTS_POLL_INTERVAL)
+    
+    return sse_response(events())
+
+def stream_generated_recipe_events(ingredients, use_cache):
+    """SSE events for a streamed recipe generation: tokens, then the parsed recipe"""
+    started = time.perf_counter()
+    try:
+        for kind, payload in stream_recipe_from_ingredients(ingredients, use_cache=use_cache):
+            if kind == 'token':
+                yield sse_event('token', {'text': payload})
+            else:
+                yield sse_event('done', {
+                    'message': 'Recipe generated successfully',
+                    'recipe_data': payload,
+                    'source': 'model',
+                    'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+                })
+    except Exception as e:
+        logger.error(f"Error streaming generated recipe: {str(e)}")
+        yield sse_event('error', {'error': 'Failed to generate recipe'})
+
+# Fields of a stored recipe returned by /generate-recipe, in the shape the model returns
+GENERATED_RECIPE_FIELDS = [
+    'id', 'title', 'description', 'ingredients', 'instructions', 'cooking_time', 'servings', 'difficulty', 'cuisine'
+]
+
+def find_local_recipe(ingredients):
+    """A stored recipe covering the ingredients well enough to skip the model, as (recipe_data, match), or None"""
+    if not current_app.config['LOCAL_RECIPE_MATCH']:
+        return None
+    db = get_db_session()
+    try:
+        match = find_best_recipe_match(db, ingredients)
+        if match is None or match['score'] < current_app.config['LOCAL_RECIPE_MIN_SCORE']:
+            return None
+        row = (
+            db.query(*[getattr(Recipe, name) for name in GENERATED_RECIPE_FIELDS])
+            .filter(Recipe.id == match['recipe_id'])
+            .first()
+        )
+        if row is None:
+            return None
+        recipe_data = dict(zip(GENERATED_RECIPE_FIELDS, row))
+        recipe_data['ingredients'] = json.loads(row.ingredients or '[]')
+        return recipe_data, {k: v for k, v in match.items() if k != 'recipe_id'}
+    finally:
+        db.close()
+
 @api_bp.route('/generate-recipe', methods=['POST'])
+@rate_limited('generate-recipe')
 def generate_recipe():
-    """Generate recipe from ingredients"""
+    """Generate recipe from ingredients, answering from the stored recipes when one matches well"""
+    started = time.perf_counter()
     try:
         data = request.get_json()
         ingredients = data.get('ingredients', [])
@@ -232,12 +853,36 @@ def generate_recipe():
         if not ingredients:
             return jsonify({'error': 'No ingredients provided'}), 400
         
+        # Retrieval first: a strong match from our own recipes costs no tokens
+        try:
+            local = find_local_recipe(ingredients)
+        except Exception as e:
+            logger.error(f"Error matching stored recipes: {str(e)}")
+            local = None
+        if local is not None:
+            recipe_data, match = local
+            result = {
+                'message': 'Recipe found in your collection',
+                'recipe_data': recipe_data,
+                'source': 'local',
+                'match': match,
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+            }
+            if wants_stream():
+                return sse_response(iter([sse_event('done', result)]))
+            return jsonify(result)
+        
+        if wants_stream():
+            return sse_response(stream_generated_recipe_events(ingredients, use_ai_cache()))
+        
         # Generate recipe using OpenAI
         try:
-            recipe_data = generate_recipe_from_ingredients(ingredients)
+            recipe_data = generate_recipe_from_ingredients(ingredients, use_cache=use_ai_cache())
             return jsonify({
                 'message': 'Recipe generated successfully',
-                'recipe_data': recipe_data
+                'recipe_data': recipe_data,
+                'source': 'model',
+                'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
             })
         except Exception as e:
             logger.error(f"Error generating recipe: {str(e)}")
@@ -247,7 +892,20 @@ def generate_recipe():
         logger.error(f"Error in generate recipe endpoint: {str(e)}")
         return jsonify({'error': 'Failed to process request'}), 500
 
+def stream_ai_chef_events(prompt, use_cache):
+    """SSE events for a streamed AI Chef answer: markdown tokens, then the full answer"""
+    try:
+        parts = []
+        for delta in stream_ai_chef(prompt, use_cache=use_cache):
+            parts.append(delta)
+            yield sse_event('token', {'text': delta})
+        yield sse_event('done', {'markdown': ''.join(parts)})
+    except Exception:
+        logger.exception("Error streaming AI Chef answer")
+        yield sse_event('error', {'error': 'Failed to get an answer from AI Chef'})
+
 @api_bp.route('/ai-chef', methods=['POST'])
+@rate_limited('ai-chef')
 def ai_chef():
     """AI Chef free-form recipe assistant endpoint"""
     try:
@@ -259,29 +917,24 @@ def ai_chef():
         from openai_client import client
         if not client:
             return jsonify({'error': 'AI Chef is not available. Please set your OpenAI API key.'}), 500
-        system_message = (
-            "You are ChefGenius, a passionate and knowledgeable culinary expert with expertise in global cuisine! "
-            "Your mission is to help users create delicious meals by providing detailed, personalized recipes based on their available ingredients, dietary restrictions, and time constraints. "
-            "Combine deep culinary knowledge with nutritional wisdom to suggest recipes that are both practical and enjoyable. "
-            "Present your answers in clear markdown formatting, with structured lists, numbered steps, emoji for dietary tags, and extra tips as described in the instructions."
-        )
-        user_message = prompt
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=1200,
-        )
-        markdown = response.choices[0].message.content
+        if wants_stream():
+            return sse_response(stream_ai_chef_events(prompt, use_ai_cache()))
+        markdown = ask_ai_chef(prompt, use_cache=use_ai_cache())
         return jsonify({'markdown': markdown})
-    except Exception as e:
-        import traceback
-        print(traceback.format_exc())
-        return jsonify({'error': f'AI Chef error: {str(e)}'}), 500
+    except Exception:
+        logger.exception("Error in AI Chef endpoint")
+        return jsonify({'error': 'Failed to get an answer from AI Chef'}), 500
+
+@api_bp.route('/ai-cache/stats', methods=['GET'])
+def ai_cache_stats():
+    """Hit/miss metrics of the AI response cache"""
+    return jsonify(get_cache_stats())
 
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.utcnow().isoformat()}) 
\ No newline at end of file
+    return jsonify({
+        'status': 'healthy',
+        'timestamp': datetime.utcnow().isoformat(),
+        'db_pool': get_pool_stats()
+    }) 
\ No newline at end of file
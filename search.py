@@ -0,0 +1,152 @@
+from sqlalchemy import text, inspect
+import re
+import logging
+import database
+
+logger = logging.getLogger(__name__)
+
+# Which full-text backend init_search_index() managed to set up:
+# 'fts5' (SQLite), 'postgres' (tsvector + GIN) or None (LIKE fallback)
+backend = None
+
+# Column weights for ranking: title, description, instructions, ingredients
+FTS5_WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+# The GIN expression index and the search query must use the same expression
+PG_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(ingredients, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(instructions, '')), 'C')"
+)
+
+def init_search_index():
+    """Create the full-text index for the configured database and backfill it if new"""
+    global backend
+    engine = database.engine
+    dialect = engine.dialect.name
+    try:
+        if dialect == 'sqlite':
+            is_new = not inspect(engine).has_table('recipes_fts')
+            with engine.begin() as conn:
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5("
+                    "title, description, instructions, ingredients, "
+                    "tokenize='porter unicode61')"
+                ))
+            backend = 'fts5'
+            if is_new:
+                db = database.get_db_session()
+                try:
+                    rebuild_search_index(db)
+                    db.commit()
+                finally:
+                    db.close()
+        elif dialect == 'postgresql':
+            with engine.begin() as conn:
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_recipes_search ON recipes USING GIN (({PG_DOCUMENT}))"
+                ))
+            backend = 'postgres'
+        else:
+            backend = None
+    except Exception as e:
+        logger.warning(f"Full-text search unavailable, falling back to LIKE: {e}")
+        backend = None
+
+def rebuild_search_index(db):
+    """Re-index every recipe from scratch (SQLite only, Postgres maintains its own index)"""
+    if backend != 'fts5':
+        return
+    db.execute(text("DELETE FROM recipes_fts"))
+    # The ingredients JSON is indexed as-is; the tokenizer drops the quotes and brackets
+    db.execute(text(
+        "INSERT INTO recipes_fts (rowid, title, description, instructions, ingredients) "
+        "SELECT id, title, coalesce(description, ''), instructions, ingredients FROM recipes"
+    ))
+
+def index_recipe(db, recipe):
+    """Add or refresh a recipe in the search index, within the caller's transaction"""
+    index_recipes(db, [recipe])
+
+def index_recipes(db, recipes):
+    """Add or refresh many recipes in the search index with two executemany round-trips"""
+    if backend != 'fts5' or not recipes:
+        return
+    db.execute(text("DELETE FROM recipes_fts WHERE rowid = :id"), [{'id': r.id} for r in recipes])
+    db.execute(
+        text(
+            "INSERT INTO recipes_fts (rowid, title, description, instructions, ingredients) "
+            "VALUES (:id, :title, :description, :instructions, :ingredients)"
+        ),
+        [
+            {
+                'id': r.id,
+                'title': r.title,
+                'description': r.description or '',
+                'instructions': r.instructions,
+                'ingredients': r.ingredients,
+            }
+            for r in recipes
+        ]
+    )
+
+def remove_recipe(db, recipe_id):
+    """Drop a recipe from the search index, within the caller's transaction"""
+    if backend != 'fts5':
+        return
+    db.execute(text("DELETE FROM recipes_fts WHERE rowid = :id"), {'id': recipe_id})
+
+def tokenize_query(query):
+    """Split a free-text query into lower-cased word tokens"""
+    return re.findall(r'\w+', query.lower())
+
+def search_recipe_ids(db, query, limit=20, offset=0):
+    """Return ids of public recipes matching query, best match first"""
+    tokens = tokenize_query(query)
+    if not tokens:
+        return []
+
+    if backend == 'fts5':
+        # Quote every token so user input can't inject FTS5 syntax; the last one is a prefix
+        match = ' '.join(f'"{t}"' for t in tokens[:-1]) + f' "{tokens[-1]}"*'
+        rows = db.execute(
+            text(
+                f"SELECT recipes.id FROM recipes_fts "
+                f"JOIN recipes ON recipes.id = recipes_fts.rowid "
+                f"WHERE recipes_fts MATCH :match AND recipes.is_public = 1 "
+                f"ORDER BY bm25(recipes_fts, {', '.join(map(str, FTS5_WEIGHTS))}) "
+                f"LIMIT :limit OFFSET :offset"
+            ),
+            {'match': match.strip(), 'limit': limit, 'offset': offset}
+        )
+    elif backend == 'postgres':
+        tsquery = ' & '.join(tokens[:-1] + [f'{tokens[-1]}:*'])
+        rows = db.execute(
+            text(
+                f"SELECT id FROM recipes "
+                f"WHERE ({PG_DOCUMENT}) @@ to_tsquery('english', :tsquery) AND is_public "
+                f"ORDER BY ts_rank_cd(({PG_DOCUMENT}), to_tsquery('english', :tsquery)) DESC, id DESC "
+                f"LIMIT :limit OFFSET :offset"
+            ),
+            {'tsquery': tsquery, 'limit': limit, 'offset': offset}
+        )
+    else:
+        # No full-text support: every token must appear somewhere in the recipe
+        conditions = []
+        params = {'limit': limit, 'offset': offset}
+        for i, token in enumerate(tokens):
+            params[f't{i}'] = f'%{token}%'
+            conditions.append(
+                f"(lower(title) LIKE :t{i} OR lower(coalesce(description, '')) LIKE :t{i} "
+                f"OR lower(instructions) LIKE :t{i} OR lower(ingredients) LIKE :t{i})"
+            )
+        rows = db.execute(
+            text(
+                f"SELECT id FROM recipes WHERE is_public = :public AND {' AND '.join(conditions)} "
+                f"ORDER BY id DESC LIMIT :limit OFFSET :offset"
+            ),
+            {**params, 'public': True}
+        )
+
+    return [row[0] for row in rows]
@@ -0,0 +1,61 @@
+from datetime import date, datetime
+import json
+from database import Recipe
+
+try:
+    import orjson  # optional, several times faster than the json module
+except ImportError:
+    orjson = None
+
+# Columns that can be requested through the `fields=` projection
+RECIPE_FIELDS = [
+    'id', 'title', 'description', 'ingredients', 'instructions', 'cooking_time',
+    'servings', 'difficulty', 'cuisine', 'image_url', 'created_at', 'updated_at'
+]
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps(data):
+    """Encode data as compact JSON text, with orjson when it is installed"""
+    if orjson is not None:
+        # orjson writes naive datetimes exactly like isoformat()
+        return orjson.dumps(data).decode('utf-8')
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=_default)
+
+class RecipeSerializer:
+    """Encodes column-projected recipe rows straight to JSON text
+
+    The ingredients column already holds a JSON array (every writer stores it
+    with json.dumps), so it is spliced into the output as-is rather than being
+    decoded and re-encoded for every row.
+    """
+
+    def __init__(self, fields, required=('id',)):
+        self.fields = fields
+        # Columns to select: the required ones (for cursors, lookups, ...) plus the requested fields
+        self.names = list(dict.fromkeys(list(required) + list(fields)))
+        self.columns = [getattr(Recipe, name) for name in self.names]
+        self._scalars = [(f, self.names.index(f)) for f in fields if f != 'ingredients']
+        self._ingredients = self.names.index('ingredients') if 'ingredients' in fields else None
+
+    def encode(self, row, extra=None):
+        """JSON object text for one row tuple, with extra keys merged in"""
+        data = {name: row[index] for name, index in self._scalars}
+        if extra:
+            data.update(extra)
+        encoded = dumps(data)
+        if self._ingredients is None:
+            return encoded
+        separator = ',' if len(encoded) > 2 else ''
+        return f'{encoded[:-1]}{separator}"ingredients":{row[self._ingredients] or "[]"}}}'
+
+def encode_page(items, **meta):
+    """JSON body with a 'recipes' array of already-encoded rows, plus metadata keys"""
+    parts = ['{"recipes":[', ','.join(items), ']']
+    for key, value in meta.items():
+        parts.append(f',{dumps(key)}:{dumps(value)}')
+    parts.append('}')
+    return ''.join(parts)
@@ -1,6 +1,14 @@
 // Global variables
 let currentIngredients = [];
 let selectedFile = null;
+let recipesCursor = null;
+let searchTimer = null;
+
+// Only the columns the recipe cards need
+const RECIPE_CARD_FIELDS = 'id,title,description,cooking_time,servings,difficulty,image_url';
+
+// Cards show a thumbnail instead of the full-size upload (see THUMBNAIL_WIDTHS)
+const CARD_THUMBNAIL_WIDTH = 320;
 
 // DOM elements
 const navButtons = document.querySelectorAll('.nav-btn');
@@ -21,6 +29,7 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeNavigation();
     initializeUploadArea();
     initializeIngredientInput();
+    initializeRecipeSearch();
     loadRecipes();
 });
 
@@ -114,12 +123,19 @@ async function analyzeImage() {
             body: formData
         });
         
-        const result = await response.json();
+        const job = await response.json();
         
-        if (response.ok) {
+        if (!response.ok) {
+            alert('Error: ' + job.error);
+            return;
+        }
+        
+        // Analysis runs in the background; poll the job until it finishes
+        const result = await waitForJob(job);
+        if (result.status === 'done') {
             displayUploadResult(result.recipe_data);
         } else {
-            alert('Error: ' + result.error);
+            alert('Error: ' + (result.error || 'Failed to analyze image'));
         }
     } catch (error) {
         console.error('Error analyzing image:', error);
@@ -129,6 +145,18 @@ async function analyzeImage() {
     }
 }
 
+async function waitForJob(job, intervalMs = 1000) {
+    while (job.status === 'queued' || job.status === 'running') {
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+        const response = await fetch(job.status_url);
+        job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error);
+        }
+    }
+    return job;
+}
+
 function displayUploadResult(recipeData) {
     uploadResult.innerHTML = `
         <h3>Recipe Analysis Result</h3>
@@ -203,31 +231,23 @@ async function generateRecipe() {
         return;
     }
     
-    showLoading();
+    generateBtn.disabled = true;
+    generatedRecipe.innerHTML = '<h3>Generating Recipe...</h3><pre class="streaming-output"></pre>';
+    generatedRecipe.style.display = 'block';
+    const output = generatedRecipe.querySelector('.streaming-output');
     
     try {
-        const response = await fetch('/api/generate-recipe', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({
-                ingredients: currentIngredients
-            })
+        await streamEvents('/api/generate-recipe', { ingredients: currentIngredients }, {
+            token: (data) => { output.textContent += data.text; },
+            done: (data) => displayGeneratedRecipe(data.recipe_data),
+            error: (data) => { throw new Error(data.error); }
         });
-        
-        const result = await response.json();
-        
-        if (response.ok) {
-            displayGeneratedRecipe(result.recipe_data);
-        } else {
-            alert('Error: ' + result.error);
-        }
     } catch (error) {
         console.error('Error generating recipe:', error);
+        generatedRecipe.style.display = 'none';
         alert('Error generating recipe. Please try again.');
     } finally {
-        hideLoading();
+        updateGenerateButton();
     }
 }
 
@@ -261,13 +281,18 @@ function displayGeneratedRecipe(recipeData) {
 }
 
 // Recipe management
-async function loadRecipes() {
+async function loadRecipes(append = false) {
     try {
-        const response = await fetch('/api/recipes');
+        const params = new URLSearchParams({ fields: RECIPE_CARD_FIELDS });
+        if (append && recipesCursor) {
+            params.set('cursor', recipesCursor);
+        }
+        const response = await fetch(`/api/recipes?${params}`);
         const data = await response.json();
         
         if (response.ok) {
-            displayRecipes(data.recipes);
+            recipesCursor = data.next_cursor;
+            displayRecipes(data.recipes, append);
         } else {
             console.error('Error loading recipes:', data.error);
         }
@@ -276,10 +301,51 @@ async function loadRecipes() {
     }
 }
 
-function displayRecipes(recipes) {
+function loadMoreRecipes() {
+    loadRecipes(true);
+}
+
+// Recipe search
+function initializeRecipeSearch() {
+    const searchInput = document.getElementById('recipeSearchInput');
+    searchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(() => searchRecipes(searchInput.value.trim()), 250);
+    });
+}
+
+async function searchRecipes(query) {
+    if (!query) {
+        loadRecipes();
+        return;
+    }
+    
+    try {
+        const params = new URLSearchParams({ q: query, fields: RECIPE_CARD_FIELDS });
+        const response = await fetch(`/api/recipes/search?${params}`);
+        const data = await response.json();
+        
+        if (response.ok) {
+            recipesCursor = null;
+            displayRecipes(data.recipes);
+        } else {
+            console.error('Error searching recipes:', data.error);
+        }
+    } catch (error) {
+        console.error('Error searching recipes:', error);
+    }
+}
+
+function thumbnailUrl(imageUrl) {
+    return imageUrl.startsWith('/uploads/') ? `${imageUrl}?w=${CARD_THUMBNAIL_WIDTH}` : imageUrl;
+}
+
+function displayRecipes(recipes, append = false) {
     const recipesGrid = document.getElementById('recipes-grid');
+    const loadMoreBtn = document.getElementById('loadMoreRecipesBtn');
+    loadMoreBtn.style.display = recipesCursor ? 'inline-block' : 'none';
     
-    if (recipes.length === 0) {
+    if (recipes.length === 0 && !append) {
         recipesGrid.innerHTML = `
             <div style="grid-column: 1 / -1; text-align: center; padding: 40px; color: #666;">
                 <i class="fas fa-book-open" style="font-size: 3rem; margin-bottom: 20px; color: #ddd;"></i>
@@ -290,8 +356,9 @@ function displayRecipes(recipes) {
         return;
     }
     
-    recipesGrid.innerHTML = recipes.map(recipe => `
+    const cards = recipes.map(recipe => `
         <div class="recipe-card" onclick="showRecipeDetail(${recipe.id})">
+            ${recipe.image_url ? `<img class="recipe-card-image" src="${thumbnailUrl(recipe.image_url)}" alt="" loading="lazy">` : ''}
             <h3>${recipe.title}</h3>
             <p>${recipe.description || 'No description'}</p>
             <div class="recipe-meta">
@@ -301,6 +368,12 @@ function displayRecipes(recipes) {
             </div>
         </div>
     `).join('');
+    
+    if (append) {
+        recipesGrid.insertAdjacentHTML('beforeend', cards);
+    } else {
+        recipesGrid.innerHTML = cards;
+    }
 }
 
 async function showRecipeDetail(recipeId) {
@@ -466,25 +539,70 @@ async function askAIChef() {
         responseDiv.innerHTML = '<span style="color:#888">Please enter a question or prompt for the AI Chef.</span>';
         return;
     }
-    showLoading();
     responseDiv.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Thinking...';
+    let markdown = '';
     try {
-        // Call backend endpoint (to be implemented)
-        const response = await fetch('/api/ai-chef', {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ prompt: input })
+        // Tokens are rendered as they arrive instead of after the whole answer
+        await streamEvents('/api/ai-chef', { prompt: input }, {
+            token: (data) => {
+                markdown += data.text;
+                responseDiv.innerHTML = renderMarkdown(markdown);
+            },
+            done: (data) => { responseDiv.innerHTML = renderMarkdown(data.markdown); },
+            error: (data) => {
+                responseDiv.innerHTML = '<span style="color:#c00">' + (data.error || 'AI Chef could not answer. Please try again.') + '</span>';
+            }
         });
-        const result = await response.json();
-        if (response.ok && result && result.markdown) {
-            responseDiv.innerHTML = renderMarkdown(result.markdown);
-        } else {
-            responseDiv.innerHTML = '<span style="color:#c00">' + (result.error || 'AI Chef could not answer. Please try again.') + '</span>';
-        }
     } catch (err) {
         responseDiv.innerHTML = '<span style="color:#c00">Error contacting AI Chef. Please try again.</span>';
-    } finally {
-        hideLoading();
+    }
+}
+
+// POST a JSON body and dispatch the Server-Sent Events of the response to handlers[event]
+async function streamEvents(url, body, handlers) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+        body: JSON.stringify(body)
+    });
+    
+    if (!response.ok) {
+        const result = await response.json().catch(() => ({}));
+        if (handlers.error) {
+            handlers.error(result);
+        }
+        return;
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) {
+                    event = line.slice(7);
+                } else if (line.startsWith('data: ')) {
+                    data += line.slice(6);
+                }
+            });
+            if (handlers[event]) {
+                handlers[event](data ? JSON.parse(data) : {});
+            }
+        }
     }
 }
 
@@ -0,0 +1,151 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from collections import Counter
+from datetime import datetime
+import json
+import logging
+import database
+from database import Recipe, RecipeStat
+from ingredients import canonical_ingredient_names
+
+logger = logging.getLogger(__name__)
+
+# Recipes read per query when rebuilding
+REBUILD_BATCH_SIZE = 5000
+
+# Cooking-time histogram: (upper bound in minutes, label); longer recipes fall in the last bucket
+COOKING_TIME_BUCKETS = ((15, '0-15'), (30, '15-30'), (60, '30-60'), (120, '60-120'))
+COOKING_TIME_OVER = '120+'
+UNKNOWN = ''
+
+def cooking_time_bucket(minutes):
+    # Recipes created through the API may carry cooking_time as text ("30") or junk
+    try:
+        minutes = int(minutes)
+    except (TypeError, ValueError):
+        return UNKNOWN
+    for bound, label in COOKING_TIME_BUCKETS:
+        if minutes < bound:
+            return label
+    return COOKING_TIME_OVER
+
+def recipe_stat_keys(recipe):
+    """(dimension, key) pairs a recipe is counted under; private recipes count towards nothing"""
+    if getattr(recipe, 'is_public', True) is False:
+        return []
+    try:
+        ingredients = json.loads(recipe.ingredients) if recipe.ingredients else []
+    except ValueError:
+        ingredients = []
+    created_at = getattr(recipe, 'created_at', None) or datetime.utcnow()
+    keys = [
+        ('total', ''),
+        ('cuisine', (recipe.cuisine or UNKNOWN)[:255]),
+        ('difficulty', (recipe.difficulty or UNKNOWN)[:255]),
+        ('cooking_time', cooking_time_bucket(recipe.cooking_time)),
+        ('created_month', created_at.strftime('%Y-%m')),
+    ]
+    names = canonical_ingredient_names(ingredients if isinstance(ingredients, list) else [])
+    keys.extend(('ingredient', name[:255]) for name in names)
+    return keys
+
+def apply_stat_changes(db, removed=(), added=()):
+    """Move the counts from one set of stat keys to another, within the caller's transaction
+
+    Each count changes with a single upsert, so concurrent writers never lose an increment.
+    """
+    delta = Counter(added)
+    delta.subtract(Counter(removed))
+    rows = [
+        {'dimension': dimension, 'key': key, 'count': change}
+        for (dimension, key), change in delta.items() if change
+    ]
+    if not rows:
+        return
+    insert = postgresql.insert if db.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(RecipeStat)
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[RecipeStat.dimension, RecipeStat.key],
+            set_={'count': RecipeStat.count + statement.excluded.count}
+        ),
+        rows
+    )
+    shrunk = {row['dimension'] for row in rows if row['count'] < 0}
+    if shrunk:
+        # Keys nothing is counted under any more (a renamed cuisine, a dropped ingredient)
+        db.query(RecipeStat).filter(
+            RecipeStat.dimension.in_(shrunk), RecipeStat.count <= 0
+        ).delete(synchronize_session=False)
+
+def record_new_recipes(db, recipes):
+    """Count newly inserted recipes, within the caller's transaction"""
+    apply_stat_changes(db, added=[key for recipe in recipes for key in recipe_stat_keys(recipe)])
+
+def rebuild_recipe_stats(db):
+    """Recount every public recipe into the summary table, returns recipes counted"""
+    counts = Counter()
+    count = 0
+    last_id = 0
+    while True:
+        # Keyset batches keep memory flat on large catalogs
+        batch = (
+            db.query(
+                Recipe.id, Recipe.ingredients, Recipe.cuisine, Recipe.difficulty,
+                Recipe.cooking_time, Recipe.created_at, Recipe.is_public
+            )
+            .filter(Recipe.id > last_id)
+            .order_by(Recipe.id)
+            .limit(REBUILD_BATCH_SIZE)
+            .all()
+        )
+        if not batch:
+            break
+        for recipe in batch:
+            counts.update(recipe_stat_keys(recipe))
+            count += recipe.is_public is not False
+        last_id = batch[-1].id
+    db.query(RecipeStat).delete(synchronize_session=False)
+    db.bulk_insert_mappings(RecipeStat, [
+        {'dimension': dimension, 'key': key, 'count': n} for (dimension, key), n in counts.items()
+    ])
+    db.commit()
+    return count
+
+def init_recipe_stats():
+    """Fill the summary table the first time it is empty"""
+    db = database.get_db_session()
+    try:
+        has_stats = db.query(RecipeStat.dimension).first() is not None
+        has_recipes = db.query(Recipe.id).first() is not None
+        if has_recipes and not has_stats:
+            count = rebuild_recipe_stats(db)
+            logger.info(f"Computed statistics for {count} recipes")
+    finally:
+        db.close()
+
+def _counts(rows):
+    return [{'value': key if key != UNKNOWN else None, 'count': count} for key, count in rows]
+
+def recipe_stats(db, top_ingredients=20):
+    """Dashboard aggregates over public recipes, read from the summary table"""
+    def dimension(name):
+        return db.query(RecipeStat.key, RecipeStat.count).filter(RecipeStat.dimension == name)
+
+    by_count = (RecipeStat.count.desc(), RecipeStat.key)
+    # Buckets in time order, recipes without a cooking time last
+    time_order = [label for _, label in COOKING_TIME_BUCKETS] + [COOKING_TIME_OVER, UNKNOWN]
+    cooking_time = sorted(dimension('cooking_time'), key=lambda row: time_order.index(row.key))
+    total = dimension('total').first()
+    return {
+        'total_recipes': total.count if total else 0,
+        'cuisine': _counts(dimension('cuisine').order_by(*by_count)),
+        'difficulty': _counts(dimension('difficulty').order_by(*by_count)),
+        'cooking_time': _counts(cooking_time),
+        'top_ingredients': [
+            {'ingredient': key, 'count': count}
+            for key, count in dimension('ingredient').order_by(*by_count).limit(top_ingredients)
+        ],
+        'created_per_month': [
+            {'month': key, 'count': count} for key, count in dimension('created_month').order_by(RecipeStat.key)
+        ],
+    }
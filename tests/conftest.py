@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+
+# Config is read at import time, so the environment has to be in place before the app is imported
+WORKDIR = tempfile.mkdtemp(prefix='ez-cooking-tests-')
+os.chdir(WORKDIR)  # jobs.db, uploads/, embeddings and sessions land here
+os.environ.update({
+    'DATABASE_URL': f'sqlite:///{WORKDIR}/ez_cooking.db',
+    'OPENAI_API_KEY': '',
+    'AI_CACHE_BACKEND': 'none',
+    'RESPONSE_CACHE_BACKEND': 'memory',
+    'RATE_LIMIT_ENABLED': 'false',
+    'JOB_WORKERS': '0',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import database
+from app import create_app
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app(start_job_workers=False)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def db(app):
+    # Its own session, so request teardown in the test client doesn't close it
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def create_recipe(client):
+    """POST a recipe (title, ingredients and instructions filled in) and return its id"""
+    def create(**fields):
+        data = {'title': 'Test recipe', 'ingredients': ['1 egg'], 'instructions': 'Cook it.', **fields}
+        response = client.post('/api/recipes', json=data)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['recipe_id']
+    return create
@@ -0,0 +1,43 @@
+import gzip
+import json
+import routes
+
+def fail_after_one_row(monkeypatch):
+    """Make listing serializers raise on the second row they encode"""
+    listing_serializer = routes.listing_serializer
+
+    def failing_serializer(*args, **kwargs):
+        serializer = listing_serializer(*args, **kwargs)
+        encode, encoded = serializer.encode, []
+
+        def encode_once(row, *rest):
+            if encoded:
+                raise RuntimeError('connection lost')
+            encoded.append(row)
+            return encode(row, *rest)
+        serializer.encode = encode_once
+        return serializer
+    monkeypatch.setattr(routes, 'listing_serializer', failing_serializer)
+
+def test_ndjson_stream_ends_with_an_error_line_when_it_fails(client, create_recipe, monkeypatch):
+    create_recipe()
+    create_recipe()
+    fail_after_one_row(monkeypatch)
+    lines = client.get('/api/recipes?format=ndjson').get_data(as_text=True).splitlines()
+    assert len(lines) == 2
+    assert 'error' not in json.loads(lines[0])
+    assert 'error' in json.loads(lines[-1])
+
+def test_bulk_export_ends_with_an_error_line_when_it_fails(client, create_recipe, monkeypatch):
+    create_recipe()
+    create_recipe()
+    fail_after_one_row(monkeypatch)
+    lines = gzip.decompress(client.get('/api/recipes/bulk').data).decode('utf-8').splitlines()
+    assert len(lines) == 2
+    assert 'error' not in json.loads(lines[0])
+    assert 'error' in json.loads(lines[-1])
+
+def test_complete_ndjson_stream_has_no_error_line(client, create_recipe):
+    create_recipe()
+    lines = client.get('/api/recipes?format=ndjson').get_data(as_text=True).splitlines()
+    assert lines and all('error' not in json.loads(line) for line in lines)
@@ -0,0 +1,29 @@
+import json
+from database import Recipe
+from ingredients import backfill_recipe_ingredients
+from response_cache import response_cache
+
+def test_bulk_import_keeps_row_timestamps(client, db):
+    row = {
+        'title': 'Round trip stew', 'ingredients': ['2 carrots', '1 onion'], 'instructions': 'Simmer.',
+        'created_at': '2020-01-01T00:00:00', 'updated_at': '2020-06-01T00:00:00',
+    }
+    response = client.post('/api/recipes/bulk', data=json.dumps(row), content_type='application/x-ndjson')
+    assert response.get_json()['imported'] == 1
+
+    recipe_id = db.query(Recipe.id).filter(Recipe.title == 'Round trip stew').scalar()
+    recipe = client.get(f'/api/recipes/{recipe_id}').get_json()
+    assert recipe['created_at'] == '2020-01-01T00:00:00'
+    assert recipe['updated_at'] == '2020-06-01T00:00:00'
+
+def test_backfill_keeps_updated_at_and_etag(client, db, create_recipe):
+    recipe_id = create_recipe(ingredients=['2 tomatoes', 'salt'])
+    before = client.get(f'/api/recipes/{recipe_id}')
+
+    backfill_recipe_ingredients(db)
+    response_cache.invalidate_recipe(recipe_id)
+    after = client.get(f'/api/recipes/{recipe_id}')
+
+    assert after.get_json()['updated_at'] == before.get_json()['updated_at']
+    assert after.headers['ETag'] == before.headers['ETag']
+    assert db.query(Recipe.ingredient_count).filter(Recipe.id == recipe_id).scalar() == 2
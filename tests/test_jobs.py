@@ -0,0 +1,29 @@
+import jobs
+import routes
+
+def _events(response):
+    return [block.split('\n')[0] for block in response.get_data(as_text=True).strip().split('\n\n')]
+
+def test_job_events_end_when_the_job_disappears(client, monkeypatch):
+    job, _ = jobs.job_queue.submit('analyze_image', {'path': 'missing.jpg'})
+    real_get = jobs.job_queue.get
+    calls = []
+
+    def get(job_id):
+        calls.append(job_id)
+        # Found by the route's existence check and the first poll, pruned afterwards
+        return real_get(job_id) if len(calls) <= 2 else None
+
+    monkeypatch.setattr(jobs.job_queue, 'get', get)
+    monkeypatch.setattr(routes, 'JOB_EVENTS_POLL_INTERVAL', 0.01)
+    response = client.get(f"/api/jobs/{job['id']}/events")
+    assert _events(response) == ['event: status', 'event: error']
+    assert 'Job not found' in response.get_data(as_text=True)
+
+def test_job_events_stop_after_the_time_limit(client, monkeypatch):
+    job, _ = jobs.job_queue.submit('analyze_image', {'path': 'never-runs.jpg'})
+    monkeypatch.setattr(routes, 'JOB_EVENTS_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(routes, 'JOB_EVENTS_MAX_SECONDS', 0.05)
+    response = client.get(f"/api/jobs/{job['id']}/events")
+    assert _events(response) == ['event: status', 'event: error']
+    assert 'Timed out' in response.get_data(as_text=True)
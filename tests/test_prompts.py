@@ -0,0 +1,18 @@
+import json
+import pytest
+from prompts import parse_recipe_reply
+
+FALLBACK = {
+    'title': 'Recipe', 'description': '', 'ingredients': ['1 egg'], 'instructions': '',
+    'cooking_time': 30, 'servings': 4, 'difficulty': 'Medium', 'cuisine': 'International',
+}
+
+@pytest.mark.parametrize('ingredients', [5, None, {'egg': 1}])
+def test_unusable_ingredients_fall_back(ingredients):
+    recipe, parsed = parse_recipe_reply(json.dumps({'title': 'Eggs', 'ingredients': ingredients}), FALLBACK)
+    assert parsed
+    assert recipe['ingredients'] == ['1 egg']
+
+def test_ingredients_text_is_split_into_lines():
+    recipe, _ = parse_recipe_reply(json.dumps({'ingredients': '2 eggs\n\n1 cup milk'}), FALLBACK)
+    assert recipe['ingredients'] == ['2 eggs', '1 cup milk']
@@ -0,0 +1,32 @@
+import os
+import subprocess
+import sys
+import pytest
+from sqlalchemy.orm import sessionmaker
+from database import build_engine
+from listing import hot_listing_queries, explain_query
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope='module')
+def migrated_db(tmp_path_factory):
+    """A session on a fresh SQLite database built by `alembic upgrade head`"""
+    url = f"sqlite:///{tmp_path_factory.mktemp('migrated')}/ez_cooking.db"
+    subprocess.run(
+        [sys.executable, '-m', 'alembic', 'upgrade', 'head'],
+        cwd=REPO, env={**os.environ, 'DATABASE_URL': url}, check=True, capture_output=True
+    )
+    engine = build_engine(url)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+def test_hot_listing_queries_are_served_by_an_index(migrated_db):
+    # The same checks as `flask check-query-plans`
+    failing = {}
+    for name, query in hot_listing_queries(migrated_db):
+        plan, uses_index = explain_query(migrated_db, query)
+        if not uses_index:
+            failing[name] = plan
+    assert not failing
@@ -0,0 +1,39 @@
+import routes
+from ai_cache import MemoryCache
+from response_cache import ResponseCache, response_cache
+from serializers import RecipeSerializer
+
+def test_set_drops_a_body_read_before_an_invalidation():
+    cache = ResponseCache(MemoryCache())
+    key = cache.recipe_key(1)
+    generation = cache.generation()
+    cache.invalidate_recipe(1)  # a write lands between the read and the set
+    cache.set(key, '{"title": "old"}', generation=generation)
+    assert cache.get(key) is None
+
+    cache.set(key, '{"title": "new"}', generation=cache.generation())
+    assert cache.get(key)['body'] == '{"title": "new"}'
+
+def test_generation_is_never_reused_after_the_key_expires():
+    cache = ResponseCache(MemoryCache())
+    before = cache.generation()
+    cache.store.delete('listing-generation')  # expired or evicted
+    assert cache.generation() != before
+
+def test_get_recipe_racing_a_write_is_not_cached(client, create_recipe, monkeypatch):
+    recipe_id = create_recipe()
+    response_cache.invalidate_recipe(recipe_id)
+
+    class RacingSerializer(RecipeSerializer):
+        def encode(self, row, extra=None):
+            # The row has been read; an update commits and invalidates before the response is cached
+            response_cache.invalidate_recipe(recipe_id)
+            return super().encode(row, extra)
+
+    monkeypatch.setattr(routes, 'RecipeSerializer', RacingSerializer)
+    assert client.get(f'/api/recipes/{recipe_id}').status_code == 200
+    assert response_cache.get(response_cache.recipe_key(recipe_id)) is None
+
+    monkeypatch.undo()
+    client.get(f'/api/recipes/{recipe_id}')
+    assert response_cache.get(response_cache.recipe_key(recipe_id)) is not None
@@ -0,0 +1,29 @@
+import os
+import runpy
+import pytest
+from config import Config
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'gunicorn.conf.py')
+
+@pytest.fixture
+def several_workers(monkeypatch):
+    monkeypatch.setattr(Config, 'SERVER_WORKERS', 3)
+    monkeypatch.setattr(Config, 'RESPONSE_CACHE_BACKEND', Config.RESPONSE_CACHE_BACKEND)
+    monkeypatch.delenv('RESPONSE_CACHE_BACKEND', raising=False)
+    return monkeypatch
+
+def test_several_workers_share_the_response_cache(several_workers):
+    runpy.run_path(CONF)
+    assert os.environ['RESPONSE_CACHE_BACKEND'] == 'sqlite'
+    assert Config.RESPONSE_CACHE_BACKEND == 'sqlite'
+
+def test_several_workers_refuse_a_memory_response_cache(several_workers):
+    several_workers.setenv('RESPONSE_CACHE_BACKEND', 'memory')
+    several_workers.setattr(Config, 'RESPONSE_CACHE_BACKEND', 'memory')
+    with pytest.raises(RuntimeError):
+        runpy.run_path(CONF)
+
+def test_one_worker_keeps_the_memory_cache(several_workers):
+    several_workers.setattr(Config, 'SERVER_WORKERS', 1)
+    runpy.run_path(CONF)
+    assert 'RESPONSE_CACHE_BACKEND' not in os.environ
@@ -0,0 +1,17 @@
+import pytest
+from stats import cooking_time_bucket, rebuild_recipe_stats
+
+@pytest.mark.parametrize('minutes, bucket', [
+    (None, ''), ('abc', ''), (10, '0-15'), ('30', '30-60'), (45.5, '30-60'), (500, '120+'),
+])
+def test_cooking_time_bucket(minutes, bucket):
+    assert cooking_time_bucket(minutes) == bucket
+
+def test_text_cooking_time_is_counted(client, db, create_recipe):
+    recipe_id = create_recipe(cooking_time='30')
+    assert client.put(f'/api/recipes/{recipe_id}', json={'cooking_time': 'soon'}).status_code == 200
+    assert client.put(f'/api/recipes/{recipe_id}', json={'cooking_time': '20'}).status_code == 200
+    rebuild_recipe_stats(db)
+
+    stats = client.get('/api/stats').get_json()
+    assert any(row['value'] == '15-30' and row['count'] >= 1 for row in stats['cooking_time'])
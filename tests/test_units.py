@@ -0,0 +1,40 @@
+import pytest
+from units import parse_ingredient, scale_ingredients
+
+def test_parse_ingredient():
+    parsed = parse_ingredient('1 1/2 cups plain flour')
+    assert (parsed.quantity, parsed.unit, parsed.item) == (1.5, 'cup', 'plain flour')
+    assert parse_ingredient('salt to taste').quantity is None
+
+def test_scale_ingredients():
+    lines = scale_ingredients('["200g pasta", "2-3 cloves garlic", "salt to taste"]', 2)
+    assert [line['text'] for line in lines] == ['400 g pasta', '4-6 cloves garlic', 'salt to taste']
+
+def test_text_ingredients_are_not_scaled_per_character():
+    assert scale_ingredients('"2 eggs"', 2) == []
+
+def test_scaled_recipe(client, create_recipe):
+    recipe_id = create_recipe(ingredients=['200g pasta', '3 eggs'], servings=2)
+    recipe = client.get(f'/api/recipes/{recipe_id}?servings=4').get_json()
+    assert recipe['servings'] == 4
+    assert recipe['original_servings'] == 2
+    assert recipe['ingredients'] == ['400 g pasta', '6 eggs']
+
+def test_string_ingredients_are_rejected(client, create_recipe):
+    recipe_id = create_recipe(ingredients='2 eggs', servings=2)
+    response = client.get(f'/api/recipes/{recipe_id}?servings=4')
+    assert response.status_code == 400
+    assert 'ingredient list' in response.get_json()['error']
+
+@pytest.mark.parametrize('servings', [0, 'abc', None])
+def test_unusable_stored_servings_are_rejected(client, create_recipe, servings):
+    recipe_id = create_recipe(servings=servings)
+    response = client.get(f'/api/recipes/{recipe_id}?servings=4')
+    assert response.status_code == 400
+    assert 'no servings' in response.get_json()['error']
+    response = client.post('/api/shopping-list', json={'recipes': [{'id': recipe_id, 'servings': 4}]})
+    assert response.status_code == 400
+
+@pytest.mark.parametrize('recipes', [[True], [{'id': False}], [{'id': 1, 'servings': True}]])
+def test_shopping_list_rejects_booleans(client, recipes):
+    assert client.post('/api/shopping-list', json={'recipes': recipes}).status_code == 400
@@ -0,0 +1,272 @@
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+import json
+import re
+from ingredients import canonicalize_ingredient
+
+# Canonical unit -> (dimension, size in the dimension's base unit: grams or millilitres).
+# Units outside mass and volume are their own dimension, so they only add up with themselves.
+UNITS = {
+    'mg': ('mass', 0.001),
+    'g': ('mass', 1.0),
+    'kg': ('mass', 1000.0),
+    'oz': ('mass', 28.349523),
+    'lb': ('mass', 453.59237),
+    'ml': ('volume', 1.0),
+    'l': ('volume', 1000.0),
+    'tsp': ('volume', 4.928922),
+    'tbsp': ('volume', 14.786765),
+    'fl oz': ('volume', 29.573530),
+    'cup': ('volume', 236.588237),
+    'pint': ('volume', 473.176473),
+    'quart': ('volume', 946.352946),
+    'clove': ('clove', 1.0),
+    'can': ('can', 1.0),
+    'slice': ('slice', 1.0),
+    'piece': ('piece', 1.0),
+    'pinch': ('pinch', 1.0),
+    'dash': ('dash', 1.0),
+    'bunch': ('bunch', 1.0),
+    'handful': ('handful', 1.0),
+    'sprig': ('sprig', 1.0),
+    'stick': ('stick', 1.0),
+    'packet': ('packet', 1.0),
+    '': ('count', 1.0),  # "3 eggs"
+}
+
+UNIT_ALIASES = {
+    'milligram': 'mg', 'milligrams': 'mg',
+    'gram': 'g', 'grams': 'g', 'gr': 'g',
+    'kilogram': 'kg', 'kilograms': 'kg', 'kgs': 'kg',
+    'ounce': 'oz', 'ounces': 'oz',
+    'pound': 'lb', 'pounds': 'lb', 'lbs': 'lb',
+    'milliliter': 'ml', 'milliliters': 'ml', 'millilitre': 'ml', 'millilitres': 'ml',
+    'liter': 'l', 'liters': 'l', 'litre': 'l', 'litres': 'l',
+    'teaspoon': 'tsp', 'teaspoons': 'tsp', 'tsps': 'tsp',
+    'tablespoon': 'tbsp', 'tablespoons': 'tbsp', 'tbs': 'tbsp', 'tbsps': 'tbsp',
+    'cups': 'cup', 'c': 'cup',
+    'fluid ounce': 'fl oz', 'fluid ounces': 'fl oz',
+    'pints': 'pint', 'pt': 'pint', 'quarts': 'quart', 'qt': 'quart',
+    'cloves': 'clove', 'cans': 'can', 'tin': 'can', 'tins': 'can', 'slices': 'slice', 'pieces': 'piece',
+    'pinches': 'pinch', 'dashes': 'dash', 'bunches': 'bunch', 'handfuls': 'handful', 'sprigs': 'sprig',
+    'sticks': 'stick', 'packets': 'packet', 'pkg': 'packet',
+}
+
+# Unit codes index these arrays, so whole columns of quantities convert with one gather
+UNIT_NAMES = list(UNITS)
+UNIT_CODES = {name: code for code, name in enumerate(UNIT_NAMES)}
+DIMENSION_NAMES = list(dict.fromkeys(dimension for dimension, _ in UNITS.values()))
+UNIT_FACTORS = np.array([UNITS[name][1] for name in UNIT_NAMES])
+UNIT_DIMENSIONS = np.array([DIMENSION_NAMES.index(UNITS[name][0]) for name in UNIT_NAMES])
+# The unit each dimension's totals are shown in, besides mass and volume which pick by size
+DIMENSION_UNITS = np.array([UNIT_CODES.get(name, UNIT_CODES['']) for name in DIMENSION_NAMES])
+
+# Units written out as words, pluralized for display ("2 cups"); abbreviations never are
+WORD_UNITS = {'cup', 'pint', 'quart', 'clove', 'can', 'slice', 'piece', 'pinch', 'dash', 'bunch', 'handful', 'sprig', 'stick', 'packet'}
+
+MASS = DIMENSION_NAMES.index('mass')
+VOLUME = DIMENSION_NAMES.index('volume')
+
+UNICODE_FRACTIONS = {'½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8'}
+
+NUMBER = r'\d+\s+\d+/\d+|\d+/\d+|\d+(?:[.,]\d+)?'
+QUANTITY = re.compile(
+    rf'^\s*(?P<quantity>{NUMBER}|an?\b)(?:\s*(?:-|–|to)\s*(?P<quantity_max>{NUMBER}))?\s*(?P<rest>.*)$',
+    re.IGNORECASE
+)
+UNIT_WORD = re.compile(r'^(?P<size>\([^)]*\)\s*)?(?P<unit>fl\.?\s*oz|fluid\s+ounces?|[a-z]+)\.?(?:\s+|$)(?:of\s+)?(?P<item>.*)$', re.IGNORECASE)
+
+ParsedIngredient = namedtuple('ParsedIngredient', 'text quantity quantity_max unit item name')
+
+def _parse_number(text):
+    text = text.strip().lower().replace(',', '.')
+    if text in ('a', 'an'):
+        return 1.0
+    whole = 0.0
+    if ' ' in text:
+        head, text = text.split(None, 1)
+        whole = float(head)
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        return whole + (float(numerator) / float(denominator) if float(denominator) else 0.0)
+    return whole + float(text)
+
+def _canonical_unit(word):
+    word = re.sub(r'\s+', ' ', word.lower().replace('.', ''))
+    if word in ('fl oz', 'floz'):
+        return 'fl oz'
+    if word in UNITS and word:
+        return word
+    return UNIT_ALIASES.get(word)
+
+def parse_ingredient(text):
+    """Split an ingredient line like "1 1/2 cups plain flour" into quantity, unit and item
+
+    Lines without a leading quantity ("salt to taste") keep quantity None. A range
+    ("2-3 cloves garlic") sets quantity and quantity_max. unit is a key of UNITS,
+    '' for counted items ("3 eggs").
+    """
+    normalized = text
+    for fraction, ascii_fraction in UNICODE_FRACTIONS.items():
+        normalized = normalized.replace(fraction, f' {ascii_fraction}')
+    match = QUANTITY.match(normalized)
+    if not match or (match.group('quantity').lower() in ('a', 'an') and not match.group('rest')):
+        return ParsedIngredient(text, None, None, '', text.strip(), canonicalize_ingredient(text))
+    quantity = _parse_number(match.group('quantity'))
+    quantity_max = _parse_number(match.group('quantity_max')) if match.group('quantity_max') else None
+    rest = match.group('rest')
+    unit, item = '', rest
+    word = UNIT_WORD.match(rest)
+    if word:
+        canonical = _canonical_unit(word.group('unit'))
+        if canonical is not None:
+            # "1 (400g) can tomatoes": the can's size stays with the item
+            unit, item = canonical, f"{word.group('size') or ''}{word.group('item')}"
+    if match.group('quantity').lower() in ('a', 'an') and not unit:
+        # "a pinch of salt" has a quantity, "a little oil" doesn't
+        return ParsedIngredient(text, None, None, '', text.strip(), canonicalize_ingredient(text))
+    item = item.strip()
+    return ParsedIngredient(text, quantity, quantity_max, unit, item, canonicalize_ingredient(item))
+
+@lru_cache(maxsize=4096)
+def parse_ingredients(ingredients_json):
+    """Parsed lines of a recipe's ingredients column, cached by the column text
+
+    Keyed on the JSON itself, so an edited recipe is reparsed and an unchanged one never is.
+    """
+    try:
+        lines = json.loads(ingredients_json) if ingredients_json else []
+    except ValueError:
+        lines = []
+    if not isinstance(lines, list):
+        # A bare string ingredients value is one text blob, not a list of lines to scale
+        return ()
+    return tuple(parse_ingredient(line) for line in lines if isinstance(line, str))
+
+class IngredientColumns:
+    """Quantities and unit codes of many parsed lines as arrays, for arithmetic on whole plans"""
+
+    def __init__(self, parsed):
+        self.parsed = parsed
+        self.quantity = np.array([p.quantity if p.quantity is not None else np.nan for p in parsed], dtype=np.float64)
+        self.quantity_max = np.array(
+            [p.quantity_max if p.quantity_max is not None else np.nan for p in parsed], dtype=np.float64
+        )
+        self.unit = np.array([UNIT_CODES[p.unit] for p in parsed], dtype=np.intp)
+
+    @property
+    def dimension(self):
+        return UNIT_DIMENSIONS[self.unit]
+
+def to_base_units(quantity, unit):
+    """Quantities in grams, millilitres or their own unit, for arrays of quantities and unit codes"""
+    return quantity * UNIT_FACTORS[unit]
+
+def metric_units(base, dimension):
+    """(quantities, unit codes) reading well in metric: g below 1kg, kg above, likewise ml and l"""
+    unit = DIMENSION_UNITS[dimension]
+    big = np.abs(np.nan_to_num(base)) >= 1000
+    for dimension_code, small, large in ((MASS, 'g', 'kg'), (VOLUME, 'ml', 'l')):
+        in_dimension = dimension == dimension_code
+        unit = np.where(in_dimension & big, UNIT_CODES[large], np.where(in_dimension, UNIT_CODES[small], unit))
+    return base / UNIT_FACTORS[unit], unit
+
+def round_quantities(quantity):
+    """Round to what a cook can measure: whole numbers from 10 up, two decimals below"""
+    return np.where(np.abs(quantity) >= 10, np.round(quantity), np.round(quantity, 2))
+
+def _number(value):
+    if value is None or np.isnan(value):
+        return None
+    return int(value) if float(value).is_integer() else float(value)
+
+def format_ingredient(quantity, quantity_max, unit, item):
+    """An ingredient line from its parts: "1.5 cups flour", "2-3 cloves garlic", "3 eggs" """
+    if quantity is None:
+        return item
+    amount = f'{quantity:g}' if quantity_max is None else f'{quantity:g}-{quantity_max:g}'
+    if unit in WORD_UNITS and (quantity != 1 or quantity_max is not None):
+        unit += 'es' if unit.endswith(('ch', 'sh')) else 's'
+    return ' '.join(part for part in (amount, unit, item) if part)
+
+def _records(parsed, quantity, quantity_max, unit):
+    records = []
+    for p, q, q_max, u in zip(parsed, quantity.tolist(), quantity_max.tolist(), unit.tolist()):
+        q, q_max = _number(q), _number(q_max)
+        unit_name = UNIT_NAMES[u] if q is not None else p.unit
+        records.append({
+            'text': format_ingredient(q, q_max, unit_name, p.item) if q is not None else p.text,
+            'quantity': q,
+            'quantity_max': q_max,
+            'unit': unit_name or None,
+            'item': p.item,
+        })
+    return records
+
+def scale_ingredients(ingredients_json, factor, metric=False):
+    """A recipe's ingredient lines multiplied by factor, optionally converted to metric units"""
+    columns = IngredientColumns(parse_ingredients(ingredients_json))
+    quantity, quantity_max, unit = columns.quantity * factor, columns.quantity_max * factor, columns.unit
+    if metric:
+        # Only mass and volume convert; clove, pinch, ... stay as they are
+        convertible = (columns.dimension == MASS) | (columns.dimension == VOLUME)
+        base, base_max = to_base_units(quantity, unit), to_base_units(quantity_max, unit)
+        converted, metric_unit = metric_units(base, columns.dimension)
+        quantity = np.where(convertible, converted, quantity)
+        quantity_max = np.where(convertible, base_max / UNIT_FACTORS[metric_unit], quantity_max)
+        unit = np.where(convertible, metric_unit, unit)
+    return _records(columns.parsed, round_quantities(quantity), round_quantities(quantity_max), unit)
+
+def shopping_list(recipes):
+    """Total quantities per ingredient over (recipe_id, ingredients_json, factor) triples
+
+    Every line of every recipe is scaled and converted to base units in one pass;
+    amounts of the same ingredient add up when their units share a dimension (cups
+    and millilitres do, cups and grams don't, so those stay separate entries).
+    Lines without a quantity are listed once with quantity None.
+    """
+    parsed, factors, recipe_ids = [], [], []
+    for recipe_id, ingredients_json, factor in recipes:
+        lines = parse_ingredients(ingredients_json)
+        parsed.extend(lines)
+        factors.extend([factor] * len(lines))
+        recipe_ids.extend([recipe_id] * len(lines))
+    if not parsed:
+        return []
+    columns = IngredientColumns(parsed)
+    base = to_base_units(columns.quantity * np.array(factors), columns.unit)
+    dimension = columns.dimension
+    # Ranges count at their upper bound, so the list never runs short
+    base_max = to_base_units(columns.quantity_max * np.array(factors), columns.unit)
+    base = np.where(np.isnan(base_max), base, base_max)
+
+    # One group per (ingredient, dimension); unquantified lines get a group of their own
+    groups = {}
+    group_of = np.empty(len(parsed), dtype=np.intp)
+    for i, p in enumerate(parsed):
+        key = (p.name or p.item.lower(), int(dimension[i]) if p.quantity is not None else -1)
+        group_of[i] = groups.setdefault(key, len(groups))
+    totals = np.bincount(group_of, weights=np.nan_to_num(base), minlength=len(groups))
+    group_dimension = np.array([d for _, d in groups], dtype=np.intp)
+    quantity, unit = metric_units(totals, np.maximum(group_dimension, 0))
+    quantity = round_quantities(quantity)
+
+    members = [[] for _ in groups]
+    for i, group in enumerate(group_of.tolist()):
+        if recipe_ids[i] not in members[group]:
+            members[group].append(recipe_ids[i])
+    items = []
+    for (name, dimension_code), group in groups.items():
+        has_quantity = dimension_code >= 0
+        q = _number(quantity[group]) if has_quantity else None
+        unit_name = UNIT_NAMES[unit[group]] if has_quantity else ''
+        items.append({
+            'item': name,
+            'quantity': q,
+            'unit': unit_name or None,
+            'text': format_ingredient(q, None, unit_name, name),
+            'recipe_ids': members[group],
+        })
+    items.sort(key=lambda entry: (entry['item'], entry['quantity'] is None))
+    return items
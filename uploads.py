@@ -0,0 +1,43 @@
+from flask import Request
+import hashlib
+import tempfile
+from images import SNIFF_BYTES, sniff_image_type
+
+class HashingUploadFile:
+    """Spool file for one uploaded file that hashes and sniffs the bytes as the parser writes them
+
+    The upload is streamed to an anonymous temporary file chunk by chunk, so it is
+    never held in memory, and its sha256 and type are known the moment parsing ends
+    without reading it back.
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._hash = hashlib.sha256()
+        self._head = b''
+        self.size = 0
+
+    def write(self, data):
+        if len(self._head) < SNIFF_BYTES:
+            self._head += data[:SNIFF_BYTES - len(self._head)]
+        self._hash.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    @property
+    def image_type(self):
+        """'jpeg', 'png', 'gif' or 'webp' from the upload's magic bytes, or None if it is not an image"""
+        return sniff_image_type(self._head)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def __getattr__(self, name):
+        # read, seek, tell, close, ... for the parser and for Pillow
+        return getattr(self._file, name)
+
+class UploadRequest(Request):
+    """Request whose multipart file parts are spooled through HashingUploadFile"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingUploadFile()
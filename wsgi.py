@@ -0,0 +1,5 @@
+"""WSGI entry point for production: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import create_app
+
+# Job worker threads don't survive fork(); gunicorn.conf.py starts them in each worker
+app = create_app(start_job_workers=False)